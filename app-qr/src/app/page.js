@@ -48,7 +48,8 @@ export default function Home() {
 
       const images = (data.carousel_images || []).map((img, index) => ({
         id: index + 1,
-        url: img.url || img,
+        // w=800 basta para el carrusel en móvil; el original queda de respaldo
+        url: img.variant_urls?.['w=800'] || img.url || img,
         alt: img.alt || `Imagen ${index + 1}`
       }));
       setCarouselImages(images);
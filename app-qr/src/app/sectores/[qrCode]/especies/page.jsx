@@ -26,6 +26,33 @@ const readSectorCache = (qrCode) => {
   }
 };
 
+// Miniatura de la grilla: variante de 400px si existe, si no la portada original
+const getThumbnailUrl = (especie) => (
+  especie.cover_variant_urls?.['w=400'] || especie.cover_photo
+);
+
+// Un solo request (bundle); si falla, se cae a los dos endpoints anteriores
+const fetchSectorData = async (qrCode) => {
+  try {
+    const { data } = await sectorsApi.getBundle(qrCode);
+    return { sector: data?.sector || null, especies: data?.species || [] };
+  } catch (err) {
+    if (err.response?.status === 404) throw err;
+  }
+
+  const [sectorResult, speciesResult] = await Promise.allSettled([
+    sectorsApi.getByQr(qrCode),
+    sectorsApi.getSpeciesByQr(qrCode),
+  ]);
+  if (sectorResult.status === 'rejected' && speciesResult.status === 'rejected') {
+    throw sectorResult.reason;
+  }
+  return {
+    sector: sectorResult.status === 'fulfilled' ? sectorResult.value.data : null,
+    especies: speciesResult.status === 'fulfilled' ? (speciesResult.value.data || []) : null,
+  };
+};
+
 const writeSectorCache = (qrCode, data) => {
   if (typeof window === 'undefined') return;
   try {
@@ -87,13 +114,7 @@ export default function SectorEspecies() {
         setError(null);
       }
       
-      const [sectorResult, speciesResult] = await Promise.allSettled([
-        sectorsApi.getByQr(qrCode),
-        sectorsApi.getSpeciesByQr(qrCode),
-      ]);
-
-      const nextSector = sectorResult.status === 'fulfilled' ? sectorResult.value.data : null;
-      const nextSpecies = speciesResult.status === 'fulfilled' ? (speciesResult.value.data || []) : null;
+      const { sector: nextSector, especies: nextSpecies } = await fetchSectorData(qrCode);
 
       if (nextSector) {
         setSector(nextSector);
@@ -110,10 +131,6 @@ export default function SectorEspecies() {
           especies: nextSpecies || [],
         });
       }
-
-      if (sectorResult.status === 'rejected' && speciesResult.status === 'rejected') {
-        throw sectorResult.reason;
-      }
     } catch (err) {
       console.error('Error al cargar datos del sector:', err);
       const errorMessage = err.response?.data?.message || err.message || 'No se pudieron cargar los datos del sector';
@@ -171,7 +188,7 @@ export default function SectorEspecies() {
                 <div className="grid-item-image">
                   {especie.cover_photo ? (
                     <AuthenticatedImage
-                      src={resolvePhotoUrl(especie.cover_photo)}
+                      src={resolvePhotoUrl(getThumbnailUrl(especie))}
                       alt={especie.nombre_común || especie.scientific_name}
                       style={{
                         width: '100%',
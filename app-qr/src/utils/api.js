@@ -98,6 +98,7 @@ export const sectorsApi = {
   list: () => retryRequest(() => api.get('/sectors/public')),
   getByQr: (qrCode) => retryRequest(() => api.get(`/sectors/public/${qrCode}`)),
   getSpeciesByQr: (qrCode) => retryRequest(() => api.get(`/sectors/public/${qrCode}/species`)),
+  getBundle: (qrCode) => retryRequest(() => api.get(`/sectors/public/${qrCode}/bundle`)),
 };
 
 export const speciesApi = {
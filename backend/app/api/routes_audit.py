@@ -1,8 +1,9 @@
 # app/api/routes_audit.py
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from typing import Optional, List, Dict, Any
 from app.middleware.auth_middleware import get_current_user
-from app.services.audit_service import get_audit_log
+from app.services.audit_service import get_audit_page, iter_audit_export, reconstruct_record
 
 router = APIRouter()
 
@@ -12,7 +13,9 @@ def get_audit_logs(
     record_id: Optional[int] = Query(None, description="Filtrar por ID de registro"),
     user_id: Optional[int] = Query(None, description="Filtrar por ID de usuario"),
     limit: int = Query(200, ge=1, le=500, description="Límite de resultados"),
-    offset: int = Query(0, ge=0, description="Offset para paginación"),
+    offset: int = Query(0, ge=0, description="Offset para paginación (ignorado si se envía cursor)"),
+    cursor: Optional[str] = Query(None, description="Cursor keyset (next_cursor de la página anterior)"),
+    count: str = Query("exact", pattern="^(exact|planned|estimated|none)$", description="Tipo de conteo total"),
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -22,33 +25,82 @@ def get_audit_logs(
     logger = logging.getLogger(__name__)
     
     try:
-        logger.info(f"[Audit API] Solicitud de logs - usuario: {current_user.get('email')}, filtros: table={table_name}, record={record_id}, user={user_id}, limit={limit}, offset={offset}")
+        logger.debug(f"[Audit API] Solicitud de logs - usuario: {current_user.get('email')}, filtros: table={table_name}, record={record_id}, user={user_id}, limit={limit}, offset={offset}, cursor={bool(cursor)}")
         
-        logs, total_available = get_audit_log(
+        page = get_audit_page(
             table_name=table_name,
             record_id=record_id,
             user_id=user_id,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor,
+            count_mode=count,
         )
+        logs = page["logs"]
         
-        logger.info(f"[Audit API] Retornando {len(logs)} logs")
-        
-        response = {
+        return {
             "logs": logs,
             "count": len(logs),
             "limit": limit,
             "offset": offset,
-            "total_available": total_available
+            "total_available": page["total"],
+            "next_cursor": page["next_cursor"],
         }
-        
-        # Log detallado de la respuesta
-        if logs:
-            logger.info(f"[Audit API] Primer log en respuesta: ID={logs[0].get('id')}, tabla={logs[0].get('tabla_afectada')}, acción={logs[0].get('accion')}")
-        else:
-            logger.warning("[Audit API] No se encontraron logs con los filtros aplicados")
-        
-        return response
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     except Exception as e:
         logger.error(f"[Audit API] Error al obtener logs: {str(e)}", exc_info=True)
         raise HTTPException(500, f"Error al obtener logs de auditoría: {str(e)}")
+
+
+@router.get("/audit/versions/{table_name}/{record_id}", dependencies=[Depends(get_current_user)])
+def get_record_version(
+    table_name: str,
+    record_id: int,
+    at: Optional[str] = Query(None, description="Fecha ISO-8601; por defecto la versión más reciente"),
+):
+    """
+    Reconstruye un registro tal como estaba en `at` a partir del historial de auditoría.
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+
+    try:
+        version = reconstruct_record(table_name, record_id, at=at)
+    except Exception as e:
+        logger.error(f"[Audit API] Error al reconstruir {table_name}/{record_id}: {str(e)}", exc_info=True)
+        raise HTTPException(500, f"Error al reconstruir versión: {str(e)}")
+
+    if version["record"] is None and version["snapshot_id"] is None and not version["applied_updates"]:
+        raise HTTPException(404, "Sin historial de auditoría para el registro")
+    return {"table_name": table_name, "record_id": record_id, "at": at, **version}
+
+
+_EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+@router.get("/audit/export")
+def export_audit_logs(
+    format: str = Query("csv", pattern="^(csv|ndjson)$", description="Formato del export"),
+    table_name: Optional[str] = Query(None, description="Filtrar por tabla (especies, sectores)"),
+    record_id: Optional[int] = Query(None, description="Filtrar por ID de registro"),
+    user_id: Optional[int] = Query(None, description="Filtrar por ID de usuario"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Exporta el historial de auditoría completo como stream (CSV o NDJSON).
+    Recorre la tabla por keyset; la memoria usada no depende del tamaño del historial.
+    """
+    import logging
+    logger = logging.getLogger(__name__)
+
+    logger.info(f"[Audit API] Export {format} - usuario: {current_user.get('email')}, filtros: table={table_name}, record={record_id}, user={user_id}")
+    filename = f"auditoria.{format}"
+    return StreamingResponse(
+        iter_audit_export(format, table_name=table_name, record_id=record_id, user_id=user_id),
+        media_type=_EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
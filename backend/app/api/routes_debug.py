@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.routing import APIRoute
 from app.core.supabase_auth import get_public, get_service
+from app.core import storage_router
 import os
 import sys
 import platform
@@ -73,6 +74,13 @@ def supabase_status():
         }
 
 
+@router.get("/storage-status", summary="Storage circuit breakers and metrics")
+def storage_status():
+    """Estado de los circuit breakers de R2/Supabase Storage y contadores de métricas."""
+    _require_debug_enabled()
+    return storage_router.get_metrics()
+
+
 @router.get("/cors-status", summary="Check CORS configuration")
 def cors_status(request: Request):
     """Check CORS configuration and origins"""
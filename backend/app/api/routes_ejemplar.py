@@ -3,7 +3,7 @@ from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
 from typing import Optional, Dict, Any
 
 from pydantic import OnErrorOmit
-from app.middleware.auth_middleware import get_current_user
+from app.middleware.auth_middleware import get_audit_user_id, get_current_user
 from app.services import ejemplar_service as svc
 
 router = APIRouter()
@@ -19,6 +19,7 @@ def list_ejemplares_staff(
     health_status: Optional[str] = Query(None, description="Filtrar por estado de salud"),
     nursery: Optional[str] = Query(None, description="Filtrar por vivero (búsqueda parcial)"),
     invoice_number: Optional[str] = Query(None, description="Filtrar por número de factura (búsqueda parcial)"),
+    factura_id: Optional[int] = Query(None, description="Filtrar por factura vinculada (facturas_compra.id)"),
     purchase_date: Optional[str] = Query(None, description="Filtrar por fecha de compra exacta (YYYY-MM-DD)"),
     purchase_date_from: Optional[str] = Query(None, description="Filtrar compras desde esta fecha (YYYY-MM-DD)"),
     purchase_date_to: Optional[str] = Query(None, description="Filtrar compras hasta esta fecha (YYYY-MM-DD)"),
@@ -52,6 +53,7 @@ def list_ejemplares_staff(
             health_status=health_status,
             nursery=nursery,
             invoice_number=invoice_number,
+            factura_id=factura_id,
             purchase_date=purchase_date,
             purchase_date_from=purchase_date_from,
             purchase_date_to=purchase_date_to,
@@ -89,7 +91,7 @@ def create_ejemplar_staff(payload: Dict[str, Any], request: Request, current_use
     Crea un nuevo ejemplar.
     """
     try:
-        user_id = current_user.get('id')
+        user_id = get_audit_user_id(current_user)
         user_email = current_user.get('email')
         user_name = current_user.get('full_name') or current_user.get('username')
         ip_address = request.client.host if request.client else None
@@ -112,7 +114,7 @@ def update_ejemplar_staff(ejemplar_id: int, payload: Dict[str, Any], request: Re
     Actualiza un ejemplar existente.
     """
     try:
-        user_id = current_user.get('id')
+        user_id = get_audit_user_id(current_user)
         user_email = current_user.get('email')
         user_name = current_user.get('full_name') or current_user.get('username')
         ip_address = request.client.host if request.client else None
@@ -132,7 +134,7 @@ def delete_ejemplar_staff(ejemplar_id: int, request: Request, current_user: dict
     """
     Elimina un ejemplar.
     """
-    user_id = current_user.get('id')
+    user_id = get_audit_user_id(current_user)
     user_email = current_user.get('email')
     user_name = current_user.get('full_name') or current_user.get('username')
     ip_address = request.client.host if request.client else None
@@ -1,11 +1,12 @@
 # app/api/routes_home_content.py
 from fastapi import APIRouter, Depends, HTTPException, Request, File, UploadFile
 from typing import Dict, Any, List
-from app.middleware.auth_middleware import get_current_user
+from app.middleware.auth_middleware import get_audit_user_id, get_current_user
 from app.services import home_content_service as svc
 from app.services import photos_service
 from app.core import storage_router
 from app.core.security import get_token_from_request
+from app.utils.http_cache import conditional_json
 
 router = APIRouter()
 
@@ -13,28 +14,26 @@ router = APIRouter()
 #          PÚBLICO
 # ===========================
 
+PUBLIC_CACHE_CONTROL = "public, max-age=60, stale-while-revalidate=600"
+
+
 @router.get("/public")
-def get_home_content_public(lang: str = "es"):
+def get_home_content_public(request: Request, lang: str = "es"):
     """
     Obtiene el contenido público del home (sin autenticación).
     
     Args:
         lang: Idioma del contenido ('es' para español, 'en' para inglés). Default: 'es'
+
+    Responde desde el cache en memoria del servicio con un ETag fuerte;
+    If-None-Match coincidente devuelve 304 sin cuerpo.
     """
     # Validar idioma
     if lang not in ["es", "en"]:
         lang = "es"
     
-    content = svc.get_public(lang=lang)
-    if not content:
-        # Retornar contenido por defecto
-        default_welcome = "Bienvenido al Cactario CasaMolle" if lang == "es" else "Welcome to Cactario CasaMolle"
-        return {
-            "welcome_text": default_welcome,
-            "carousel_images": [],
-            "sections": []
-        }
-    return content
+    content, etag = svc.get_public_cached(lang=lang)
+    return conditional_json(request, content, etag=etag, cache_control=PUBLIC_CACHE_CONTROL)
 
 # ===========================
 #        STAFF (privado)
@@ -82,52 +81,23 @@ async def upload_carousel_image(
     current_user: dict = Depends(get_current_user)
 ):
     """
-    Sube una imagen para el carrusel del home.
-    Retorna la URL pública de la imagen subida.
+    Sube una imagen para el carrusel del home con el mismo pipeline de fotos:
+    original + variantes w=400/w=800 con Cache-Control inmutable.
+    Retorna la URL pública, las variantes y las dimensiones del original.
     """
     try:
-        from pathlib import Path
-        from io import BytesIO
-        from PIL import Image
-        import uuid
         if not file.content_type or not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="El archivo debe ser una imagen")
 
-        MAX_IMAGE_SIZE = 2048
-        
-        # Leer y procesar la imagen
-        file_content = await file.read()
-        file_extension = Path(file.filename).suffix if file.filename else '.jpg'
-        unique_filename = f"home/carousel/{uuid.uuid4()}{file_extension}"
-        
-        # Determinar content type inicial
-        content_type = file.content_type or 'image/jpeg'
-        
-        # Redimensionar si es necesario
-        image = Image.open(BytesIO(file_content))
-        if image.width > MAX_IMAGE_SIZE or image.height > MAX_IMAGE_SIZE:
-            image.thumbnail((MAX_IMAGE_SIZE, MAX_IMAGE_SIZE), Image.Resampling.LANCZOS)
-            output = BytesIO()
-            if image.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', image.size, (255, 255, 255))
-                if image.mode == 'P':
-                    image = image.convert('RGBA')
-                background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-                image = background
-            image.save(output, format='JPEG', quality=85)
-            file_content = output.getvalue()
-            content_type = 'image/jpeg'  # Después de redimensionar, siempre será JPEG
-            unique_filename = f"home/carousel/{uuid.uuid4()}.jpg"  # Cambiar extensión a .jpg
-        
-        storage_router.upload_object(
-            key=unique_filename,
-            data=file_content,
-            content_type=content_type,
-        )
-
+        stored = await photos_service.store_image_variants(file, "home/carousel")
         return {
-            "url": storage_router.get_public_url(unique_filename),
-            "alt": file.filename or "Imagen del carrusel"
+            "url": storage_router.get_public_url(stored["storage_path"]),
+            "alt": file.filename or "Imagen del carrusel",
+            "storage_path": stored["storage_path"],
+            "variants": stored["variants"],
+            "variant_urls": photos_service.build_variant_urls(stored["variants"]),
+            "width": stored["width"],
+            "height": stored["height"],
         }
     except HTTPException:
         raise
@@ -160,7 +130,7 @@ def create_or_update_home_content_staff(
             raise HTTPException(status_code=401, detail="Token de autenticación no encontrado")
         
         user = request.state.user if hasattr(request.state, 'user') else None
-        user_id = user.get("id") if user else None
+        user_id = get_audit_user_id(user)
         user_email = user.get("email") if user else None
         
         logger.info(f"[create_or_update_home_content_staff] Usuario ID: {user_id}, Email: {user.get('email') if user else None}")
@@ -197,7 +167,7 @@ def update_home_content_staff(
             raise HTTPException(status_code=401, detail="Token de autenticación no encontrado")
         
         user = request.state.user if hasattr(request.state, 'user') else None
-        user_id = user.get("id") if user else None
+        user_id = get_audit_user_id(user)
         user_email = user.get("email") if user else None
         
         ip_address = request.client.host if request.client else None
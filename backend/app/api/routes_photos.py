@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, Path, File, UploadFile, Form, Depends, Request
 from typing import List, Optional
 from app.services import photos_service as svc
-from app.middleware.auth_middleware import get_current_user
+from app.middleware.auth_middleware import get_audit_user_id, get_current_user
 router = APIRouter()
 
 
@@ -18,7 +18,7 @@ async def upload_photos(
     Sube fotos para cualquier entidad. Requiere autenticacion.
     """
     try:
-        user_id = current_user.get("id")
+        user_id = get_audit_user_id(current_user)
         user_email = current_user.get("email")
         user_name = current_user.get("full_name") or current_user.get("username")
         ip_address = request.client.host if request.client else None
@@ -96,7 +96,7 @@ def update_photo(
     Requiere autenticacion.
     """
     try:
-        user_id = current_user.get("id")
+        user_id = get_audit_user_id(current_user)
         user_email = current_user.get("email")
         user_name = current_user.get("full_name") or current_user.get("username")
         ip_address = request.client.host if request.client else None
@@ -130,7 +130,7 @@ def delete_photo(
     Elimina una foto (del storage y de la base de datos). Requiere autenticacion.
     """
     try:
-        user_id = current_user.get("id")
+        user_id = get_audit_user_id(current_user)
         user_email = current_user.get("email")
         user_name = current_user.get("full_name") or current_user.get("username")
         ip_address = request.client.host if request.client else None
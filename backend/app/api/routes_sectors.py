@@ -1,10 +1,12 @@
 # app/api/routes_sectors.py
 from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
 from typing import Optional, Any, Dict
-from app.middleware.auth_middleware import get_current_user
+import logging
+from app.middleware.auth_middleware import get_audit_user_id, get_current_user
 from app.services import sectors_service as svc
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # ===========================
 #         PÚBLICO (QR)
@@ -22,17 +24,11 @@ def get_sector_public(qr_code: str = Path(..., description="QR code del sector")
     """
     Ficha pública de un sector por su QR (sin auth).
     """
-    import logging
-    logger = logging.getLogger(__name__)
-    
-    logger.info(f"[get_sector_public] Recibido qr_code: {qr_code}")
+    logger.debug(f"[get_sector_public] qr_code: {qr_code}")
     row = svc.get_public_by_qr(qr_code)
-    
     if not row:
-        logger.warning(f"[get_sector_public] Sector no encontrado para qr_code: {qr_code}")
+        logger.debug(f"[get_sector_public] Sin sector para qr_code: {qr_code}")
         raise HTTPException(status_code=404, detail=f"Sector no encontrado con QR: {qr_code}")
-    
-    logger.info(f"[get_sector_public] Sector encontrado: {row.get('id')} - {row.get('name')}")
     return row
 
 @router.get("/public/{qr_code}/species")
@@ -47,6 +43,17 @@ def list_species_by_sector_public(qr_code: str):
     # Si el QR no existe, el servicio retorna []; podrías distinguir entre "sin especies" y "no existe"
     return out
 
+@router.get("/public/{qr_code}/bundle")
+def get_sector_bundle_public(qr_code: str = Path(..., description="QR code del sector")):
+    """
+    Sector + especies + URLs de portada (con variantes) en una sola llamada,
+    para la pantalla de especies de la app QR (sin auth).
+    """
+    bundle = svc.get_public_bundle(qr_code)
+    if not bundle:
+        raise HTTPException(status_code=404, detail=f"Sector no encontrado con QR: {qr_code}")
+    return bundle
+
 # ===========================
 #       STAFF (privado)
 # ===========================
@@ -69,7 +76,7 @@ def create_sector_staff(payload: Dict[str, Any], request: Request, current_user:
     logger.info(f"[create_sector_staff] Recibido payload: {payload}")
     
     try:
-        user_id = current_user.get('id')
+        user_id = get_audit_user_id(current_user)
         user_email = current_user.get('email')
         user_name = current_user.get('full_name') or current_user.get('username')
         ip_address = request.client.host if request.client else None
@@ -109,7 +116,7 @@ def update_sector_species_staff(sector_id: int, payload: Dict[str, Any], request
         raise HTTPException(400, "'especie_ids' debe ser una lista")
     
     try:
-        user_id = current_user.get('id')
+        user_id = get_audit_user_id(current_user)
         user_email = current_user.get('email')
         user_name = current_user.get('full_name') or current_user.get('username')
         ip_address = request.client.host if request.client else None
@@ -136,7 +143,7 @@ def update_sector_staff(sector_id: int, payload: Dict[str, Any], request: Reques
     Actualiza un sector (requiere usuario autenticado).
     """
     try:
-        user_id = current_user.get('id')
+        user_id = get_audit_user_id(current_user)
         user_email = current_user.get('email')
         user_name = current_user.get('full_name') or current_user.get('username')
         ip_address = request.client.host if request.client else None
@@ -154,7 +161,7 @@ def delete_sector_admin(sector_id: int, request: Request, current_user: dict = D
     """
     Elimina un sector (requiere usuario autenticado).
     """
-    user_id = current_user.get('id')
+    user_id = get_audit_user_id(current_user)
     user_email = current_user.get('email')
     user_name = current_user.get('full_name') or current_user.get('username')
     ip_address = request.client.host if request.client else None
@@ -1,7 +1,7 @@
 # app/api/routes_species.py
 from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
 from typing import Optional, Dict, Any
-from app.middleware.auth_middleware import get_current_user
+from app.middleware.auth_middleware import get_audit_user_id, get_current_user
 from app.services import species_service as svc
 
 router = APIRouter()
@@ -68,7 +68,7 @@ def create_species_staff(payload: Dict[str, Any], request: Request, current_user
     Crea especie (requiere usuario autenticado).
     """
     try:
-        user_id = current_user.get('id')
+        user_id = get_audit_user_id(current_user)
         user_email = current_user.get('email')
         user_name = current_user.get('full_name') or current_user.get('username')
         ip_address = request.client.host if request.client else None
@@ -88,7 +88,7 @@ def update_species_staff(species_id: int, payload: Dict[str, Any], request: Requ
     logger = logging.getLogger(__name__)
     
     try:
-        user_id = current_user.get('id')
+        user_id = get_audit_user_id(current_user)
         user_email = current_user.get('email')
         user_name = current_user.get('full_name') or current_user.get('username')
         ip_address = request.client.host if request.client else None
@@ -109,7 +109,7 @@ def delete_species_admin(species_id: int, request: Request, current_user: dict =
     """
     Elimina especie (requiere usuario autenticado).
     """
-    user_id = current_user.get('id')
+    user_id = get_audit_user_id(current_user)
     user_email = current_user.get('email')
     user_name = current_user.get('full_name') or current_user.get('username')
     ip_address = request.client.host if request.client else None
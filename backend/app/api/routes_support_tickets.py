@@ -4,6 +4,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query, Request
 
 from app.middleware.auth_middleware import get_current_user
 from app.services import support_tickets_service as svc
+from app.utils.http_cache import conditional_json
 
 router = APIRouter()
 
@@ -45,9 +46,11 @@ def list_support_tickets_staff(
 
 
 @router.get("/staff/summary", dependencies=[Depends(get_current_user)])
-def get_support_tickets_summary_staff(current_user: dict = Depends(get_current_user)):
+def get_support_tickets_summary_staff(request: Request, current_user: dict = Depends(get_current_user)):
     try:
-        return svc.get_summary(user_email=current_user.get("email"))
+        summary = svc.get_summary(user_email=current_user.get("email"))
+        # private/no-cache: el navegador guarda la respuesta pero revalida con If-None-Match.
+        return conditional_json(request, summary, cache_control="private, no-cache")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al cargar resumen de tickets: {str(e)}")
 
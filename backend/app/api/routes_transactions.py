@@ -1,7 +1,7 @@
 # app/api/routes_transactions.py
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile, File
 from typing import Optional, Dict, Any
-from app.middleware.auth_middleware import get_current_user
+from app.middleware.auth_middleware import get_audit_user_id, get_current_user
 from app.services import transactions_service as svc
 import logging
 
@@ -12,7 +12,7 @@ logger = logging.getLogger(__name__)
 def _request_context(request: Request, current_user: dict) -> Dict[str, Any]:
     """Extrae usuario, IP y user-agent del request para auditoría."""
     return {
-        "user_id": current_user.get("id"),
+        "user_id": get_audit_user_id(current_user),
         "user_email": current_user.get("email"),
         "user_name": current_user.get("full_name") or current_user.get("username"),
         "ip": request.client.host if request.client else None,
@@ -81,6 +81,22 @@ def delete_purchase(factura_id: int, request: Request, current_user: dict = Depe
         raise HTTPException(status_code=500, detail=f"Error al eliminar factura: {str(e)}")
 
 
+@router.get("/purchases/{factura_id}/ejemplares", dependencies=[Depends(get_current_user)])
+def list_purchase_ejemplares(
+    factura_id: int,
+    limit: int = Query(100, ge=1, le=1000, description="Máximo de ejemplares"),
+    offset: int = Query(0, ge=0, description="Desplazamiento"),
+):
+    """Lista los ejemplares vinculados a la factura (ejemplar.factura_id)."""
+    try:
+        return svc.list_purchase_ejemplares(factura_id, limit=limit, offset=offset)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"[list_purchase_ejemplares] Error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error al listar ejemplares de la factura: {str(e)}")
+
+
 @router.post("/purchases/document")
 async def upload_invoice_document(
     request: Request,
@@ -105,8 +121,8 @@ def list_sales(
     request: Request,
     date_from: Optional[str] = Query(None, description="Fecha inicio (YYYY-MM-DD)"),
     date_to: Optional[str] = Query(None, description="Fecha fin (YYYY-MM-DD)"),
-    limit: int = Query(500, ge=1, le=2000, description="Máximo de ejemplares a consultar"),
-    offset: int = Query(0, ge=0, description="Desplazamiento"),
+    limit: int = Query(50, ge=1, le=500, description="Máximo de días de venta a consultar"),
+    offset: int = Query(0, ge=0, description="Días de venta a saltar"),
 ):
     """Lista ventas agrupadas por fecha."""
     try:
@@ -130,3 +146,22 @@ def register_sale(payload: Dict[str, Any], request: Request, current_user: dict
     except Exception as e:
         logger.error(f"[register_sale] Error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error al registrar venta: {str(e)}")
+
+
+# ============================================================
+# REPORTE
+# ============================================================
+@router.get("/report", dependencies=[Depends(get_current_user)])
+def get_report(
+    date_from: str = Query(..., description="Fecha inicio (YYYY-MM-DD)"),
+    date_to: str = Query(..., description="Fecha fin (YYYY-MM-DD)"),
+    group_by: str = Query("day", pattern="^(day|species|nursery)$", description="Agrupar por día, especie o vivero"),
+):
+    """Costo de compras, ingresos por ventas y margen en un rango, desde el rollup diario."""
+    try:
+        return svc.get_report(date_from, date_to, group_by=group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"[get_report] Error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error al generar reporte: {str(e)}")
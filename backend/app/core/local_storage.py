@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import json
+import os
+from pathlib import Path
+import shutil
+from typing import BinaryIO, Dict, Optional
+
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+# Ruta donde main.py monta los archivos cuando STORAGE_READ_SOURCE=local.
+LOCAL_STORAGE_ROUTE = "/storage"
+# Metadata (content-type, cache-control) fuera del árbol servido.
+_META_DIR = ".meta"
+
+
+@dataclass(frozen=True)
+class LocalStorageConfig:
+    root: Path
+    public_base_url: str
+
+
+def get_config() -> LocalStorageConfig:
+    root = Path(os.getenv("STORAGE_LOCAL_DIR", "data/storage")).resolve()
+    public_base_url = os.getenv(
+        "STORAGE_LOCAL_PUBLIC_BASE_URL",
+        f"http://localhost:{os.getenv('PORT', '8000')}{LOCAL_STORAGE_ROUTE}",
+    )
+    return LocalStorageConfig(root=root, public_base_url=public_base_url.strip().rstrip("/"))
+
+
+def _resolve(root: Path, key: str, subdir: Optional[str] = None) -> Path:
+    base = root / subdir if subdir else root
+    path = (base / key.lstrip("/")).resolve()
+    if base.resolve() not in path.parents:
+        raise ValueError(f"Key de storage inválida: {key}")
+    return path
+
+
+def _write_metadata(
+    root: Path,
+    key: str,
+    content_type: Optional[str],
+    cache_control: Optional[str],
+) -> None:
+    meta_path = _resolve(root, f"{key}.json", _META_DIR)
+    meta_path.parent.mkdir(parents=True, exist_ok=True)
+    meta_path.write_text(
+        json.dumps({"content_type": content_type, "cache_control": cache_control}),
+        encoding="utf-8",
+    )
+
+
+def read_metadata(key: str) -> Dict[str, Optional[str]]:
+    config = get_config()
+    try:
+        meta_path = _resolve(config.root, f"{key}.json", _META_DIR)
+        return json.loads(meta_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def upload_object(
+    key: str,
+    data: bytes,
+    content_type: Optional[str] = None,
+    cache_control: Optional[str] = None,
+) -> None:
+    config = get_config()
+    path = _resolve(config.root, key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    _write_metadata(config.root, key, content_type, cache_control)
+
+
+def upload_fileobj(
+    key: str,
+    fileobj: BinaryIO,
+    content_type: Optional[str] = None,
+    cache_control: Optional[str] = None,
+) -> None:
+    config = get_config()
+    path = _resolve(config.root, key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("wb") as target:
+        shutil.copyfileobj(fileobj, target)
+    _write_metadata(config.root, key, content_type, cache_control)
+
+
+def delete_object(key: str) -> None:
+    config = get_config()
+    _resolve(config.root, key).unlink(missing_ok=True)
+    _resolve(config.root, f"{key}.json", _META_DIR).unlink(missing_ok=True)
+
+
+def get_public_url(key: str) -> str:
+    config = get_config()
+    normalized_key = key.lstrip("/")
+    return f"{config.public_base_url}/{normalized_key}"
+
+
+class LocalStorageFiles(StaticFiles):
+    """StaticFiles que responde con el content-type y cache-control guardados al subir."""
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if Path(path).parts[:1] == (_META_DIR,):
+            return Response(status_code=404)
+        response = await super().get_response(path, scope)
+        if response.status_code in (200, 304):
+            metadata = read_metadata(path)
+            if metadata.get("content_type") and response.status_code == 200:
+                response.headers["content-type"] = metadata["content_type"]
+            if metadata.get("cache_control"):
+                response.headers["cache-control"] = metadata["cache_control"]
+        return response
+
+
+def create_static_app() -> LocalStorageFiles:
+    config = get_config()
+    config.root.mkdir(parents=True, exist_ok=True)
+    return LocalStorageFiles(directory=str(config.root))
@@ -2,12 +2,15 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from functools import lru_cache
-from typing import Optional
+from typing import BinaryIO, Optional
 import os
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
 
+_MB = 1024 * 1024
+
 
 @dataclass(frozen=True)
 class R2Config:
@@ -45,6 +48,23 @@ def get_config() -> R2Config:
     )
 
 
+@lru_cache(maxsize=1)
+def get_transfer_config() -> TransferConfig:
+    """
+    Configuración de transferencias gestionadas (multipart) de boto3.
+
+    Sobre el umbral, el objeto se sube en partes de ``R2_MULTIPART_CHUNK_MB``
+    leídas del stream, con hasta ``R2_MULTIPART_CONCURRENCY`` partes en vuelo,
+    así la memoria por upload queda acotada a chunk * concurrencia.
+    """
+    return TransferConfig(
+        multipart_threshold=int(float(os.getenv("R2_MULTIPART_THRESHOLD_MB", "8")) * _MB),
+        multipart_chunksize=int(float(os.getenv("R2_MULTIPART_CHUNK_MB", "8")) * _MB),
+        max_concurrency=int(os.getenv("R2_MULTIPART_CONCURRENCY", "4")),
+        use_threads=True,
+    )
+
+
 @lru_cache(maxsize=1)
 def get_client():
     config = get_config()
@@ -73,6 +93,27 @@ def upload_object(
     client.put_object(Bucket=config.bucket, Key=key, Body=data, **extra_args)
 
 
+def upload_fileobj(
+    key: str,
+    fileobj: BinaryIO,
+    content_type: Optional[str] = None,
+    cache_control: Optional[str] = None,
+) -> None:
+    """Sube un stream (file-like) con transferencia multipart gestionada por boto3."""
+    config = get_config()
+    client = get_client()
+    extra_args = {"ContentType": content_type} if content_type else {}
+    if cache_control:
+        extra_args["CacheControl"] = cache_control
+    client.upload_fileobj(
+        fileobj,
+        config.bucket,
+        key,
+        ExtraArgs=extra_args or None,
+        Config=get_transfer_config(),
+    )
+
+
 def delete_object(key: str) -> None:
     config = get_config()
     client = get_client()
@@ -167,20 +167,27 @@ def validate_supabase_jwt(token: str) -> Optional[Dict[str, Any]]:
         logger.debug("JWT validation failed: %s", exc)
         return None
 
-def validate_user_active(user_id: str) -> bool:
+def get_active_user(user_id: str) -> Optional[Dict[str, Any]]:
     """
-    Validate that user is active in the usuarios table using service role
+    Return the usuarios row (id, active) for an active user, or None.
+    The internal id lets callers skip a second usuarios lookup.
     """
     try:
         sb_admin = get_service()
-        result = sb_admin.table("usuarios").select("active").eq("supabase_uid", user_id).execute()
-        
-        if result.data and len(result.data) > 0:
-            return result.data[0].get("active", False)
-        return False
+        result = sb_admin.table("usuarios").select("id, active").eq("supabase_uid", user_id).execute()
+
+        if result.data and result.data[0].get("active", False):
+            return result.data[0]
+        return None
     except Exception as exc:
         logger.error("Error validating active user status: %s", exc)
-        return False
+        return None
+
+def validate_user_active(user_id: str) -> bool:
+    """
+    Validate that user is active in the usuarios table using service role
+    """
+    return get_active_user(user_id) is not None
 
 def sync_user_supabase_uid(email: str, supabase_uid: str) -> bool:
     """
@@ -1,10 +1,22 @@
 from __future__ import annotations
 
+import atexit
+from collections import Counter, deque
+from contextlib import contextmanager
 from dataclasses import dataclass
 import logging
 import os
-from typing import Optional
+from pathlib import Path
+import threading
+import time
+from typing import Any, BinaryIO, Callable, Deque, Dict, Iterator, List, Optional, Tuple
 
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos
+    fcntl = None
+
+from app.core import local_storage
 from app.core import r2_storage
 from app.core import supabase_storage
 
@@ -25,15 +37,383 @@ def _parse_bool(value: Optional[str], default: bool = False) -> bool:
     return value.strip().lower() in {"1", "true", "yes", "y", "on"}
 
 
+_metric_counters: Counter = Counter()
+_metric_lock = threading.Lock()
+
+
 def _record_metric(metric: str, **fields: object) -> None:
+    with _metric_lock:
+        _metric_counters[metric] += 1
     payload = " ".join(f"{key}={value}" for key, value in fields.items())
     logger.info("storage_metric=%s %s", metric, payload)
 
 
+class StorageBackendUnavailable(RuntimeError):
+    """El circuit breaker del backend está abierto y la llamada se omitió."""
+
+
+@dataclass(frozen=True)
+class BreakerConfig:
+    failure_rate_threshold: float
+    min_calls: int
+    window_seconds: float
+    cooldown_seconds: float
+    slow_call_seconds: float
+
+
+def get_breaker_config() -> BreakerConfig:
+    return BreakerConfig(
+        failure_rate_threshold=float(os.getenv("STORAGE_BREAKER_FAILURE_RATE", "0.5")),
+        min_calls=int(os.getenv("STORAGE_BREAKER_MIN_CALLS", "4")),
+        window_seconds=float(os.getenv("STORAGE_BREAKER_WINDOW_SECONDS", "60")),
+        cooldown_seconds=float(os.getenv("STORAGE_BREAKER_COOLDOWN_SECONDS", "30")),
+        slow_call_seconds=float(os.getenv("STORAGE_BREAKER_SLOW_CALL_SECONDS", "5")),
+    )
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por backend de storage.
+
+    Registra el resultado y la latencia de las llamadas recientes dentro de
+    una ventana deslizante. Las llamadas más lentas que ``slow_call_seconds``
+    cuentan como fallas, así un backend degradado (no solo caído) también se
+    abre. Abierto, rechaza llamadas durante ``cooldown_seconds`` y luego deja
+    pasar una única llamada de prueba (half-open) que decide si vuelve a
+    cerrarse o se abre otra vez.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        config: BreakerConfig,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.config = config
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._calls: Deque[Tuple[float, bool, float]] = deque()
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._trips = 0
+        self._rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh_state(self._clock())
+            return self._state
+
+    def _refresh_state(self, now: float) -> None:
+        if (
+            self._state == self.OPEN
+            and self._opened_at is not None
+            and now - self._opened_at >= self.config.cooldown_seconds
+        ):
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+    def _prune(self, now: float) -> None:
+        cutoff = now - self.config.window_seconds
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+
+    def _open(self, now: float) -> None:
+        self._state = self.OPEN
+        self._opened_at = now
+        self._probe_in_flight = False
+        self._calls.clear()
+        self._trips += 1
+        _record_metric("storage_breaker_open", backend=self.name, trips=self._trips)
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            now = self._clock()
+            self._refresh_state(now)
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._rejected += 1
+            return False
+
+    def record(self, success: bool, latency: float, check_latency: bool = True) -> None:
+        # check_latency=False: la duración depende del tamaño (subidas multipart),
+        # así que solo cuenta como falla un error.
+        is_failure = not success or (check_latency and latency > self.config.slow_call_seconds)
+        with self._lock:
+            now = self._clock()
+            if self._state == self.HALF_OPEN:
+                if is_failure:
+                    self._open(now)
+                else:
+                    self._state = self.CLOSED
+                    self._opened_at = None
+                    self._probe_in_flight = False
+                    self._calls.clear()
+                    _record_metric("storage_breaker_closed", backend=self.name)
+                return
+            if self._state == self.OPEN:
+                return
+
+            self._calls.append((now, is_failure, latency))
+            self._prune(now)
+            if len(self._calls) < self.config.min_calls:
+                return
+            failures = sum(1 for _, failed, _ in self._calls if failed)
+            if failures / len(self._calls) >= self.config.failure_rate_threshold:
+                self._open(now)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self._clock()
+            self._refresh_state(now)
+            self._prune(now)
+            calls = len(self._calls)
+            failures = sum(1 for _, failed, _ in self._calls if failed)
+            latencies = [latency for _, _, latency in self._calls]
+            return {
+                "state": self._state,
+                "calls_in_window": calls,
+                "failure_rate": round(failures / calls, 3) if calls else 0.0,
+                "avg_latency_ms": round(sum(latencies) / calls * 1000, 1) if calls else None,
+                "max_latency_ms": round(max(latencies) * 1000, 1) if calls else None,
+                "open_for_seconds": (
+                    round(now - self._opened_at, 1)
+                    if self._state != self.CLOSED and self._opened_at is not None
+                    else None
+                ),
+                "trips": self._trips,
+                "rejected_calls": self._rejected,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(backend: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(backend)
+        if breaker is None:
+            breaker = CircuitBreaker(backend, get_breaker_config())
+            _breakers[backend] = breaker
+        return breaker
+
+
+def reset_breakers() -> None:
+    with _breakers_lock:
+        _breakers.clear()
+    with _metric_lock:
+        _metric_counters.clear()
+    with _pending_deletes_lock:
+        _pending_deletes.clear()
+
+
+def get_metrics() -> Dict[str, Any]:
+    """Estado de los circuit breakers y contadores de métricas de storage."""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    with _metric_lock:
+        counters = dict(_metric_counters)
+    with _pending_deletes_lock:
+        pending = len(_pending_deletes)
+    return {
+        "backends": {name: breaker.snapshot() for name, breaker in breakers.items()},
+        "counters": counters,
+        "pending_r2_deletes": pending,
+    }
+
+
+# Borrados en R2 que no se pudieron hacer (breaker abierto o error). Quien
+# llama ya borró la fila en la base, así que se reintentan en un hilo de
+# fondo cuando R2 vuelve a responder en vez de dejar el objeto huérfano. Las
+# claves se anotan en STORAGE_PENDING_DELETES_PATH (una por línea) para que
+# un reinicio no las pierda; borrar en R2 es idempotente, así que varios
+# workers pueden reintentar la misma clave sin problema.
+_pending_deletes: Dict[str, None] = {}
+_pending_deletes_lock = threading.Lock()
+_drain_lock = threading.Lock()
+_drain_thread: Optional[threading.Thread] = None
+_MAX_PENDING_DELETES = int(os.getenv("STORAGE_PENDING_DELETES_MAX", "10000"))
+_DRAIN_BATCH_SIZE = 100
+_PENDING_DELETES_PATH = os.getenv("STORAGE_PENDING_DELETES_PATH", "data/r2_pending_deletes.txt").strip()
+_pending_deletes_path: Optional[Path] = Path(_PENDING_DELETES_PATH) if _PENDING_DELETES_PATH else None
+
+
+@contextmanager
+def _pending_file_lock() -> Iterator[None]:
+    """flock sobre ``<archivo>.lock``: el archivo se comparte entre workers."""
+    lock_path = _pending_deletes_path.with_name(_pending_deletes_path.name + ".lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with lock_path.open("a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _persist_pending_delete(key: str) -> None:
+    if _pending_deletes_path is None:
+        return
+    try:
+        with _pending_file_lock():
+            with _pending_deletes_path.open("a", encoding="utf-8") as pending_file:
+                pending_file.write(key + "\n")
+    except OSError as exc:
+        logger.error("No se pudo anotar el borrado pendiente de %s en R2: %s", key, exc)
+
+
+def _forget_persisted_deletes(keys: List[str]) -> None:
+    if _pending_deletes_path is None or not keys:
+        return
+    done = set(keys)
+    try:
+        with _pending_file_lock():
+            if not _pending_deletes_path.exists():
+                return
+            remaining = [
+                line
+                for line in _pending_deletes_path.read_text(encoding="utf-8").splitlines()
+                if line and line not in done
+            ]
+            if remaining:
+                _pending_deletes_path.write_text("\n".join(remaining) + "\n", encoding="utf-8")
+            else:
+                _pending_deletes_path.unlink(missing_ok=True)
+    except OSError as exc:
+        logger.warning("No se pudo actualizar %s: %s", _pending_deletes_path, exc)
+
+
+def load_pending_deletes() -> int:
+    """
+    Carga los borrados anotados por procesos anteriores y programa su
+    reintento. Retorna cuántas claves quedaron pendientes en memoria.
+    """
+    if _pending_deletes_path is None or not _pending_deletes_path.exists():
+        return 0
+    with _pending_file_lock():
+        keys = [line for line in _pending_deletes_path.read_text(encoding="utf-8").splitlines() if line]
+    with _pending_deletes_lock:
+        for key in keys:
+            if len(_pending_deletes) >= _MAX_PENDING_DELETES:
+                break
+            _pending_deletes[key] = None
+        pending = len(_pending_deletes)
+    if pending:
+        logger.info("%s borrados pendientes en R2 cargados desde %s", pending, _pending_deletes_path)
+        _schedule_drain()
+    return pending
+
+
+def _defer_r2_delete(key: str) -> None:
+    dropped: Optional[str] = None
+    with _pending_deletes_lock:
+        _pending_deletes[key] = None
+        if len(_pending_deletes) > _MAX_PENDING_DELETES:
+            dropped = next(iter(_pending_deletes))
+            del _pending_deletes[dropped]
+        pending = len(_pending_deletes)
+    _persist_pending_delete(key)
+    if dropped is not None:
+        # Se registra la clave para poder borrarla a mano: queda huérfana en R2
+        logger.error("Lista de borrados pendientes en R2 llena, se descarta %s", dropped)
+        _forget_persisted_deletes([dropped])
+    _record_metric("r2_delete_deferred", key=key, pending=pending)
+
+
+def retry_pending_deletes(limit: int = _DRAIN_BATCH_SIZE) -> int:
+    """
+    Reintenta en R2 hasta ``limit`` borrados diferidos. Se detiene en la
+    primera falla (siguen pendientes). Retorna cuántos se completaron.
+    """
+    # Un solo drenado a la vez; también evita reentrar desde _guarded_call
+    if not _drain_lock.acquire(blocking=False):
+        return 0
+    try:
+        with _pending_deletes_lock:
+            keys = list(_pending_deletes)[:limit]
+        done: List[str] = []
+        for key in keys:
+            try:
+                _guarded_call("r2", r2_storage.delete_object, key=key)
+            except Exception:
+                break
+            with _pending_deletes_lock:
+                _pending_deletes.pop(key, None)
+            _record_metric("r2_delete_replayed", key=key)
+            done.append(key)
+        _forget_persisted_deletes(done)
+        return len(done)
+    finally:
+        _drain_lock.release()
+
+
+def _drain_pending_deletes() -> None:
+    try:
+        while _pending_deletes and retry_pending_deletes() == _DRAIN_BATCH_SIZE:
+            pass
+    except Exception as exc:
+        logger.warning("Falló el reintento de borrados pendientes en R2: %s", exc)
+
+
+def _schedule_drain() -> Optional[threading.Thread]:
+    """Drena los borrados pendientes en un hilo de fondo, sin sumar latencia al request."""
+    global _drain_thread
+    with _pending_deletes_lock:
+        if _drain_thread is not None and _drain_thread.is_alive():
+            return _drain_thread
+        _drain_thread = threading.Thread(target=_drain_pending_deletes, name="r2-pending-deletes", daemon=True)
+        _drain_thread.start()
+        return _drain_thread
+
+
+@atexit.register
+def _log_pending_deletes_at_exit() -> None:
+    if _pending_deletes_path is not None:
+        return  # siguen anotados en disco para el próximo arranque
+    for key in list(_pending_deletes):
+        logger.error("Borrado pendiente en R2 sin completar al salir: %s", key)
+
+
+def _guarded_call(
+    backend: str,
+    operation: Callable[..., Any],
+    *,
+    check_latency: bool = True,
+    **kwargs: Any,
+) -> Any:
+    breaker = get_breaker(backend)
+    if not breaker.allow_request():
+        raise StorageBackendUnavailable(
+            f"Backend de storage '{backend}' deshabilitado temporalmente (circuit breaker abierto)."
+        )
+    started = time.monotonic()
+    try:
+        result = operation(**kwargs)
+    except Exception:
+        breaker.record(False, time.monotonic() - started, check_latency)
+        raise
+    breaker.record(True, time.monotonic() - started, check_latency)
+    if backend == "r2" and _pending_deletes and breaker.state == CircuitBreaker.CLOSED:
+        _schedule_drain()
+    return result
+
+
 def get_config() -> StorageConfig:
     read_source = os.getenv("STORAGE_READ_SOURCE", "r2").strip().lower()
-    if read_source not in {"r2", "supabase"}:
-        raise ValueError("STORAGE_READ_SOURCE debe ser 'r2' o 'supabase'.")
+    if read_source not in {"r2", "supabase", "local"}:
+        raise ValueError("STORAGE_READ_SOURCE debe ser 'r2', 'supabase' o 'local'.")
     return StorageConfig(
         read_source=read_source,
         dual_write_supabase=_parse_bool(os.getenv("STORAGE_DUAL_WRITE_SUPABASE"), False),
@@ -42,69 +422,150 @@ def get_config() -> StorageConfig:
     )
 
 
-def upload_object(
+def _route_upload(
     key: str,
-    data: bytes,
-    content_type: Optional[str] = None,
-    cache_control: Optional[str] = None,
+    r2_upload: Callable[[], None],
+    supabase_upload: Callable[[], None],
+    local_upload: Callable[[], None],
+    rewind: Callable[[], None] = lambda: None,
+    streaming: bool = False,
 ) -> None:
     config = get_config()
+    if config.read_source == "local":
+        rewind()
+        local_upload()
+        _record_metric("local_upload_success", key=key)
+        return
+
     r2_error: Optional[Exception] = None
 
     for attempt in range(config.r2_write_retries + 1):
         try:
-            r2_storage.upload_object(
-                key=key,
-                data=data,
-                content_type=content_type,
-                cache_control=cache_control,
-            )
+            rewind()
+            _guarded_call("r2", r2_upload, check_latency=not streaming)
             _record_metric("r2_upload_success", key=key, attempt=attempt + 1)
             r2_error = None
             break
+        except StorageBackendUnavailable as exc:
+            # No reintentar contra un backend con el breaker abierto.
+            r2_error = r2_error or exc
+            _record_metric("r2_upload_skipped", key=key, attempt=attempt + 1)
+            break
         except Exception as exc:
             r2_error = exc
             _record_metric("r2_upload_error", key=key, attempt=attempt + 1, error=str(exc))
 
     if r2_error is not None:
         if config.fallback_to_supabase:
-            supabase_storage.upload_object(
-                key=key,
-                data=data,
-                content_type=content_type,
-                cache_control=cache_control,
-            )
+            rewind()
+            _guarded_call("supabase", supabase_upload, check_latency=not streaming)
             _record_metric("supabase_upload_fallback", key=key)
             return
         raise r2_error
 
     if config.dual_write_supabase:
         try:
-            supabase_storage.upload_object(
-                key=key,
-                data=data,
-                content_type=content_type,
-                cache_control=cache_control,
-            )
+            rewind()
+            _guarded_call("supabase", supabase_upload, check_latency=not streaming)
             _record_metric("supabase_upload_success", key=key)
         except Exception as exc:
             logger.warning("Falló dual-write a Supabase para %s: %s", key, exc)
             _record_metric("supabase_upload_error", key=key, error=str(exc))
 
 
+def upload_object(
+    key: str,
+    data: bytes,
+    content_type: Optional[str] = None,
+    cache_control: Optional[str] = None,
+) -> None:
+    _route_upload(
+        key,
+        lambda: r2_storage.upload_object(
+            key=key,
+            data=data,
+            content_type=content_type,
+            cache_control=cache_control,
+        ),
+        lambda: supabase_storage.upload_object(
+            key=key,
+            data=data,
+            content_type=content_type,
+            cache_control=cache_control,
+        ),
+        lambda: local_storage.upload_object(
+            key=key,
+            data=data,
+            content_type=content_type,
+            cache_control=cache_control,
+        ),
+    )
+
+
+def upload_fileobj(
+    key: str,
+    fileobj: BinaryIO,
+    content_type: Optional[str] = None,
+    cache_control: Optional[str] = None,
+) -> None:
+    """
+    Sube un stream sin cargarlo completo en memoria (multipart en R2).
+
+    El stream debe ser seekable: cada reintento, fallback o dual-write vuelve
+    a leerlo desde la posición inicial. Su duración crece con el tamaño, así
+    que no cuenta como llamada lenta para el circuit breaker (los errores sí).
+    """
+    start = fileobj.tell()
+
+    _route_upload(
+        key,
+        lambda: r2_storage.upload_fileobj(
+            key=key,
+            fileobj=fileobj,
+            content_type=content_type,
+            cache_control=cache_control,
+        ),
+        lambda: supabase_storage.upload_fileobj(
+            key=key,
+            fileobj=fileobj,
+            content_type=content_type,
+            cache_control=cache_control,
+        ),
+        lambda: local_storage.upload_fileobj(
+            key=key,
+            fileobj=fileobj,
+            content_type=content_type,
+            cache_control=cache_control,
+        ),
+        rewind=lambda: fileobj.seek(start),
+        streaming=True,
+    )
+
+
 def delete_object(key: str) -> None:
     config = get_config()
+    if config.read_source == "local":
+        local_storage.delete_object(key)
+        _record_metric("local_delete_success", key=key)
+        return
+
     try:
-        r2_storage.delete_object(key)
+        _guarded_call("r2", r2_storage.delete_object, key=key)
         _record_metric("r2_delete_success", key=key)
+    except StorageBackendUnavailable:
+        _record_metric("r2_delete_skipped", key=key)
+        _defer_r2_delete(key)
+        if not config.fallback_to_supabase:
+            raise
     except Exception as exc:
         _record_metric("r2_delete_error", key=key, error=str(exc))
+        _defer_r2_delete(key)
         if not config.fallback_to_supabase:
             raise
 
     if config.dual_write_supabase:
         try:
-            supabase_storage.delete_object(key)
+            _guarded_call("supabase", supabase_storage.delete_object, key=key)
             _record_metric("supabase_delete_success", key=key)
         except Exception as exc:
             logger.warning("Falló borrado en Supabase para %s: %s", key, exc)
@@ -113,6 +574,8 @@ def delete_object(key: str) -> None:
 
 def get_public_url(key: str) -> str:
     config = get_config()
+    if config.read_source == "local":
+        return local_storage.get_public_url(key)
     if config.read_source == "supabase":
         return supabase_storage.get_public_url(key)
 
@@ -1,7 +1,11 @@
 # app/core/supabase_auth.py
 import os
-from typing import Optional
+import threading
+from typing import Optional, Tuple
+
+import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
 from supabase import create_client, Client
 
 load_dotenv()
@@ -14,6 +18,14 @@ if not SUPABASE_URL or not SUPABASE_ANON_KEY:
     raise RuntimeError("Faltan SUPABASE_URL o SUPABASE_ANON_KEY en .env")
 
 _service_client: Optional[Client] = None
+_rest_session: Optional[requests.Session] = None
+_rest_session_lock = threading.Lock()
+
+# (connect, read) para llamadas PostgREST hechas con requests y token de usuario.
+REST_TIMEOUT: Tuple[float, float] = (
+    float(os.getenv("SUPABASE_HTTP_CONNECT_TIMEOUT_SECONDS", "3.05")),
+    float(os.getenv("SUPABASE_HTTP_READ_TIMEOUT_SECONDS", "10")),
+)
 
 def get_public() -> Client:
     """
@@ -45,3 +57,22 @@ def get_service() -> Client:
             raise RuntimeError("Falta SUPABASE_SERVICE_ROLE_KEY en .env")
         _service_client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
     return _service_client
+
+def get_rest_session() -> requests.Session:
+    """
+    Sesión HTTP compartida (keep-alive, pool de conexiones) para llamadas REST
+    directas a Supabase con el JWT del usuario, cuando RLS exige ese token.
+
+    No guarda credenciales: Authorization y apikey van en cada request.
+    """
+    global _rest_session
+    if _rest_session is None:
+        with _rest_session_lock:
+            if _rest_session is None:
+                pool_size = int(os.getenv("SUPABASE_HTTP_POOL_SIZE", "10"))
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _rest_session = session
+    return _rest_session
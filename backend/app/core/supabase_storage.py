@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from io import BufferedReader, FileIO
 import os
-from typing import Optional
+from typing import BinaryIO, Optional
 
 
 @dataclass(frozen=True)
@@ -52,6 +53,19 @@ def upload_object(
     client.storage.from_(config.bucket).upload(key, data, file_options=file_options)
 
 
+def upload_fileobj(
+    key: str,
+    fileobj: BinaryIO,
+    content_type: Optional[str] = None,
+    cache_control: Optional[str] = None,
+) -> None:
+    # storage3 solo acepta bytes o archivos reales (BufferedReader/FileIO);
+    # otros streams (p. ej. SpooledTemporaryFile) se materializan en memoria.
+    # Es la ruta de fallback, no la de escritura principal.
+    data = fileobj if isinstance(fileobj, (BufferedReader, FileIO)) else fileobj.read()
+    upload_object(key, data, content_type=content_type, cache_control=cache_control)
+
+
 def delete_object(key: str) -> None:
     config = get_config()
     client = get_client()
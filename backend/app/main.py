@@ -2,6 +2,10 @@ from fastapi import FastAPI, Request, status, HTTPException
 from fastapi.responses import JSONResponse
 from app.api import routes_species, routes_sectors, routes_auth, routes_ejemplar, routes_debug, routes_photos, routes_audit, routes_transactions, routes_home_content, routes_support_tickets
 from app.middleware.auth_middleware import AuthMiddleware
+from app.middleware.conditional_get import ConditionalGetMiddleware
+from app.middleware.public_traffic import PublicTrafficMiddleware
+from app.core import local_storage, storage_router
+from app.services import audit_service, sectors_service
 from fastapi.middleware.cors import CORSMiddleware
 import os
 import sys
@@ -166,6 +170,15 @@ if "https://cactario-frontend-production.up.railway.app" not in origins:
     origins.append("https://cactario-frontend-production.up.railway.app")
     logger.info("   ➕ Agregado explícitamente: https://cactario-frontend-production.up.railway.app")
 
+# ETag débil + Cache-Control en GET públicos (se ejecuta después del rate limit)
+app.add_middleware(ConditionalGetMiddleware)
+logger.info("   ✅ ConditionalGetMiddleware configurado")
+
+# Límites y load shedding de rutas públicas; va DENTRO de CORS para que los
+# 429/503 lleven las cabeceras CORS y la app pública pueda leerlos.
+app.add_middleware(PublicTrafficMiddleware)
+logger.info("   ✅ PublicTrafficMiddleware configurado")
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -208,6 +221,10 @@ logger.info("   ✅ /home-content/* - Rutas de contenido del home")
 app.include_router(routes_support_tickets.router, prefix="/support-tickets", tags=["Support Tickets"])
 logger.info("   ✅ /support-tickets/* - Rutas de tickets de soporte")
 
+if storage_router.get_config().read_source == "local":
+    app.mount(local_storage.LOCAL_STORAGE_ROUTE, local_storage.create_static_app(), name="local-storage")
+    logger.info(f"   ✅ {local_storage.LOCAL_STORAGE_ROUTE}/* - Archivos del storage local ({local_storage.get_config().root})")
+
 @app.get("/")
 def root():
     """Endpoint raíz de la API"""
@@ -226,6 +243,29 @@ async def health_check():
         "version": "1.0.0"
     }
 
+@app.on_event("startup")
+def load_sector_qr_index():
+    """Precarga el índice qr_code -> sector; si falla, se carga en el primer escaneo."""
+    try:
+        sectors_service.load_qr_index()
+    except Exception as e:
+        logger.warning(f"⚠️  No se pudo precargar el índice QR de sectores: {e}")
+
+@app.on_event("startup")
+def load_pending_storage_deletes():
+    """Retoma los borrados en R2 que quedaron pendientes antes del último reinicio."""
+    if storage_router.get_config().read_source == "local":
+        return
+    try:
+        storage_router.load_pending_deletes()
+    except Exception as e:
+        logger.warning(f"⚠️  No se pudieron cargar los borrados pendientes de R2: {e}")
+
+@app.on_event("shutdown")
+def drain_audit_queue():
+    """Inserta los eventos de auditoría pendientes antes de apagar el proceso."""
+    audit_service.shutdown_writer()
+
 @app.options("/{path:path}")
 async def options_handler(path: str):
     """Handle preflight OPTIONS requests for CORS"""
@@ -2,18 +2,21 @@
 
 import logging
 import os
+from typing import Any, Optional
 
 from fastapi import HTTPException, Request, status
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.types import ASGIApp
 
+from app.core.local_storage import LOCAL_STORAGE_ROUTE
 from app.core.security import (
     IS_PRODUCTION,
+    get_active_user,
     get_token_from_request,
     validate_supabase_jwt,
-    validate_user_active,
 )
+from app.services.audit_service import remember_internal_user_id
 
 logger = logging.getLogger(__name__)
 
@@ -54,6 +57,8 @@ def _is_public_path(path: str, method: str) -> bool:
         return True
     if any(path == prefix or path.startswith(f"{prefix}/") for prefix in PUBLIC_API_PREFIXES):
         return True
+    if method in ("GET", "HEAD") and path.startswith(f"{LOCAL_STORAGE_ROUTE}/"):
+        return True
     return method == "GET" and (path == "/photos" or path.startswith("/photos/"))
 
 
@@ -109,13 +114,22 @@ class AuthMiddleware(BaseHTTPMiddleware):
                 "Token inválido o expirado",
             )
 
-        if not validate_user_active(user_claims["id"]):
+        active_user = get_active_user(user_claims["id"])
+        if not active_user:
             return _auth_error(
                 request,
                 status.HTTP_403_FORBIDDEN,
                 "Cuenta de usuario inactiva",
             )
 
+        # usuarios.id viaja con el usuario (get_audit_user_id) y queda en cache
+        # para los llamados que solo traen el uid de Supabase
+        user_claims["internal_id"] = active_user.get("id")
+        remember_internal_user_id(
+            user_claims["internal_id"],
+            supabase_uid=user_claims["id"],
+            user_email=user_claims.get("email"),
+        )
         request.state.user = user_claims
         return await call_next(request)
 
@@ -137,3 +151,14 @@ def get_current_user(request: Request) -> dict:
             detail="Usuario no autenticado",
         )
     return request.state.user
+
+
+def get_audit_user_id(user: Optional[dict]) -> Optional[Any]:
+    """
+    user_id para los servicios que auditan: el usuarios.id que AuthMiddleware
+    ya resolvió, así log_change y create_purchase no vuelven a consultar
+    usuarios; si falta (bypass local), el uid de Supabase.
+    """
+    if not user:
+        return None
+    return user.get("internal_id") or user.get("id")
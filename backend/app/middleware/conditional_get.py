@@ -0,0 +1,97 @@
+"""
+ETag y Cache-Control para GET públicos; If-None-Match coincidente responde 304
+"""
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.utils.http_cache import compute_body_etag, etag_matches
+
+
+@dataclass(frozen=True)
+class CacheRule:
+    prefix: str
+    cache_control: str
+
+    def matches(self, path: str) -> bool:
+        return path == self.prefix or path.startswith(f"{self.prefix}/")
+
+
+# /photos lo usa también el WMS justo después de subir o borrar fotos, por eso
+# siempre revalida; especies y sectores públicos solo cambian por edición de staff.
+DEFAULT_CACHE_RULES = (
+    CacheRule("/species/public", "public, max-age=60, stale-while-revalidate=300"),
+    CacheRule("/sectors/public", "public, max-age=60, stale-while-revalidate=300"),
+    CacheRule("/photos", "public, no-cache"),
+)
+
+# Cabeceras que no van en un 304 (RFC 9110 §15.4.5)
+_NOT_MODIFIED_DROP = ("content-length", "content-type", "content-encoding")
+
+
+class ConditionalGetMiddleware:
+    """
+    Para GET 200 de las rutas en ``rules``: calcula un ETag débil sobre el
+    cuerpo serializado, agrega ``Cache-Control`` de la regla y responde 304 sin
+    cuerpo si If-None-Match coincide. Las respuestas que ya traen ETag (p. ej.
+    /home-content/public) pasan sin cambios.
+    """
+
+    def __init__(self, app: ASGIApp, rules: Optional[Iterable[CacheRule]] = None):
+        self.app = app
+        self.rules: List[CacheRule] = list(rules) if rules is not None else list(DEFAULT_CACHE_RULES)
+
+    def _match(self, path: str) -> Optional[CacheRule]:
+        for rule in self.rules:
+            if rule.matches(path):
+                return rule
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        rule = self._match(scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        start: Optional[Message] = None
+        chunks: List[bytes] = []
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if message["status"] != 200 or "etag" in headers:
+                    passthrough = True
+                    await send(message)
+                    return
+                start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(chunks)
+            etag = compute_body_etag(body)
+            headers = MutableHeaders(raw=list(start["headers"]))
+            headers["ETag"] = etag
+            headers.setdefault("Cache-Control", rule.cache_control)
+            if etag_matches(if_none_match, etag):
+                raw = [(key, value) for key, value in headers.raw if key.decode("latin-1") not in _NOT_MODIFIED_DROP]
+                await send({"type": "http.response.start", "status": 304, "headers": raw})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            await send({"type": "http.response.start", "status": 200, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,133 @@
+"""
+Protección de endpoints públicos: límites por ruta y cliente + load shedding
+"""
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.middleware.rate_limiter import GCRALimiter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PublicRouteLimit:
+    prefix: str
+    limit: int
+    window_seconds: int
+    methods: Tuple[str, ...] = ("GET", "HEAD")
+
+    def matches(self, path: str, method: str) -> bool:
+        return method in self.methods and (path == self.prefix or path.startswith(f"{self.prefix}/"))
+
+
+DEFAULT_PUBLIC_LIMITS = (
+    PublicRouteLimit("/species/public", 120, 60),
+    PublicRouteLimit("/sectors/public", 120, 60),
+    PublicRouteLimit("/home-content/public", 60, 60),
+    PublicRouteLimit("/photos", 240, 60),
+)
+
+
+def parse_public_limits(raw: Optional[str]) -> List[PublicRouteLimit]:
+    """
+    Interpreta PUBLIC_RATE_LIMITS (``/prefijo=limite/ventana`` separados por
+    coma) sobre los valores por defecto; ``limite`` 0 desactiva el prefijo.
+    """
+    limits = {rule.prefix: rule for rule in DEFAULT_PUBLIC_LIMITS}
+    for item in (raw or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            prefix, spec = item.split("=", 1)
+            limit, window = spec.split("/", 1)
+            rule = PublicRouteLimit(prefix.strip().rstrip("/"), int(limit), int(window))
+        except ValueError:
+            logger.warning(f"[public_traffic] Regla inválida en PUBLIC_RATE_LIMITS: '{item}'")
+            continue
+        limits[rule.prefix] = rule
+    return [rule for rule in limits.values() if rule.limit > 0]
+
+
+class PublicTrafficMiddleware:
+    """
+    Middleware ASGI para el tráfico público (app-qr, scrapers):
+
+    - Límite GCRA por (prefijo, IP) según ``rules``; al excederlo responde 429
+      con Retry-After. Siempre en memoria del proceso: RATE_LIMIT_BACKEND solo
+      aplica a los límites de auth, para no sumar una RPC a cada request público.
+    - Load shedding: si hay ``max_in_flight`` peticiones públicas en curso en
+      este proceso, las nuevas reciben 503 con Retry-After en vez de encolarse.
+      Se revisa antes del límite, así un pico se descarta sin gastar tokens.
+
+    Las rutas de staff no cuentan ni se descartan, así que un pico público no
+    puede ocupar todo el threadpool que usan las operaciones del WMS.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        rules: Optional[Iterable[PublicRouteLimit]] = None,
+        max_in_flight: Optional[int] = None,
+        shed_retry_after: Optional[int] = None,
+        limiter: Optional[GCRALimiter] = None,
+    ):
+        self.app = app
+        self.rules = list(rules) if rules is not None else parse_public_limits(os.getenv("PUBLIC_RATE_LIMITS"))
+        self.max_in_flight = max_in_flight if max_in_flight is not None else int(os.getenv("PUBLIC_MAX_IN_FLIGHT", "32"))
+        self.shed_retry_after = shed_retry_after if shed_retry_after is not None else int(os.getenv("PUBLIC_SHED_RETRY_AFTER_SECONDS", "2"))
+        self.limiter = limiter if limiter is not None else GCRALimiter()
+        self.in_flight = 0
+
+    def _match(self, path: str, method: str) -> Optional[PublicRouteLimit]:
+        for rule in self.rules:
+            if rule.matches(path, method):
+                return rule
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rule = self._match(scope["path"], scope["method"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
+        if self.max_in_flight > 0 and self.in_flight >= self.max_in_flight:
+            logger.warning(f"[public_traffic] {self.in_flight} peticiones públicas en curso, descartando {scope['path']}")
+            await _reject(send, 503, "Servicio saturado, intenta nuevamente en unos segundos.", self.shed_retry_after)
+            return
+
+        is_allowed, retry_after = self.limiter.hit((rule.prefix, client_ip), rule.limit, rule.window_seconds)
+        if not is_allowed:
+            await _reject(send, 429, f"Demasiadas peticiones. Intenta nuevamente en {retry_after} segundos.", retry_after)
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+
+async def _reject(send: Send, status_code: int, detail: str, retry_after: int) -> None:
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+            (b"retry-after", str(retry_after).encode("ascii")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
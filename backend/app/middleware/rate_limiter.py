@@ -1,17 +1,144 @@
 """
 Rate limiting middleware for authentication endpoints
 """
-from typing import Dict, Tuple
-from datetime import datetime, timedelta
+from typing import Callable, Hashable, Optional, Protocol, Tuple
+from collections import OrderedDict
 from fastapi import Request, HTTPException, status
-from collections import defaultdict
+import logging
+import math
+import os
 import threading
+import time
+
+logger = logging.getLogger(__name__)
 
 # Máximo de IPs distintas a rastrear simultáneamente (evita memory leak con IPs únicas)
 _MAX_TRACKED_IPS = 10_000
+_LOCK_STRIPES = 16
+
+
+class GCRALimiter:
+    """
+    Generic Cell Rate Algorithm: por clave solo se guarda el TAT (theoretical
+    arrival time), así que cada chequeo es O(1) sin importar el límite.
+
+    Con ``limit`` peticiones por ``window_seconds`` se emite una cada
+    ``window / limit`` segundos y se tolera una ráfaga de ``limit``. Las claves
+    se reparten en franjas con lock propio (sin un lock global) y cada franja
+    descarta por LRU al superar su cuota de ``max_keys``.
+    """
+
+    def __init__(
+        self,
+        max_keys: int = _MAX_TRACKED_IPS,
+        stripes: int = _LOCK_STRIPES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._clock = clock
+        self._stripes = [
+            (threading.Lock(), OrderedDict())
+            for _ in range(max(1, stripes))
+        ]
+        self._max_per_stripe = max(1, math.ceil(max_keys / len(self._stripes)))
+
+    def hit(self, key: Hashable, limit: int, window_seconds: float) -> Tuple[bool, int]:
+        """
+        Registra una petición para ``key``.
+
+        Returns:
+            (permitida, segundos): si se rechaza, cuánto esperar (Retry-After);
+            si se permite, cuánto falta para recuperar la ráfaga completa.
+        """
+        limit = max(1, limit)
+        emission_interval = window_seconds / limit
+        lock, entries = self._stripes[hash(key) % len(self._stripes)]
+
+        with lock:
+            now = self._clock()
+            tat = max(entries.get(key, now), now)
+            # Se compara el retraso acumulado (tat - now) y no now + intervalo -
+            # ventana: ese redondeo de floats rechazaba la primera petición.
+            excess = (tat - now) - (window_seconds - emission_interval)
+            if excess > 0:
+                entries.move_to_end(key)
+                return False, max(1, math.ceil(excess))
+
+            new_tat = tat + emission_interval
+            entries[key] = new_tat
+            entries.move_to_end(key)
+            if len(entries) > self._max_per_stripe:
+                entries.popitem(last=False)
+            return True, math.ceil(new_tat - now)
+
+    def clear(self) -> None:
+        for lock, entries in self._stripes:
+            with lock:
+                entries.clear()
+
+    def __len__(self) -> int:
+        return sum(len(entries) for _, entries in self._stripes)
+
+
+class RateLimitBackend(Protocol):
+    def hit(self, key: Hashable, limit: int, window_seconds: float) -> Tuple[bool, int]:
+        ...
+
+
+class SupabaseRateLimitBackend:
+    """
+    GCRA compartido entre workers y réplicas vía la RPC ``rate_limit_hit``:
+    un upsert atómico por clave en una tabla UNLOGGED (solo lock de fila, sin
+    lock global). Si la RPC falla se cae al limitador en memoria del proceso.
+    """
 
-_rate_limit_store: Dict[Tuple[str, str], list] = defaultdict(list)
-_rate_limit_lock = threading.Lock()
+    def __init__(self, client_factory: Optional[Callable] = None, fallback: Optional[GCRALimiter] = None):
+        if client_factory is None:
+            from app.core.supabase_auth import get_service
+            client_factory = get_service
+        self._client_factory = client_factory
+        self._fallback = fallback or GCRALimiter()
+
+    def hit(self, key: Hashable, limit: int, window_seconds: float) -> Tuple[bool, int]:
+        rpc_key = ":".join(map(str, key)) if isinstance(key, tuple) else str(key)
+        try:
+            res = self._client_factory().rpc("rate_limit_hit", {
+                "p_key": rpc_key,
+                "p_limit": limit,
+                "p_window_seconds": window_seconds,
+            }).execute()
+            row = res.data[0] if isinstance(res.data, list) else res.data
+            return bool(row["allowed"]), int(row["retry_after"])
+        except Exception as e:
+            logger.warning(f"[rate_limiter] RPC rate_limit_hit falló, usando límite local: {str(e)}")
+            return self._fallback.hit(key, limit, window_seconds)
+
+
+RATE_LIMIT_BACKENDS = ("memory", "supabase")
+
+_rate_limit_store = GCRALimiter()
+_backend: Optional[RateLimitBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_rate_limit_backend() -> RateLimitBackend:
+    """Backend según RATE_LIMIT_BACKEND: ``memory`` (default) o ``supabase``."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower()
+                if name not in RATE_LIMIT_BACKENDS:
+                    logger.warning(f"[rate_limiter] RATE_LIMIT_BACKEND desconocido '{name}', usando memory")
+                    name = "memory"
+                _backend = SupabaseRateLimitBackend(fallback=_rate_limit_store) if name == "supabase" else _rate_limit_store
+    return _backend
+
+
+def set_rate_limit_backend(backend: Optional[RateLimitBackend]) -> None:
+    """Reemplaza el backend (tests o arranque); ``None`` vuelve a leer RATE_LIMIT_BACKEND."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
 
 
 def check_rate_limit(
@@ -22,44 +149,10 @@ def check_rate_limit(
 ) -> Tuple[bool, int]:
     """
     Check if request is within rate limit.
-    Purga entradas vacías para evitar memory leak con IPs únicas.
+    Retorna (permitida, segundos restantes) por (scope, IP del cliente).
     """
-    now = datetime.now()
     client_ip = request.client.host if request.client else "unknown"
-    store_key = (scope, client_ip)
-
-    with _rate_limit_lock:
-        # Purgar IPs en exceso si el dict creció demasiado (FIFO simple)
-        if len(_rate_limit_store) > _MAX_TRACKED_IPS:
-            oldest_keys = list(_rate_limit_store.keys())[:len(_rate_limit_store) - _MAX_TRACKED_IPS]
-            for key in oldest_keys:
-                del _rate_limit_store[key]
-
-        cutoff_time = now - timedelta(seconds=window_seconds)
-        client_requests = [t for t in _rate_limit_store[store_key] if t > cutoff_time]
-
-        if len(client_requests) >= limit:
-            oldest_request = min(client_requests)
-            time_remaining = int((oldest_request + timedelta(seconds=window_seconds) - now).total_seconds())
-            # Actualizar sin la entrada actual (ya descartamos la anterior)
-            _rate_limit_store[store_key] = client_requests
-            return False, max(0, time_remaining)
-
-        client_requests.append(now)
-
-        # Purgar entrada si quedó vacía (libera memoria de IPs inactivas)
-        if client_requests:
-            _rate_limit_store[store_key] = client_requests
-        elif store_key in _rate_limit_store:
-            del _rate_limit_store[store_key]
-
-        if len(client_requests) > 1:
-            oldest_request = min(client_requests)
-            time_remaining = int((oldest_request + timedelta(seconds=window_seconds) - now).total_seconds())
-        else:
-            time_remaining = window_seconds
-
-        return True, time_remaining
+    return get_rate_limit_backend().hit((scope, client_ip), limit, window_seconds)
 
 
 def rate_limit_decorator(limit: int, window_seconds: int):
@@ -69,15 +162,14 @@ def rate_limit_decorator(limit: int, window_seconds: int):
     def decorator(func):
         async def wrapper(request: Request, *args, **kwargs):
             is_allowed, time_remaining = check_rate_limit(request, limit, window_seconds)
-            
+
             if not is_allowed:
                 raise HTTPException(
                     status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                     detail=f"Demasiadas peticiones. Intenta nuevamente en {time_remaining} segundos.",
                     headers={"Retry-After": str(time_remaining)}
                 )
-            
+
             return await func(request, *args, **kwargs)
         return wrapper
     return decorator
-
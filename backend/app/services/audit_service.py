@@ -1,13 +1,46 @@
 """
 Servicio de auditoría para registrar cambios en la base de datos
 """
+import atexit
+import base64
+import csv
+import io
+import json
 import logging
-from typing import Dict, Any, List, Optional, Tuple
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from app.core.supabase_auth import get_public, get_service
+from app.services.audit_writer import AuditWriter, writer_from_env
+from app.services.query_helpers import chunked, fetch_all_by_ids, fetch_all_pages
+from app.utils.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 AUDIT_ACTIONS = frozenset({"CREATE", "UPDATE", "DELETE", "PURCHASE", "SALE"})
 
+# supabase_uid / email -> usuarios.id. Lo llena AuthMiddleware al autenticar,
+# así las escrituras de auditoría no vuelven a consultar usuarios.
+_internal_user_ids: TTLCache[int] = TTLCache(
+    max_entries=int(os.getenv("AUDIT_USER_CACHE_MAX", "1024")),
+    ttl_seconds=float(os.getenv("AUDIT_USER_CACHE_TTL_SECONDS", "300")),
+)
+
+
+def remember_internal_user_id(
+    internal_id: Optional[int],
+    supabase_uid: Optional[str] = None,
+    user_email: Optional[str] = None,
+) -> None:
+    """Registra en cache el usuarios.id ya resuelto para una identidad autenticada."""
+    if internal_id is None:
+        return
+    if supabase_uid:
+        _internal_user_ids.set(("uid", supabase_uid), internal_id)
+    if user_email:
+        _internal_user_ids.set(("email", user_email.lower()), internal_id)
+
+
 def resolve_internal_user_id(user_id: Optional[Any], user_email: Optional[str]) -> Optional[int]:
     """Resuelve el identificador autenticado al bigint de public.usuarios."""
     if user_id is None and not user_email:
@@ -22,16 +55,29 @@ def resolve_internal_user_id(user_id: Optional[Any], user_email: Optional[str])
         except ValueError:
             return None
 
+    if isinstance(user_id, str) and user_id:
+        cached = _internal_user_ids.get(("uid", user_id))
+        if cached is not None:
+            return cached
+    if user_email:
+        cached = _internal_user_ids.get(("email", user_email.lower()))
+        if cached is not None:
+            return cached
+
     try:
         sb_admin = get_service()
         if isinstance(user_id, str) and user_id:
             result = sb_admin.table("usuarios").select("id").eq("supabase_uid", user_id).limit(1).execute()
             if result.data:
-                return result.data[0].get("id")
+                internal_id = result.data[0].get("id")
+                remember_internal_user_id(internal_id, supabase_uid=user_id, user_email=user_email)
+                return internal_id
         if user_email:
             result = sb_admin.table("usuarios").select("id").eq("email", user_email).limit(1).execute()
             if result.data:
-                return result.data[0].get("id")
+                internal_id = result.data[0].get("id")
+                remember_internal_user_id(internal_id, user_email=user_email)
+                return internal_id
     except Exception:
         return None
 
@@ -52,6 +98,162 @@ def _compute_changes(old_values: Optional[Dict[str, Any]], new_values: Optional[
 
     return changes_detected or None
 
+def _insert_events(events: List[Dict[str, Any]]) -> None:
+    """Resuelve usuarios.id y hace un único insert multi-fila en auditoria_cambios."""
+    resolved: Dict[Tuple[Any, Optional[str]], Optional[int]] = {}
+    rows = []
+    compact_rows = []
+    for event in events:
+        row = dict(event["row"])
+        row.setdefault("es_snapshot", False)
+        identity = (event.get("user_ref"), row.get("usuario_email"))
+        if identity not in resolved:
+            resolved[identity] = resolve_internal_user_id(*identity)
+        row["usuario_id"] = resolved[identity]
+        rows.append(row)
+        if event.get("snapshot_check"):
+            compact_rows.append(row)
+
+    if compact_rows:
+        _apply_periodic_snapshots(compact_rows)
+    get_service().table('auditoria_cambios').insert(rows).execute()
+    logger.debug("[Audit] %s eventos insertados", len(rows))
+
+
+_writer: Optional[AuditWriter] = None
+_writer_lock = threading.Lock()
+
+
+def _is_async_enabled() -> bool:
+    return os.getenv("AUDIT_WRITE_MODE", "async").strip().lower() != "sync"
+
+
+def get_writer() -> AuditWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = writer_from_env(_insert_events)
+            _writer.start()
+            atexit.register(_writer.shutdown)
+        return _writer
+
+
+def flush_pending() -> None:
+    """Inserta de inmediato los eventos en cola (no espera el lote que el hilo ya tomó)."""
+    if _writer is not None:
+        _writer.flush()
+
+
+def shutdown_writer() -> None:
+    """Drena la cola de auditoría; se llama al apagar la aplicación."""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.shutdown()
+
+
+def _is_compact_enabled() -> bool:
+    return os.getenv("AUDIT_STORAGE_MODE", "compact").strip().lower() == "compact"
+
+
+def _snapshot_every() -> int:
+    return max(1, int(os.getenv("AUDIT_SNAPSHOT_EVERY", "20")))
+
+
+def _updates_since_snapshot(sb, table_name: str, record_ids: List[int], limit: int) -> Dict[int, int]:
+    """
+    UPDATEs de cada registro en el log desde su último snapshot o CREATE
+    (hasta ``limit``), con una consulta por tabla para todo el lote.
+    """
+    counts = {record_id: 0 for record_id in record_ids}
+    if limit <= 0 or not record_ids:
+        return counts
+    closed = set()
+    for ids_chunk in chunked(record_ids):
+        # Los eventos más recientes primero; a lo más ``limit`` por registro
+        events = fetch_all_pages(
+            lambda ids_chunk=ids_chunk: sb.table('auditoria_cambios').select('registro_id, accion, es_snapshot')
+            .eq('tabla_afectada', table_name)
+            .in_('registro_id', ids_chunk)
+            .in_('accion', ['CREATE', 'UPDATE'])
+            .order('created_at', desc=True)
+            .order('id', desc=True),
+            max_rows=len(ids_chunk) * limit,
+        )
+        for event in events:
+            record_id = event.get('registro_id')
+            if record_id not in counts or record_id in closed:
+                continue
+            if event.get('es_snapshot') or event.get('accion') == 'CREATE':
+                closed.add(record_id)
+                continue
+            counts[record_id] += 1
+            if counts[record_id] >= limit:
+                closed.add(record_id)
+    return counts
+
+
+def _matches_changes(row: Dict[str, Any], changes: Optional[Dict[str, Any]]) -> bool:
+    """
+    La fila actual sirve de snapshot solo si coincide con el cambio auditado;
+    si no, hubo otra escritura entremedio y ese UPDATE queda como diff.
+    """
+    for key, change in (changes or {}).items():
+        if key in row and row[key] != (change or {}).get('nuevo'):
+            return False
+    return True
+
+
+def _apply_periodic_snapshots(rows: List[Dict[str, Any]]) -> None:
+    """
+    Modo compacto: cada AUDIT_SNAPSHOT_EVERY UPDATEs de un registro (contados
+    en el log, así no depende del proceso) el evento guarda la fila completa
+    leída de la tabla y queda marcado con es_snapshot. Los callers pueden
+    auditar solo parte de la fila, por eso el snapshot nunca sale de sus
+    campos_nuevos. Cada tabla del lote suma dos consultas: los conteos y las
+    filas de los registros que llegan al umbral.
+    """
+    sb = get_service()
+    every = _snapshot_every()
+    batch_updates: Dict[str, Dict[int, int]] = {}
+    for row in rows:
+        per_table = batch_updates.setdefault(row['tabla_afectada'], {})
+        per_table[row['registro_id']] = per_table.get(row['registro_id'], 0) + 1
+
+    since: Dict[Tuple[str, int], int] = {}
+    full_rows: Dict[Tuple[str, int], Dict[str, Any]] = {}
+    for table_name, updates in batch_updates.items():
+        try:
+            counts = _updates_since_snapshot(sb, table_name, list(updates), every - 1)
+            due_ids = [record_id for record_id, count in counts.items() if count + updates[record_id] >= every]
+            for full_row in fetch_all_by_ids(sb, table_name, '*', 'id', due_ids) if due_ids else []:
+                full_rows[(table_name, full_row['id'])] = full_row
+        except Exception as e:
+            logger.warning(f"[Audit] No se pudo evaluar snapshots de {table_name}: {str(e)}")
+            continue
+        for record_id, count in counts.items():
+            since[(table_name, record_id)] = count
+
+    for row in rows:
+        key = (row['tabla_afectada'], row['registro_id'])
+        if key not in since:
+            continue  # la consulta de conteo falló: el evento queda como diff
+        full_row = full_rows.get(key)
+        if since[key] + 1 >= every and full_row is not None and _matches_changes(full_row, row.get('cambios_detectados')):
+            row['campos_nuevos'] = full_row
+            row['es_snapshot'] = True
+            since[key] = 0
+            continue
+        since[key] += 1
+
+
+def _is_login_event(table_name: str, new_values: Optional[Dict[str, Any]]) -> bool:
+    # routes_auth registra los logins como UPDATE de usuarios con solo "evento";
+    # no cambian la fila, así que no cuentan para los snapshots.
+    return table_name == 'usuarios' and set(new_values or {}) == {'evento'}
+
+
 def log_change(
     table_name: str,
     record_id: int,
@@ -66,6 +268,10 @@ def log_change(
 ) -> None:
     """
     Registra un cambio en la tabla de auditoría.
+
+    Por defecto el evento se encola y se inserta en lote desde un hilo de
+    fondo (ver audit_writer); con AUDIT_WRITE_MODE=sync se inserta en la
+    misma llamada.
     
     Args:
         table_name: Nombre de la tabla afectada (ej: 'especies', 'sectores')
@@ -83,76 +289,136 @@ def log_change(
         if action not in AUDIT_ACTIONS:
             raise ValueError(f"Acción de auditoría no soportada: {action}")
 
-        logger.info(f"[Audit] ========== INICIO log_change ==========")
-        logger.info(f"[Audit] Parámetros recibidos: table={table_name}, record_id={record_id}, action={action}, user_id={user_id}, user_email={user_email}")
-        
-        # Usar service client para bypass RLS y asegurar que siempre se puedan insertar logs
-        try:
-            sb = get_service()
-            logger.info("[Audit] Cliente Supabase service obtenido correctamente")
-        except Exception as sb_error:
-            logger.error(f"[Audit] Error al obtener cliente Supabase service: {str(sb_error)}", exc_info=True)
-            raise
-        
         # Para UPDATE, detectar solo los campos que cambiaron
         changes_detected = _compute_changes(old_values, new_values) if action == 'UPDATE' else None
-        
-        normalized_user_id = resolve_internal_user_id(user_id, user_email)
-
-        # Preparar datos para insertar
-        audit_data = {
-            'tabla_afectada': table_name,
-            'registro_id': record_id,
-            'accion': action,
-            'usuario_id': normalized_user_id,
-            'usuario_email': user_email,
-            'usuario_nombre': user_name,
-            'campos_anteriores': old_values,
-            'campos_nuevos': new_values,
-            'cambios_detectados': changes_detected,
-            'ip_address': ip_address,
-            'user_agent': user_agent
+        snapshot_check = bool(
+            action == 'UPDATE' and old_values and _is_compact_enabled()
+            and not _is_login_event(table_name, new_values)
+        )
+        if snapshot_check:
+            # Solo el diff; el writer decide si este evento lleva snapshot
+            old_values, new_values = None, None
+
+        event = {
+            'user_ref': user_id,
+            'snapshot_check': snapshot_check,
+            'row': {
+                'tabla_afectada': table_name,
+                'registro_id': record_id,
+                'accion': action,
+                'usuario_id': None,
+                'usuario_email': user_email,
+                'usuario_nombre': user_name,
+                'campos_anteriores': old_values,
+                'campos_nuevos': new_values,
+                'cambios_detectados': changes_detected,
+                'ip_address': ip_address,
+                'user_agent': user_agent,
+                # Fecha del cambio, no del flush del lote
+                'created_at': datetime.now(timezone.utc).isoformat(),
+            },
         }
-        
-        logger.info(f"[Audit] Datos preparados para insertar (sin campos grandes): tabla={table_name}, registro_id={record_id}, accion={action}, usuario_id={user_id}, usuario_email={user_email}")
-        
-        # Insertar en la tabla de auditoría
-        try:
-            logger.info(f"[Audit] Ejecutando insert en tabla 'auditoria_cambios'...")
-            result = sb.table('auditoria_cambios').insert(audit_data).execute()
-            logger.info(f"[Audit] Insert ejecutado. Resultado recibido: {type(result)}")
-            
-            if result.data:
-                log_id = result.data[0].get('id') if result.data else None
-                logger.info(f"[Audit] Cambio registrado exitosamente: {action} en {table_name} (ID: {record_id}) por usuario {user_email or user_id}")
-                logger.info(f"[Audit] ID del log creado: {log_id}")
-            else:
-                logger.warning("[Audit] Insert ejecutado pero result.data está vacío o es None")
-                logger.warning(f"[Audit] result completo: {result}")
-        except Exception as insert_error:
-            logger.error(f"[Audit] Error al ejecutar insert: {str(insert_error)}", exc_info=True)
-            logger.error(f"[Audit] Tipo de error: {type(insert_error).__name__}")
-            if hasattr(insert_error, 'message'):
-                logger.error(f"[Audit] Mensaje de error: {insert_error.message}")
-            if hasattr(insert_error, 'details'):
-                logger.error(f"[Audit] Detalles: {insert_error.details}")
-            if hasattr(insert_error, 'code'):
-                logger.error(f"[Audit] Código de error: {insert_error.code}")
-            raise
-        
-        logger.info(f"[Audit] ========== FIN log_change (éxito) ==========")
-        
+
+        if _is_async_enabled():
+            get_writer().submit(event)
+        else:
+            _insert_events([event])
+        logger.debug(f"[Audit] {action} en {table_name} (ID: {record_id}) por usuario {user_email or user_id}")
     except Exception as e:
         # No fallar la operación principal si la auditoría falla
-        logger.error(f"[Audit] ========== FIN log_change (ERROR) ==========")
         logger.error(f"[Audit] Error al registrar cambio: {str(e)}", exc_info=True)
-        logger.error(f"[Audit] Tipo de error: {type(e).__name__}")
-        if hasattr(e, 'message'):
-            logger.error(f"[Audit] Mensaje de error: {e.message}")
-        if hasattr(e, 'details'):
-            logger.error(f"[Audit] Detalles: {e.details}")
-        if hasattr(e, 'code'):
-            logger.error(f"[Audit] Código de error: {e.code}")
+
+
+AUDIT_COUNT_MODES = ("exact", "planned", "estimated", "none")
+
+
+def encode_audit_cursor(row: Dict[str, Any]) -> str:
+    payload = json.dumps({"c": row.get("created_at"), "i": row.get("id")}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_audit_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        created_at, row_id = payload["c"], int(payload["i"])
+    except (ValueError, KeyError, TypeError) as error:
+        raise ValueError("Cursor de auditoría inválido") from error
+    if not isinstance(created_at, str) or not created_at:
+        raise ValueError("Cursor de auditoría inválido")
+    return created_at, row_id
+
+
+def _apply_audit_filters(query, table_name: Optional[str], record_id: Optional[int], user_id: Optional[int]):
+    if table_name:
+        query = query.eq('tabla_afectada', table_name)
+    if record_id:
+        query = query.eq('registro_id', record_id)
+    if user_id:
+        query = query.eq('usuario_id', user_id)
+    return query
+
+
+def _apply_audit_cursor(query, cursor: Optional[str]):
+    """Keyset sobre (created_at, id) descendente: filas estrictamente anteriores al cursor."""
+    if not cursor:
+        return query
+    created_at, row_id = decode_audit_cursor(cursor)
+    return query.or_(
+        f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{row_id})'
+    )
+
+
+def get_audit_page(
+    table_name: Optional[str] = None,
+    record_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    limit: int = 100,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    count_mode: str = "exact",
+) -> Dict[str, Any]:
+    """
+    Obtiene una página del historial de auditoría con un único request.
+
+    Los datos y el conteo vienen en la misma respuesta de PostgREST
+    (``count_mode``: exact, planned, estimated o none). Con ``cursor`` se
+    pagina por keyset sobre (created_at, id) e ``offset`` se ignora; en ese
+    caso el conteo corresponde a las filas restantes desde el cursor.
+
+    Returns:
+        {"logs": [...], "total": int | None, "next_cursor": str | None}
+    """
+    if count_mode not in AUDIT_COUNT_MODES:
+        raise ValueError(f"count_mode debe ser uno de {', '.join(AUDIT_COUNT_MODES)}")
+    if cursor:
+        decode_audit_cursor(cursor)
+
+    try:
+        # Usar service client para bypass RLS y poder leer todos los logs
+        sb = get_service()
+
+        query = sb.table('auditoria_cambios').select(
+            '*', count=None if count_mode == "none" else count_mode
+        )
+        query = _apply_audit_filters(query, table_name, record_id, user_id)
+        query = _apply_audit_cursor(query, cursor)
+        query = query.order('created_at', desc=True).order('id', desc=True)
+        if cursor:
+            query = query.limit(limit)
+        else:
+            query = query.range(offset, offset + limit - 1)
+        result = query.execute()
+
+        logs = result.data or []
+        total = getattr(result, 'count', None)
+        next_cursor = encode_audit_cursor(logs[-1]) if len(logs) == limit else None
+        logger.debug(f"[Audit] Obtenidos {len(logs)} logs (limit={limit}, offset={offset}, cursor={bool(cursor)}, total={total})")
+        return {"logs": logs, "total": total, "next_cursor": next_cursor}
+    except Exception as e:
+        logger.error(f"[Audit] Error al obtener historial: {str(e)}", exc_info=True)
+        raise RuntimeError(f"No se pudo obtener el historial de auditoría: {e}") from e
+
 
 def get_audit_log(
     table_name: Optional[str] = None,
@@ -174,49 +440,179 @@ def get_audit_log(
     Returns:
         Tupla con los registros de la página y el total filtrado
     """
-    try:
-        # Usar service client para bypass RLS y poder leer todos los logs
-        sb = get_service()
-        
-        # Primero verificar si la tabla existe y tiene datos
-        count_query = sb.table('auditoria_cambios').select('id', count='exact')
-        if table_name:
-            count_query = count_query.eq('tabla_afectada', table_name)
-        if record_id:
-            count_query = count_query.eq('registro_id', record_id)
-        if user_id:
-            count_query = count_query.eq('usuario_id', user_id)
-        
-        total_count = 0
+    page = get_audit_page(
+        table_name=table_name,
+        record_id=record_id,
+        user_id=user_id,
+        limit=limit,
+        offset=offset,
+    )
+    return page["logs"], page["total"] or 0
+
+
+AUDIT_EXPORT_FORMATS = ("csv", "ndjson")
+AUDIT_EXPORT_COLUMNS = (
+    'id', 'created_at', 'tabla_afectada', 'registro_id', 'accion',
+    'usuario_id', 'usuario_email', 'usuario_nombre',
+    'campos_anteriores', 'campos_nuevos', 'cambios_detectados',
+    'ip_address', 'user_agent',
+)
+_JSON_COLUMNS = ('campos_anteriores', 'campos_nuevos', 'cambios_detectados')
+
+
+def iter_audit_rows(
+    table_name: Optional[str] = None,
+    record_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    page_size: int = 1000,
+) -> Iterator[Dict[str, Any]]:
+    """Recorre todo el historial filtrado por keyset, una página en memoria a la vez."""
+    cursor = None
+    while True:
+        page = get_audit_page(
+            table_name=table_name,
+            record_id=record_id,
+            user_id=user_id,
+            limit=page_size,
+            cursor=cursor,
+            count_mode="none",
+        )
+        yield from page["logs"]
+        cursor = page["next_cursor"]
+        if not cursor:
+            return
+
+
+def iter_audit_export(
+    export_format: str,
+    table_name: Optional[str] = None,
+    record_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    page_size: int = 1000,
+) -> Iterator[str]:
+    """
+    Genera el export de auditoría como CSV o NDJSON, un chunk por página.
+
+    En CSV las columnas JSON (campos_anteriores, campos_nuevos,
+    cambios_detectados) se serializan como texto JSON dentro de la celda.
+
+    El status 200 ya se envió cuando empieza el stream: si una página falla,
+    el export termina con un marcador de error (línea ``{"error": ...}`` en
+    NDJSON, comentario ``# ERROR`` en CSV) para que no parezca completo.
+    """
+    if export_format not in AUDIT_EXPORT_FORMATS:
+        raise ValueError(f"Formato debe ser uno de {', '.join(AUDIT_EXPORT_FORMATS)}")
+
+    rows = iter_audit_rows(table_name, record_id, user_id, page_size=page_size)
+    exported = 0
+    if export_format == "ndjson":
         try:
-            count_query = count_query.limit(1)
-            count_result = count_query.execute()
-            count_value = getattr(count_result, 'count', None)
-            total_count = count_value if count_value is not None else len(count_result.data or [])
-            logger.info(f"[Audit] Total de registros disponibles: {total_count}")
-        except Exception as count_error:
-            logger.warning(f"[Audit] No se pudo obtener el conteo total: {str(count_error)}")
-        
-        # Obtener los logs
-        query = sb.table('auditoria_cambios').select('*')
-        
-        if table_name:
-            query = query.eq('tabla_afectada', table_name)
-        if record_id:
-            query = query.eq('registro_id', record_id)
-        if user_id:
-            query = query.eq('usuario_id', user_id)
-        
-        query = query.order('created_at', desc=True).range(offset, offset + limit - 1)
-        result = query.execute()
-        
-        logs = result.data or []
-        logger.info(f"[Audit] Obtenidos {len(logs)} logs (limit={limit}, offset={offset})")
-        if logs:
-            logger.info(f"[Audit] Primer log: tabla={logs[0].get('tabla_afectada')}, acción={logs[0].get('accion')}, usuario={logs[0].get('usuario_email')}, fecha={logs[0].get('created_at')}")
-        else:
-            logger.warning(f"[Audit] No se encontraron logs con los filtros aplicados")
-        return logs, total_count
+            for row in rows:
+                yield json.dumps(row, ensure_ascii=False, default=str) + "\n"
+                exported += 1
+        except Exception as e:
+            logger.error(f"[Audit] Export ndjson interrumpido tras {exported} filas: {str(e)}", exc_info=True)
+            yield json.dumps({"error": "Export incompleto: falló la lectura del historial", "rows_exported": exported}) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(AUDIT_EXPORT_COLUMNS)
+    pending = 0
+    try:
+        for row in rows:
+            writer.writerow([
+                json.dumps(row.get(column), ensure_ascii=False, default=str)
+                if column in _JSON_COLUMNS and row.get(column) is not None
+                else row.get(column)
+                for column in AUDIT_EXPORT_COLUMNS
+            ])
+            exported += 1
+            pending += 1
+            if pending >= page_size:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
     except Exception as e:
-        logger.error(f"[Audit] Error al obtener historial: {str(e)}", exc_info=True)
-        raise RuntimeError(f"No se pudo obtener el historial de auditoría: {e}") from e
+        logger.error(f"[Audit] Export csv interrumpido tras {exported} filas: {str(e)}", exc_info=True)
+        buffer.write(f"# ERROR: export incompleto tras {exported} filas, falló la lectura del historial\r\n")
+    yield buffer.getvalue()
+
+
+def _replay_event(state: Optional[Dict[str, Any]], event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    action = event.get('accion')
+    if action == 'DELETE':
+        return None
+    if event.get('campos_nuevos') and (action == 'CREATE' or event.get('es_snapshot')):
+        return dict(event['campos_nuevos'])
+    if action == 'UPDATE':
+        # Diff sobre el estado anterior; campos_nuevos sin es_snapshot puede
+        # ser solo una parte de la fila (AUDIT_STORAGE_MODE=full o filas viejas).
+        state = dict(state or {})
+        changes = event.get('cambios_detectados')
+        if changes:
+            for key, change in changes.items():
+                state[key] = (change or {}).get('nuevo')
+        elif event.get('campos_nuevos'):
+            state.update(event['campos_nuevos'])
+        return state
+    # PURCHASE/SALE duplican campos que ya viajan en el UPDATE del mismo cambio.
+    return state
+
+
+def reconstruct_record(
+    table_name: str,
+    record_id: int,
+    at: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Reconstruye la versión de un registro vigente en ``at`` (ISO-8601; por
+    defecto la última) a partir del snapshot más cercano (CREATE, UPDATE con
+    es_snapshot o DELETE) y los diffs de UPDATE posteriores.
+
+    Returns:
+        {"record": dict | None, "complete": bool, "snapshot_id": int | None,
+         "applied_updates": int}
+        ``complete`` es False si no hay snapshot y la fila solo contiene los
+        campos que aparecen en los diffs.
+    """
+    sb = get_service()
+
+    def base_query(columns: str):
+        query = sb.table('auditoria_cambios').select(columns)\
+            .eq('tabla_afectada', table_name)\
+            .eq('registro_id', record_id)
+        if at:
+            query = query.lte('created_at', at)
+        return query
+
+    columns = 'id, accion, created_at, campos_nuevos, cambios_detectados, es_snapshot'
+    snapshot_result = base_query(columns)\
+        .or_('es_snapshot.is.true,and(accion.eq.CREATE,campos_nuevos.not.is.null),accion.eq.DELETE')\
+        .order('created_at', desc=True)\
+        .order('id', desc=True)\
+        .limit(1)\
+        .execute()
+    snapshot = (snapshot_result.data or [None])[0]
+
+    def diffs_query():
+        query = base_query(columns).eq('accion', 'UPDATE')
+        if snapshot:
+            query = query.or_(
+                f'created_at.gt."{snapshot["created_at"]}",'
+                f'and(created_at.eq."{snapshot["created_at"]}",id.gt.{snapshot["id"]})'
+            )
+        return query.order('created_at').order('id')
+
+    state = _replay_event(None, snapshot) if snapshot else None
+    diffs = fetch_all_pages(diffs_query)
+    for event in diffs:
+        state = _replay_event(state, event)
+
+    return {
+        "record": state,
+        "complete": snapshot is not None,
+        "snapshot_id": snapshot.get('id') if snapshot else None,
+        "applied_updates": len(diffs),
+    }
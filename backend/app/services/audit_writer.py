@@ -0,0 +1,270 @@
+"""
+Escritor asíncrono de auditoría: cola en proceso con flush por lotes
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+InsertBatch = Callable[[List[Dict[str, Any]]], None]
+
+
+class AuditWriter:
+    """
+    Acepta eventos de auditoría sin bloquear y los inserta en lotes.
+
+    Un hilo de fondo vacía la cola cuando junta ``batch_size`` eventos o
+    cuando pasan ``flush_interval`` segundos desde el primero pendiente. Si el
+    insert falla (base de datos no disponible), el lote se guarda en un
+    archivo JSONL acotado a ``spill_max_bytes`` y se reintenta antes del
+    siguiente lote. ``shutdown`` drena la cola antes de terminar.
+
+    El spill se comparte entre workers: cada acceso toma un ``flock`` sobre
+    ``<spill>.lock``. Si la base acepta lotes nuevos pero el spill falla
+    ``max_replay_failures`` veces seguidas, el primer lote del spill se
+    reintenta evento por evento y los que fallan van a
+    ``<spill>.quarantine.jsonl`` para que un evento inválido no bloquee el resto.
+    """
+
+    def __init__(
+        self,
+        insert_batch: InsertBatch,
+        batch_size: int = 50,
+        flush_interval: float = 2.0,
+        max_queue: int = 10_000,
+        spill_path: Optional[Path] = None,
+        spill_max_bytes: int = 10 * 1024 * 1024,
+        max_replay_failures: int = 3,
+    ):
+        self._insert_batch = insert_batch
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self.spill_path = spill_path
+        self.spill_max_bytes = spill_max_bytes
+        self.max_replay_failures = max(1, max_replay_failures)
+        self._replay_failures = 0
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.dropped = 0
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, event: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Nunca bloquear la request: la cola llena va directo a disco.
+            self._spill([event])
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _drain(self, max_items: int) -> List[Dict[str, Any]]:
+        batch: List[Dict[str, Any]] = []
+        while len(batch) < max_items:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._write([])
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            batch = [first]
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def flush(self) -> None:
+        """Inserta en el hilo actual todo lo pendiente (cola y spill)."""
+        while True:
+            batch = self._drain(self.batch_size)
+            self._write(batch)
+            if not batch:
+                return
+
+    def shutdown(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        with self._flush_lock:
+            spill_ok = self._replay_spill()
+            if not batch:
+                return
+            try:
+                self._insert_batch(batch)
+            except Exception as error:
+                logger.error("[AuditWriter] Falló insert de %s eventos: %s", len(batch), error)
+                self._spill(batch)
+                return
+            if spill_ok:
+                self._replay_failures = 0
+                return
+            # La base acepta el lote nuevo pero no el spill: hay eventos inválidos en disco.
+            self._replay_failures += 1
+            if self._replay_failures >= self.max_replay_failures:
+                self._quarantine_spill_head()
+                self._replay_failures = 0
+
+    @contextmanager
+    def _spill_lock(self, blocking: bool = True) -> Iterator[bool]:
+        """flock exclusivo entre procesos; produce False si está tomado y no se espera."""
+        if fcntl is None or self.spill_path is None:
+            yield True
+            return
+        lock_path = self.spill_path.with_name(self.spill_path.name + ".lock")
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with lock_path.open("a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_spill(self) -> List[Dict[str, Any]]:
+        return [
+            json.loads(line)
+            for line in self.spill_path.read_text(encoding="utf-8").splitlines()
+            if line.strip()
+        ]
+
+    def _rewrite_spill(self, events: List[Dict[str, Any]]) -> None:
+        if not events:
+            self.spill_path.unlink(missing_ok=True)
+            return
+        self.spill_path.write_text(
+            "".join(json.dumps(event, default=str) + "\n" for event in events),
+            encoding="utf-8",
+        )
+
+    def _spill(self, events: List[Dict[str, Any]]) -> None:
+        if self.spill_path is None:
+            self.dropped += len(events)
+            logger.error("[AuditWriter] Sin spill configurado; %s eventos descartados", len(events))
+            return
+        lines = "".join(json.dumps(event, default=str) + "\n" for event in events)
+        try:
+            with self._spill_lock():
+                current_size = self.spill_path.stat().st_size if self.spill_path.exists() else 0
+                if current_size + len(lines.encode("utf-8")) > self.spill_max_bytes:
+                    self.dropped += len(events)
+                    logger.error(
+                        "[AuditWriter] Spill lleno (%s bytes); %s eventos descartados",
+                        current_size,
+                        len(events),
+                    )
+                    return
+                self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+                with self.spill_path.open("a", encoding="utf-8") as spill_file:
+                    spill_file.write(lines)
+            logger.warning("[AuditWriter] %s eventos guardados en %s", len(events), self.spill_path)
+        except OSError as error:
+            self.dropped += len(events)
+            logger.error("[AuditWriter] No se pudo escribir el spill: %s", error)
+
+    def _replay_spill(self) -> bool:
+        """Reinserta los eventos en disco. Retorna False si algún lote sigue fallando."""
+        if self.spill_path is None or not self.spill_path.exists():
+            return True
+        with self._spill_lock(blocking=False) as acquired:
+            if not acquired:
+                # Otro worker está reinsertando el spill
+                return True
+            if not self.spill_path.exists():
+                return True
+            try:
+                events = self._read_spill()
+            except (OSError, ValueError) as error:
+                logger.error("[AuditWriter] Spill ilegible, se descarta: %s", error)
+                self.spill_path.unlink(missing_ok=True)
+                return True
+
+            for index in range(0, len(events), self.batch_size):
+                try:
+                    self._insert_batch(events[index:index + self.batch_size])
+                except Exception as error:
+                    logger.warning("[AuditWriter] Reintento de spill falló: %s", error)
+                    self._rewrite_spill(events[index:])
+                    return False
+
+            self.spill_path.unlink(missing_ok=True)
+        logger.info("[AuditWriter] %s eventos recuperados desde el spill", len(events))
+        return True
+
+    def _quarantine_spill_head(self) -> None:
+        """Reintenta uno a uno el primer lote del spill y aparta los eventos que fallan."""
+        with self._spill_lock():
+            if not self.spill_path.exists():
+                return
+            try:
+                events = self._read_spill()
+            except (OSError, ValueError):
+                return
+            head, rest = events[:self.batch_size], events[self.batch_size:]
+            rejected = []
+            for event in head:
+                try:
+                    self._insert_batch([event])
+                except Exception as error:
+                    logger.error("[AuditWriter] Evento de auditoría inválido, se aparta: %s", error)
+                    rejected.append(event)
+            if rejected:
+                quarantine_path = self.spill_path.with_name(
+                    self.spill_path.name.replace(".jsonl", "") + ".quarantine.jsonl"
+                )
+                with quarantine_path.open("a", encoding="utf-8") as quarantine_file:
+                    quarantine_file.write("".join(json.dumps(event, default=str) + "\n" for event in rejected))
+                logger.error("[AuditWriter] %s eventos apartados en %s", len(rejected), quarantine_path)
+            self._rewrite_spill(rest)
+
+
+def writer_from_env(insert_batch: InsertBatch) -> AuditWriter:
+    spill_path = os.getenv("AUDIT_SPILL_PATH", "data/audit_spill.jsonl").strip()
+    return AuditWriter(
+        insert_batch,
+        batch_size=int(os.getenv("AUDIT_BATCH_SIZE", "50")),
+        flush_interval=float(os.getenv("AUDIT_FLUSH_INTERVAL_SECONDS", "2")),
+        max_queue=int(os.getenv("AUDIT_QUEUE_MAX", "10000")),
+        spill_path=Path(spill_path) if spill_path else None,
+        spill_max_bytes=int(os.getenv("AUDIT_SPILL_MAX_BYTES", str(10 * 1024 * 1024))),
+        max_replay_failures=int(os.getenv("AUDIT_SPILL_MAX_REPLAY_FAILURES", "3")),
+    )
@@ -1,8 +1,12 @@
 # app/services/ejemplar_service.py
 from typing import List, Optional, Dict, Any
 from app.core.supabase_auth import get_public, get_service
+from app.services import public_cache
 from app.services.query_helpers import chunked, fetch_all_by_ids, fetch_all_pages
 
+# Campos que alimentan transacciones_diarias (rollup de compras y ventas).
+ROLLUP_FIELDS = ("species_id", "nursery", "purchase_date", "purchase_price", "sale_date", "sale_price")
+
 def _ensure_sector_species_relation(sector_id: int, species_id: int) -> None:
     """
     Asegura que existe una relación entre sector y especie en la tabla sectores_especies.
@@ -24,6 +28,8 @@ def _ensure_sector_species_relation(sector_id: int, species_id: int) -> None:
                 "sector_id": sector_id,
                 "especie_id": species_id
             }).execute()
+            # Cambia la lista pública de especies del sector (y su bundle QR)
+            public_cache.invalidate()
             logger.info(f"[_ensure_sector_species_relation] Relación creada exitosamente")
         else:
             logger.debug(f"[_ensure_sector_species_relation] Relación ya existe (sector_id={sector_id}, especie_id={species_id})")
@@ -32,6 +38,25 @@ def _ensure_sector_species_relation(sector_id: int, species_id: int) -> None:
         logger.warning(f"[_ensure_sector_species_relation] Error al crear relación: {str(e)}")
         # No lanzar excepción para no interrumpir la creación del ejemplar
 
+def _refresh_transactions_rollup(*rows: Optional[Dict[str, Any]]) -> None:
+    """Recalcula el rollup diario de compras/ventas para las fechas de los ejemplares dados."""
+    from app.services.transactions_service import refresh_daily_rollup
+    days = []
+    for row in rows:
+        if row:
+            days.extend([row.get("purchase_date"), row.get("sale_date")])
+    refresh_daily_rollup(days)
+
+def _resolve_factura_id(nursery: Any, invoice_number: Any) -> Optional[int]:
+    """factura_id para vivero + número de factura; None si no hay una única o si falla la consulta."""
+    import logging
+    from app.services.transactions_service import resolve_factura_id
+    try:
+        return resolve_factura_id(nursery, invoice_number)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"[_resolve_factura_id] Error al resolver factura: {str(e)}")
+        return None
+
 def list_staff(
     q: Optional[str] = None,
     species_id: Optional[int] = None,
@@ -42,6 +67,7 @@ def list_staff(
     health_status: Optional[str] = None,
     nursery: Optional[str] = None,
     invoice_number: Optional[str] = None,
+    factura_id: Optional[int] = None,
     purchase_date: Optional[str] = None,
     purchase_date_from: Optional[str] = None,
     purchase_date_to: Optional[str] = None,
@@ -109,6 +135,8 @@ def list_staff(
                 query = query.ilike("nursery", f"*{nursery.strip()}*")
             if invoice_number:
                 query = query.ilike("invoice_number", f"*{invoice_number.strip()}*")
+            if factura_id:
+                query = query.eq("factura_id", factura_id)
             if purchase_date:
                 query = query.eq("purchase_date", purchase_date)
             if purchase_date_from:
@@ -301,7 +329,7 @@ def create_staff(payload: Dict[str, Any], user_id: Optional[int] = None, user_em
     
     # Limpiar payload: remover campos que no deben enviarse
     clean_payload = {k: v for k, v in payload.items() 
-                    if k not in ["id", "created_at", "updated_at", "especies", "sectores"]}
+                    if k not in ["id", "created_at", "updated_at", "especies", "sectores", "invoice_key"]}
     
     # Convertir strings vacíos a None para campos opcionales
     optional_fields = ["nursery", "location"]
@@ -323,6 +351,9 @@ def create_staff(payload: Dict[str, Any], user_id: Optional[int] = None, user_em
     if "tamaño" in clean_payload and clean_payload["tamaño"] == "":
         clean_payload["tamaño"] = None
 
+    if "factura_id" not in clean_payload and clean_payload.get("invoice_number"):
+        clean_payload["factura_id"] = _resolve_factura_id(clean_payload.get("nursery"), clean_payload["invoice_number"])
+
     logger.info(f"[create_staff] Creando ejemplar con datos: {list(clean_payload.keys())}")
     
     try:
@@ -340,6 +371,7 @@ def create_staff(payload: Dict[str, Any], user_id: Optional[int] = None, user_em
         
         created_ejemplar = res.data[0]
         ejemplar_id = created_ejemplar.get('id')
+        _refresh_transactions_rollup(created_ejemplar)
         
         # Registrar en auditoría
         if user_id or user_email:
@@ -403,7 +435,7 @@ def update_staff(ejemplar_id: int, payload: Dict[str, Any], user_id: Optional[in
     
     # Limpiar payload
     clean_payload = {k: v for k, v in payload.items() 
-                    if k not in ["id", "created_at", "updated_at", "especies", "sectores"]}
+                    if k not in ["id", "created_at", "updated_at", "especies", "sectores", "invoice_key"]}
     
     # Convertir strings vacíos a None
     optional_fields = ["nursery", "location"]
@@ -425,6 +457,17 @@ def update_staff(ejemplar_id: int, payload: Dict[str, Any], user_id: Optional[in
     if "tamaño" in clean_payload and clean_payload["tamaño"] == "":
         clean_payload["tamaño"] = None
 
+    # Si cambió vivero o número de factura, re-resolver el vínculo con facturas_compra
+    invoice_fields_changed = any(
+        field in clean_payload and clean_payload[field] != old_values.get(field)
+        for field in ("nursery", "invoice_number")
+    )
+    if invoice_fields_changed and "factura_id" not in clean_payload:
+        clean_payload["factura_id"] = _resolve_factura_id(
+            clean_payload.get("nursery", old_values.get("nursery")),
+            clean_payload.get("invoice_number", old_values.get("invoice_number")),
+        )
+
     try:
         res = sb.table("ejemplar").update(clean_payload).eq("id", ejemplar_id).execute()
         if not res.data:
@@ -441,6 +484,8 @@ def update_staff(ejemplar_id: int, payload: Dict[str, Any], user_id: Optional[in
                 _ensure_sector_species_relation(new_sector_id, new_species_id)
         
         updated_ejemplar = res.data[0]
+        if any(old_values.get(field) != updated_ejemplar.get(field) for field in ROLLUP_FIELDS):
+            _refresh_transactions_rollup(old_values, updated_ejemplar)
         
         # Registrar en auditoría
         if user_id or user_email:
@@ -525,6 +570,7 @@ def delete_staff(ejemplar_id: int, user_id: Optional[int] = None, user_email: Op
     old_values = old_ejemplar_res.data[0] if old_ejemplar_res.data else None
     
     sb.table("ejemplar").delete().eq("id", ejemplar_id).execute()
+    _refresh_transactions_rollup(old_values)
     
     # Registrar en auditoría
     if (user_id or user_email) and old_values:
@@ -1,15 +1,19 @@
 # app/services/home_content_service.py
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from app.core.supabase_auth import (
     get_public as get_supabase_client,
     get_public_clean,
-    get_service,
+    get_rest_session,
+    REST_TIMEOUT,
 )
+from app.services import photos_service
+from app.utils.http_cache import compute_etag
+from app.utils.ttl_cache import TTLCache
 from supabase import create_client as supabase_create_client
 import json
 import os
-import requests
 import logging
+import threading
 
 def get_authenticated_client(access_token: Optional[str] = None):
     """
@@ -84,62 +88,63 @@ def get_authenticated_client(access_token: Optional[str] = None):
 
 # ----------------- PÚBLICO -----------------
 
-def get_public(lang: str = "es") -> Optional[Dict[str, Any]]:
-    """
-    Obtiene el contenido público del home (sin autenticación).
-    
-    Args:
-        lang: Idioma del contenido ('es' para español, 'en' para inglés). Default: 'es'
-    
-    Returns:
-        Dict con welcome_text, carousel_images y sections en el idioma solicitado
-    """
+PUBLIC_LANGS = ("es", "en")
+DEFAULT_WELCOME = {
+    "es": "Bienvenido al Cactario CasaMolle",
+    "en": "Welcome to Cactario CasaMolle",
+}
+
+# Payloads públicos ya resueltos por idioma: lang -> (payload, etag fuerte).
+# create_or_update_staff invalida; el TTL acota lo que puede quedar desfasado
+# otro worker que no recibió la escritura.
+_public_cache: TTLCache[Tuple[Dict[str, Any], str]] = TTLCache(
+    max_entries=len(PUBLIC_LANGS),
+    ttl_seconds=float(os.getenv("HOME_CONTENT_CACHE_TTL_SECONDS", "300")),
+)
+# Igual que public_cache: cada invalidación incrementa la generación y una
+# carga que empezó antes no guarda su resultado (traería el contenido previo).
+_public_generation = 0
+_public_generation_lock = threading.Lock()
+
+
+def _default_public_payload(lang: str) -> Dict[str, Any]:
+    return {
+        "welcome_text": DEFAULT_WELCOME[lang],
+        "carousel_images": [],
+        "sections": []
+    }
+
+
+def _fetch_active_content() -> Optional[Dict[str, Any]]:
     try:
         sb = get_public_clean()
         res = sb.table("home_content").select("*").eq("is_active", True).order("updated_at", desc=True).limit(1).execute()
-        
-        if not res.data or len(res.data) == 0:
-            # Retornar contenido por defecto si no hay configuración
-            default_welcome = "Bienvenido al Cactario CasaMolle" if lang == "es" else "Welcome to Cactario CasaMolle"
-            return {
-                "welcome_text": default_welcome,
-                "carousel_images": [],
-                "sections": []
-            }
-        
-        content = res.data[0]
     except Exception as e:
-        # Si la tabla no existe o hay otro error, retornar contenido por defecto
+        # Si la tabla no existe, se sirve el contenido por defecto
         error_msg = str(e).lower()
         if "does not exist" in error_msg or "relation" in error_msg or "table" in error_msg:
-            # La tabla no existe, retornar contenido por defecto
-            default_welcome = "Bienvenido al Cactario CasaMolle" if lang == "es" else "Welcome to Cactario CasaMolle"
-            return {
-                "welcome_text": default_welcome,
-                "carousel_images": [],
-                "sections": []
-            }
+            return None
         # Otro tipo de error, re-lanzar
         raise
-    
-    # Seleccionar contenido según el idioma
-    welcome_key = f"welcome_text_{lang}" if lang in ["es", "en"] else "welcome_text_es"
-    sections_key = f"sections_{lang}" if lang in ["es", "en"] else "sections_es"
+    return res.data[0] if res.data else None
+
+
+def _build_public_payload(content: Optional[Dict[str, Any]], lang: str) -> Dict[str, Any]:
+    """Resuelve idioma, compatibilidad con columnas antiguas y JSON de una fila de home_content."""
+    if content is None:
+        return _default_public_payload(lang)
+
+    welcome_key = f"welcome_text_{lang}"
+    sections_key = f"sections_{lang}"
     
     # Si las columnas nuevas no existen, usar las antiguas (compatibilidad hacia atrás)
     if welcome_key not in content or content.get(welcome_key) is None:
-        if "welcome_text" in content:
-            welcome_text = content["welcome_text"]
-        else:
-            welcome_text = "Bienvenido al Cactario CasaMolle" if lang == "es" else "Welcome to Cactario CasaMolle"
+        welcome_text = content.get("welcome_text") or DEFAULT_WELCOME[lang]
     else:
-        welcome_text = content.get(welcome_key) or ("Bienvenido al Cactario CasaMolle" if lang == "es" else "Welcome to Cactario CasaMolle")
+        welcome_text = content.get(welcome_key) or DEFAULT_WELCOME[lang]
     
     if sections_key not in content or content.get(sections_key) is None:
-        if "sections" in content:
-            sections = content["sections"]
-        else:
-            sections = []
+        sections = content.get("sections") or []
     else:
         sections = content.get(sections_key) or []
     
@@ -147,7 +152,7 @@ def get_public(lang: str = "es") -> Optional[Dict[str, Any]]:
     if isinstance(sections, str):
         try:
             sections = json.loads(sections)
-        except:
+        except ValueError:
             sections = []
     
     # Parsear carousel_images
@@ -155,19 +160,24 @@ def get_public(lang: str = "es") -> Optional[Dict[str, Any]]:
     if isinstance(carousel_images, str):
         try:
             carousel_images = json.loads(carousel_images)
-        except:
+        except ValueError:
             carousel_images = []
     
-    # Procesar alt text de imágenes según idioma
+    # Procesar alt text de imágenes según idioma y armar srcset con las variantes
     processed_carousel = []
     for img in carousel_images:
         if isinstance(img, dict):
             # Usar alt_es o alt_en según el idioma, o alt como fallback
-            alt_key = f"alt_{lang}" if lang in ["es", "en"] else "alt_es"
-            alt_text = img.get(alt_key) or img.get("alt") or ""
+            alt_text = img.get(f"alt_{lang}") or img.get("alt") or ""
+            url = img.get("url", "")
+            variant_urls = photos_service.build_variant_urls(img.get("variants"))
             processed_carousel.append({
-                "url": img.get("url", ""),
-                "alt": alt_text
+                "url": url,
+                "alt": alt_text,
+                "width": img.get("width"),
+                "height": img.get("height"),
+                "variant_urls": variant_urls,
+                "srcset": photos_service.build_srcset(url, variant_urls, img.get("width")),
             })
     
     return {
@@ -176,6 +186,51 @@ def get_public(lang: str = "es") -> Optional[Dict[str, Any]]:
         "sections": sections
     }
 
+
+def invalidate_public_cache() -> None:
+    global _public_generation
+    with _public_generation_lock:
+        _public_generation += 1
+        _public_cache.clear()
+
+
+def get_public_cached(lang: str = "es") -> Tuple[Dict[str, Any], str]:
+    """
+    Retorna (payload, etag) del home público. Con cache caliente no toca la
+    base; en un miss lee la fila activa una vez y precalcula ambos idiomas.
+    """
+    if lang not in PUBLIC_LANGS:
+        lang = "es"
+    cached = _public_cache.get(lang)
+    if cached is not None:
+        return cached
+
+    generation = _public_generation
+    content = _fetch_active_content()
+    entries = {}
+    for payload_lang in PUBLIC_LANGS:
+        payload = _build_public_payload(content, payload_lang)
+        entries[payload_lang] = (payload, compute_etag(payload, weak=False))
+    with _public_generation_lock:
+        if generation == _public_generation:
+            for payload_lang, entry in entries.items():
+                _public_cache.set(payload_lang, entry)
+    return entries[lang]
+
+
+def get_public(lang: str = "es") -> Optional[Dict[str, Any]]:
+    """
+    Obtiene el contenido público del home (sin autenticación).
+    
+    Args:
+        lang: Idioma del contenido ('es' para español, 'en' para inglés). Default: 'es'
+    
+    Returns:
+        Dict con welcome_text, carousel_images y sections en el idioma solicitado
+    """
+    payload, _ = get_public_cached(lang)
+    return payload
+
 # ----------------- STAFF (privado) -----------------
 
 def get_staff(access_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
@@ -195,7 +250,7 @@ def get_staff(access_token: Optional[str] = None) -> Optional[Dict[str, Any]]:
                 "Content-Type": "application/json"
             }
             url = f"{SUPABASE_URL}/rest/v1/home_content?select=*&order=updated_at.desc&limit=1"
-            response = requests.get(url, headers=headers)
+            response = get_rest_session().get(url, headers=headers, timeout=REST_TIMEOUT)
             
             if response.status_code == 200:
                 data = response.json()
@@ -289,7 +344,8 @@ def create_or_update_staff(payload: Dict[str, Any], user_id: Optional[int] = Non
     Si ya existe un registro activo, lo actualiza. Si no, crea uno nuevo.
     Requiere access_token para que las políticas RLS funcionen correctamente.
     
-    Usa requests directamente para asegurar que el token se envíe correctamente.
+    Usa la sesión REST compartida (keep-alive, timeouts) para asegurar que el
+    token se envíe correctamente.
     """
     logger = logging.getLogger(__name__)
     
@@ -328,63 +384,47 @@ def create_or_update_staff(payload: Dict[str, Any], user_id: Optional[int] = Non
         "Prefer": "return=representation"
     }
     
-    # Verificar si ya existe un registro activo usando requests directamente
+    session = get_rest_session()
+    rest_url = f"{SUPABASE_URL}/rest/v1/home_content"
+
+    # Verificar si ya existe un registro activo; la misma lectura sirve como
+    # valores anteriores para auditoría.
     old_values = None
-    check_url = f"{SUPABASE_URL}/rest/v1/home_content?is_active=eq.true&select=id&limit=1"
-    check_response = requests.get(check_url, headers=headers)
-    
+    check_response = session.get(
+        f"{rest_url}?is_active=eq.true&select=*&limit=1",
+        headers=headers,
+        timeout=REST_TIMEOUT,
+    )
     if check_response.status_code == 200:
         existing_data = check_response.json()
-        
-        if existing_data and len(existing_data) > 0:
-            # Actualizar registro existente
-            content_id = existing_data[0]["id"]
-            logger.info(f"[create_or_update_staff] Actualizando registro existente ID: {content_id}")
-            try:
-                sb_admin = get_service()
-                old_res = sb_admin.table("home_content").select("*").eq("id", content_id).limit(1).execute()
-                if old_res.data:
-                    old_values = old_res.data[0]
-            except Exception as audit_error:
-                logger.warning(f"[create_or_update_staff] Error obteniendo valores anteriores: {str(audit_error)}")
-            
-            update_url = f"{SUPABASE_URL}/rest/v1/home_content?id=eq.{content_id}"
-            update_response = requests.patch(update_url, json=data, headers=headers)
-            
-            if update_response.status_code not in [200, 204]:
-                error_detail = update_response.text
-                logger.error(f"[create_or_update_staff] Error en update: {update_response.status_code} - {error_detail}")
-                raise Exception(f"Error al actualizar contenido del home: {error_detail}")
-            
-            # Obtener el registro actualizado
-            get_url = f"{SUPABASE_URL}/rest/v1/home_content?id=eq.{content_id}&select=*"
-            get_response = requests.get(get_url, headers=headers)
-            if get_response.status_code == 200:
-                updated = get_response.json()[0]
-            else:
-                updated = data
-                updated["id"] = content_id
-        else:
-            # Crear nuevo registro
-            logger.info("[create_or_update_staff] Creando nuevo registro")
-            
-            insert_url = f"{SUPABASE_URL}/rest/v1/home_content"
-            insert_response = requests.post(insert_url, json=data, headers=headers)
-            
-            if insert_response.status_code not in [200, 201]:
-                error_detail = insert_response.text
-                logger.error(f"[create_or_update_staff] Error en insert: {insert_response.status_code} - {error_detail}")
-                raise Exception(f"Error al crear contenido del home: {error_detail}")
-            
-            updated = insert_response.json()
-            if isinstance(updated, list) and len(updated) > 0:
-                updated = updated[0]
+        if existing_data:
+            old_values = existing_data[0]
     else:
         # Si falla la verificación, intentar crear directamente
         logger.warning(f"[create_or_update_staff] Error verificando existencia: {check_response.status_code}, intentando crear")
+
+    if old_values:
+        # Actualizar registro existente; Prefer: return=representation devuelve la fila
+        content_id = old_values["id"]
+        logger.info(f"[create_or_update_staff] Actualizando registro existente ID: {content_id}")
+        update_response = session.patch(
+            f"{rest_url}?id=eq.{content_id}",
+            json=data,
+            headers=headers,
+            timeout=REST_TIMEOUT,
+        )
         
-        insert_url = f"{SUPABASE_URL}/rest/v1/home_content"
-        insert_response = requests.post(insert_url, json=data, headers=headers)
+        if update_response.status_code not in [200, 204]:
+            error_detail = update_response.text
+            logger.error(f"[create_or_update_staff] Error en update: {update_response.status_code} - {error_detail}")
+            raise Exception(f"Error al actualizar contenido del home: {error_detail}")
+        
+        rows = update_response.json() if update_response.status_code == 200 else []
+        updated = rows[0] if rows else {**data, "id": content_id}
+    else:
+        # Crear nuevo registro
+        logger.info("[create_or_update_staff] Creando nuevo registro")
+        insert_response = session.post(rest_url, json=data, headers=headers, timeout=REST_TIMEOUT)
         
         if insert_response.status_code not in [200, 201]:
             error_detail = insert_response.text
@@ -433,5 +473,6 @@ def create_or_update_staff(payload: Dict[str, Any], user_id: Optional[int] = Non
     except Exception as audit_error:
         logger.warning(f"[create_or_update_staff] Error registrando auditoría: {str(audit_error)}")
 
+    invalidate_public_cache()
     return updated
 
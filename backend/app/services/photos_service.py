@@ -8,6 +8,7 @@ import uuid
 import logging
 from app.core.supabase_auth import get_public, get_service
 from app.core import storage_router
+from app.services import public_cache
 from app.services.query_helpers import chunked, fetch_all_pages, unique_values
 
 logger = logging.getLogger(__name__)
@@ -99,7 +100,7 @@ def _resize_to_width(image: Image.Image, target_width: int) -> Image.Image:
     return image.resize((target_width, target_height), Image.Resampling.LANCZOS)
 
 
-def _build_variant_urls(variants: Optional[Dict[str, str]]) -> Dict[str, str]:
+def build_variant_urls(variants: Optional[Dict[str, str]]) -> Dict[str, str]:
     if not variants:
         return {}
     urls = {}
@@ -151,6 +152,79 @@ ENTITY_CONFIG = {
 }
 
 
+async def store_image_variants(file: UploadFile, base_dir: str) -> Dict[str, Any]:
+    """
+    Sube el original (reescalado a MAX_IMAGE_SIZE si excede) y las variantes
+    w=400/w=800 en JPEG, todo con Cache-Control inmutable.
+
+    Returns:
+        Dict con storage_path, variants (w=N -> key) y width/height del original guardado
+    """
+    file_extension = (Path(file.filename).suffix if file.filename else '.jpg').lower()
+    base_filename = str(uuid.uuid4())
+    storage_path = f"original/{base_dir}/{base_filename}{file_extension}"
+
+    # Decodificar directo desde el stream del upload (sin copiar a bytes)
+    await file.seek(0)
+    image = Image.open(file.file)
+    image.load()
+    if image.width > MAX_IMAGE_SIZE or image.height > MAX_IMAGE_SIZE:
+        # Redimensionar: el original pasa a ser el JPEG reescalado
+        image.thumbnail((MAX_IMAGE_SIZE, MAX_IMAGE_SIZE), Image.Resampling.LANCZOS)
+        image_for_variants = _normalize_image(image)
+        storage_path = f"original/{base_dir}/{base_filename}.jpg"
+        storage_router.upload_object(
+            key=storage_path,
+            data=_image_to_jpeg_bytes(image_for_variants),
+            content_type="image/jpeg",
+            cache_control=CACHE_CONTROL_IMMUTABLE,
+        )
+    else:
+        # Sin redimensionar: el original se transmite tal cual desde UploadFile.file
+        image_for_variants = _normalize_image(image)
+        await file.seek(0)
+        storage_router.upload_fileobj(
+            key=storage_path,
+            fileobj=file.file,
+            content_type=file.content_type or "image/jpeg",
+            cache_control=CACHE_CONTROL_IMMUTABLE,
+        )
+
+    variants = {}
+    for width in VARIANT_WIDTHS:
+        resized = _resize_to_width(image_for_variants, width)
+        variant_path = f"w={width}/{base_dir}/{base_filename}.jpg"
+        storage_router.upload_object(
+            key=variant_path,
+            data=_image_to_jpeg_bytes(resized),
+            content_type="image/jpeg",
+            cache_control=CACHE_CONTROL_IMMUTABLE,
+        )
+        variants[f"w={width}"] = variant_path
+
+    return {
+        "storage_path": storage_path,
+        "variants": variants,
+        "width": image_for_variants.width,
+        "height": image_for_variants.height,
+    }
+
+
+def build_srcset(public_url: Optional[str], variant_urls: Dict[str, str], width: Optional[int] = None) -> str:
+    """
+    srcset con las variantes w=N más angostas que el original y el original
+    con su ancho real (si se conoce).
+    """
+    candidates = []
+    for width_key, url in sorted(variant_urls.items(), key=lambda item: int(item[0].split("=", 1)[1])):
+        variant_width = int(width_key.split("=", 1)[1])
+        if width is None or variant_width < width:
+            candidates.append(f"{url} {variant_width}w")
+    if public_url and width:
+        candidates.append(f"{public_url} {width}w")
+    return ", ".join(candidates)
+
+
 async def upload_photos(
     entity_type: str,
     entity_id: int,
@@ -191,49 +265,14 @@ async def upload_photos(
                 logger.warning(f"Archivo {file.filename} no es una imagen, saltando...")
                 continue
             
-            file_content = await file.read()
-            file_extension = (Path(file.filename).suffix if file.filename else '.jpg').lower()
             # Para home, usar un path diferente sin entity_id
             if entity_type == 'home':
                 base_dir = f"{config['path_prefix']}/carousel"
             else:
                 base_dir = f"{config['path_prefix']}/{entity_id}"
-            base_filename = str(uuid.uuid4())
-            unique_filename = f"original/{base_dir}/{base_filename}{file_extension}"
-            
-            # Redimensionar si es necesario
-            image = Image.open(BytesIO(file_content))
-            original_content = file_content
-            original_content_type = file.content_type or "image/jpeg"
-            image_for_variants = image
-            if image.width > MAX_IMAGE_SIZE or image.height > MAX_IMAGE_SIZE:
-                image.thumbnail((MAX_IMAGE_SIZE, MAX_IMAGE_SIZE), Image.Resampling.LANCZOS)
-                image_for_variants = _normalize_image(image)
-                original_content = _image_to_jpeg_bytes(image_for_variants)
-                original_content_type = "image/jpeg"
-                unique_filename = f"original/{base_dir}/{base_filename}.jpg"
-            else:
-                image_for_variants = _normalize_image(image)
-            
-            storage_router.upload_object(
-                key=unique_filename,
-                data=original_content,
-                content_type=original_content_type,
-                cache_control=CACHE_CONTROL_IMMUTABLE,
-            )
-
-            variants = {}
-            for width in VARIANT_WIDTHS:
-                resized = _resize_to_width(image_for_variants, width)
-                variant_content = _image_to_jpeg_bytes(resized)
-                variant_path = f"w={width}/{base_dir}/{base_filename}.jpg"
-                storage_router.upload_object(
-                    key=variant_path,
-                    data=variant_content,
-                    content_type="image/jpeg",
-                    cache_control=CACHE_CONTROL_IMMUTABLE,
-                )
-                variants[f"w={width}"] = variant_path
+            stored = await store_image_variants(file, base_dir)
+            unique_filename = stored["storage_path"]
+            variants = stored["variants"]
             
             # Obtener máximo order_index actual
             existing_photos = list_photos(entity_type, entity_id)
@@ -270,7 +309,7 @@ async def upload_photos(
                     "storage_path": unique_filename,
                     "public_url": public_url,
                     "variants": photo_record.get("variants") or variants,
-                    "variant_urls": _build_variant_urls(photo_record.get("variants") or variants),
+                    "variant_urls": build_variant_urls(photo_record.get("variants") or variants),
                     "is_cover": is_cover,
                     "order_index": photo_data["order_index"]
                 })
@@ -298,6 +337,8 @@ async def upload_photos(
             logger.error(f"Error al subir foto {file.filename}: {str(e)}")
             continue
     
+    if uploaded_photos:
+        public_cache.invalidate()
     return uploaded_photos
 
 
@@ -327,7 +368,7 @@ def list_photos(entity_type: str, entity_id: int) -> List[Dict[str, Any]]:
         result.append({
             **photo,
             "public_url": public_url,
-            "variant_urls": _build_variant_urls(photo.get("variants")),
+            "variant_urls": build_variant_urls(photo.get("variants")),
         })
     
     return result
@@ -361,7 +402,7 @@ def get_cover_photo(entity_type: str, entity_id: int) -> Optional[Dict[str, Any]
         return {
             **photo,
             "public_url": public_url,
-            "variant_urls": _build_variant_urls(photo.get("variants")),
+            "variant_urls": build_variant_urls(photo.get("variants")),
         }
     
     # Si no hay portada, buscar la primera por order_index
@@ -380,7 +421,7 @@ def get_cover_photo(entity_type: str, entity_id: int) -> Optional[Dict[str, Any]
         return {
             **photo,
             "public_url": public_url,
-            "variant_urls": _build_variant_urls(photo.get("variants")),
+            "variant_urls": build_variant_urls(photo.get("variants")),
         }
     
     return None
@@ -391,68 +432,61 @@ def get_cover_photos_map(entity_type: str, entity_ids: List[int]) -> Dict[int, O
     Obtiene las fotos de portada para múltiples entidades (útil para listados).
     Retorna un diccionario {entity_id: public_url}
     """
+    covers = get_cover_photos_with_variants(entity_type, entity_ids)
+    return {eid: cover["public_url"] for eid, cover in covers.items()}
+
+
+def get_cover_photos_with_variants(entity_type: str, entity_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Portada de varias entidades con sus variantes: la marcada is_cover (la de
+    menor id) o, si no hay, la primera por order_index. Retorna
+    {entity_id: {"public_url", "variant_urls"}}; get_cover_photos_map deriva
+    de aquí.
+    """
     if not entity_ids or entity_type not in ENTITY_CONFIG:
         return {}
-    
-    config = ENTITY_CONFIG[entity_type]
+
+    column = ENTITY_CONFIG[entity_type]['column']
     sb = get_public()
-    
-    # Obtener portadas explícitas
     clean_ids = unique_values(entity_ids)
-    cover_fields = f"id, {config['column']}, storage_path, is_cover, order_index"
-    covers = []
-    for ids_chunk in chunked(clean_ids):
-        covers.extend(
-            fetch_all_pages(
-                lambda ids_chunk=ids_chunk: sb.table("fotos")
-                .select(cover_fields)
-                .in_(config['column'], ids_chunk)
-                .eq("is_cover", True)
-                .order("id")
-            )
-        )
-    
-    cover_map = {}
-    covered_ids = set()
-    
-    for photo in covers:
-        eid = photo[config['column']]
-        if eid not in cover_map and photo.get("storage_path"):
-            public_url = storage_router.get_public_url(photo["storage_path"])
-            cover_map[eid] = public_url
-            covered_ids.add(eid)
-    
-    # Para las que no tienen portada, buscar la primera foto
-    missing_ids = [eid for eid in clean_ids if eid not in covered_ids]
+
+    def fetch_photos(ids: List[int], fields: List[str], only_covers: bool) -> List[Dict[str, Any]]:
+        photos: List[Dict[str, Any]] = []
+        for ids_chunk in chunked(ids):
+            def build(select_fields, ids_chunk=ids_chunk):
+                query = sb.table("fotos").select(",".join(select_fields)).in_(column, ids_chunk)
+                if only_covers:
+                    query = query.eq("is_cover", True)
+                return query.order("id")
+            photos.extend(_execute_photos_query_all(build, fields))
+        return photos
+
+    covers: Dict[int, Dict[str, Any]] = {}
+
+    def add_covers(photos: List[Dict[str, Any]]) -> None:
+        for photo in photos:
+            eid = photo[column]
+            if eid in covers or not photo.get("storage_path"):
+                continue
+            variants = photo.get("variants") or _derive_variant_paths(photo["storage_path"])
+            covers[eid] = {
+                "public_url": storage_router.get_public_url(photo["storage_path"]),
+                "variant_urls": build_variant_urls(variants),
+            }
+
+    # Portadas explícitas
+    add_covers(fetch_photos(clean_ids, ["id", column, "storage_path", "variants"], only_covers=True))
+
+    # Para las que no tienen portada, la primera foto por order_index
+    missing_ids = [eid for eid in clean_ids if eid not in covers]
     if missing_ids:
-        all_photos = []
-        for ids_chunk in chunked(missing_ids):
-            all_photos.extend(
-                fetch_all_pages(
-                    lambda ids_chunk=ids_chunk: sb.table("fotos")
-                    .select(f"id, {config['column']}, storage_path, order_index")
-                    .in_(config['column'], ids_chunk)
-                    .order("id")
-                )
-            )
-        
-        by_entity = {}
-        all_photos.sort(key=lambda photo: (
-            photo.get(config['column']) or 0,
+        photos = fetch_photos(missing_ids, ["id", column, "storage_path", "variants", "order_index"], only_covers=False)
+        photos.sort(key=lambda photo: (
             photo.get("order_index") if photo.get("order_index") is not None else 0,
             photo.get("id") or 0,
         ))
-        for photo in all_photos:
-            eid = photo[config['column']]
-            if eid not in by_entity and photo.get("storage_path"):
-                by_entity[eid] = photo["storage_path"]
-        
-        for eid, storage_path in by_entity.items():
-            if storage_path:
-                public_url = storage_router.get_public_url(storage_path)
-                cover_map[eid] = public_url
-    
-    return cover_map
+        add_covers(photos)
+    return covers
 
 
 def update_photo(
@@ -539,6 +573,7 @@ def update_photo(
             except Exception as audit_error:
                 logger.warning(f"[update_photo] Error al registrar auditoría: {str(audit_error)}")
         
+        public_cache.invalidate()
         return updated_photo
     
     return photo_data
@@ -567,6 +602,7 @@ def delete_photo(photo_id: int, user_id: Optional[int] = None, user_email: Optio
             logger.warning("No se pudo eliminar %s del storage: %s", object_path, e)
     
     sb.table("fotos").delete().eq("id", photo_id).execute()
+    public_cache.invalidate()
     
     # Registrar en auditoría
     if user_id or user_email:
@@ -0,0 +1,53 @@
+"""
+Cache en proceso de respuestas públicas (especies y sectores para la app QR).
+
+Los datos públicos solo cambian cuando el staff edita especies, sectores,
+fotos o la relación sector-especies; esas rutas llaman ``invalidate()``.
+Los resultados vacíos viven menos (pueden venir de un error ya registrado en
+el servicio) para no fijar un fallo transitorio durante todo el TTL.
+
+Los valores se comparten entre requests: quien los reciba no debe mutarlos.
+"""
+import os
+import threading
+from typing import Any, Callable, Hashable, TypeVar
+
+from app.utils.ttl_cache import TTLCache
+
+T = TypeVar("T")
+
+_MISSING = object()
+
+_responses: TTLCache[Any] = TTLCache(
+    max_entries=int(os.getenv("PUBLIC_CACHE_MAX_ENTRIES", "512")),
+    ttl_seconds=float(os.getenv("PUBLIC_CACHE_TTL_SECONDS", "300")),
+)
+_EMPTY_TTL_SECONDS = float(os.getenv("PUBLIC_CACHE_EMPTY_TTL_SECONDS", "15"))
+
+# Cada invalidación incrementa la generación; una carga que empezó antes no
+# guarda su resultado (podría traer datos previos a la escritura).
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def get_or_load(key: Hashable, loader: Callable[[], T]) -> T:
+    """Retorna el valor cacheado para ``key`` o lo calcula con ``loader``."""
+    cached = _responses.get(key, _MISSING)
+    if cached is not _MISSING:
+        return cached
+
+    generation = _generation
+    value = loader()
+    with _generation_lock:
+        if generation == _generation:
+            _responses.set(key, value, ttl_seconds=None if value else _EMPTY_TTL_SECONDS)
+    return value
+
+
+def invalidate() -> None:
+    """Descarta todo el cache público (se llama tras escrituras de staff)."""
+    global _generation
+    with _generation_lock:
+        _generation += 1
+        _responses.clear()
+
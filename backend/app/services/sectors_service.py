@@ -1,12 +1,27 @@
 # app/services/sectors_service.py
 from typing import List, Optional, Dict, Any, Set
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from app.core.supabase_auth import get_public, get_public_clean, get_service
-from app.services import photos_service
-from app.services.query_helpers import fetch_all_by_ids, fetch_all_pages
+from app.services import photos_service, public_cache
+from app.services.query_helpers import fetch_all_by_ids, fetch_all_pages, unique_values
 
 PUBLIC_SECTOR_FIELDS = ["id", "name", "description", "qr_code"]
 STAFF_SECTOR_FIELDS = PUBLIC_SECTOR_FIELDS + ["created_at", "updated_at"]
 
+logger = logging.getLogger(__name__)
+
+# Pool compartido para pedir especies y portadas del bundle en paralelo; cada
+# miss de cache reutiliza sus hilos en vez de crear un executor propio.
+_bundle_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SECTOR_BUNDLE_WORKERS", "4")),
+    thread_name_prefix="sector-bundle",
+)
+
 def list_public(q: Optional[str] = None) -> List[Dict[str, Any]]:
     # Usar cliente limpio sin sesión para consultas públicas
     sb = get_public_clean()
@@ -18,96 +33,137 @@ def list_public(q: Optional[str] = None) -> List[Dict[str, Any]]:
 
     return fetch_all_pages(build_query)
 
-def get_public_by_qr(qr_code: str) -> Optional[Dict[str, Any]]:
-    import logging
-    logger = logging.getLogger(__name__)
-    
-    # Usar cliente limpio sin sesión para consultas públicas
+# ----------------- ÍNDICE QR -----------------
+# qr_code normalizado (strip + minúsculas) -> sector público. Se carga al
+# arrancar y se recarga en cada escritura de sectores; el TTL cubre las
+# escrituras hechas por otros workers o réplicas.
+
+_QR_INDEX_TTL_SECONDS = float(os.getenv("SECTOR_QR_INDEX_TTL_SECONDS", "300"))
+# Ante un QR desconocido se recarga a lo más una vez cada este intervalo
+# (sector recién creado en otro worker), sin que un scraper fuerce recargas.
+_QR_INDEX_MISS_RELOAD_SECONDS = 30.0
+_SECTOR_ID_QR = re.compile(r"^SECTOR(\d+)$", re.IGNORECASE)
+
+_qr_index: Dict[str, Dict[str, Any]] = {}
+_sectors_by_id: Dict[int, Dict[str, Any]] = {}
+_qr_index_loaded_at: Optional[float] = None
+_qr_index_lock = threading.Lock()
+
+
+def _normalize_qr(qr_code: Any) -> str:
+    return str(qr_code).strip().lower() if qr_code is not None else ""
+
+
+def _load_qr_index_locked() -> int:
+    global _qr_index, _sectors_by_id, _qr_index_loaded_at
     sb = get_public_clean()
-    # Normalizar qr_code: remover espacios y convertir a string
-    qr_code_normalized = str(qr_code).strip() if qr_code else None
-    
-    if not qr_code_normalized:
-        logger.warning("[get_public_by_qr] qr_code vacío o None")
+    sectors = fetch_all_pages(
+        lambda: sb.table("sectores").select(",".join(PUBLIC_SECTOR_FIELDS)).order("id")
+    )
+    qr_index: Dict[str, Dict[str, Any]] = {}
+    for sector in sectors:
+        key = _normalize_qr(sector.get("qr_code"))
+        if key:
+            # Ante qr_code que solo difieren en mayúsculas gana el id menor
+            qr_index.setdefault(key, sector)
+    _qr_index = qr_index
+    _sectors_by_id = {sector["id"]: sector for sector in sectors}
+    _qr_index_loaded_at = time.monotonic()
+    logger.info(f"[load_qr_index] {len(qr_index)} códigos QR indexados")
+    return len(qr_index)
+
+
+def load_qr_index() -> int:
+    """Carga todos los sectores en el índice QR. Retorna la cantidad indexada."""
+    with _qr_index_lock:
+        return _load_qr_index_locked()
+
+
+def refresh_qr_index() -> None:
+    """Recarga el índice tras una escritura; si falla, se recarga en el próximo lookup."""
+    global _qr_index_loaded_at
+    with _qr_index_lock:
+        try:
+            _load_qr_index_locked()
+        except Exception as e:
+            logger.warning(f"[refresh_qr_index] No se pudo recargar el índice QR: {str(e)}")
+            _qr_index_loaded_at = None
+
+
+def _index_older_than(seconds: float) -> bool:
+    loaded_at = _qr_index_loaded_at
+    return loaded_at is None or time.monotonic() - loaded_at > seconds
+
+
+def _ensure_qr_index() -> None:
+    # Single-flight: las cargas se serializan con _qr_index_lock y quien
+    # esperaba el lock vuelve a revisar la edad en vez de recargar de nuevo.
+    if not _index_older_than(_QR_INDEX_TTL_SECONDS):
+        return
+    with _qr_index_lock:
+        if _index_older_than(_QR_INDEX_TTL_SECONDS):
+            _load_qr_index_locked()
+
+
+def _reload_on_miss() -> None:
+    global _qr_index_loaded_at
+    with _qr_index_lock:
+        if not _index_older_than(_QR_INDEX_MISS_RELOAD_SECONDS):
+            return  # otro request ya recargó mientras esperábamos
+        try:
+            _load_qr_index_locked()
+        except Exception as e:
+            logger.warning(f"[_reload_on_miss] No se pudo recargar el índice QR: {str(e)}")
+            _qr_index_loaded_at = None
+
+
+def _lookup_sector(key: str) -> Optional[Dict[str, Any]]:
+    sector = _qr_index.get(key)
+    if sector is None:
+        match = _SECTOR_ID_QR.match(key)
+        if match:
+            sector = _sectors_by_id.get(int(match.group(1)))
+    return sector
+
+
+def _resolve_sector(qr_code: str) -> Optional[Dict[str, Any]]:
+    """
+    Resuelve un QR a su sector: qr_code sin distinguir mayúsculas o
+    ``SECTOR{id}``, con un acceso al diccionario en memoria.
+    """
+    key = _normalize_qr(qr_code)
+    if not key:
         return None
-    
-    logger.info(f"[get_public_by_qr] Buscando sector con qr_code: '{qr_code_normalized}'")
-    
     try:
-        res = sb.table("sectores").select(",".join(PUBLIC_SECTOR_FIELDS)).eq("qr_code", qr_code_normalized).limit(1).execute()
-        
-        # Log detallado de la respuesta
-        logger.info(f"[get_public_by_qr] Respuesta de Supabase:")
-        logger.info(f"  - tiene data: {bool(res.data)}")
-        logger.info(f"  - tipo de data: {type(res.data)}")
-        logger.info(f"  - longitud: {len(res.data) if res.data else 0}")
-        if res.data:
-            logger.info(f"  - contenido: {res.data}")
-        
-        if res.data and len(res.data) > 0:
-            sector = res.data[0]
-            logger.info(f"[get_public_by_qr] Sector encontrado: id={sector.get('id')}, name={sector.get('name')}, qr_code={sector.get('qr_code')}")
-            return sector
-        else:
-            logger.warning(f"[get_public_by_qr] No se encontró sector con qr_code: '{qr_code_normalized}'")
-            
-            # Intentar búsqueda por ID si el qr_code tiene formato SECTOR{id}
-            import re
-            match = re.match(r'^SECTOR(\d+)$', qr_code_normalized, re.IGNORECASE)
-            if match:
-                sector_id = int(match.group(1))
-                logger.info(f"[get_public_by_qr] qr_code tiene formato SECTOR{{id}}, buscando por ID: {sector_id}")
-                res_by_id = sb.table("sectores").select(",".join(PUBLIC_SECTOR_FIELDS)).eq("id", sector_id).limit(1).execute()
-                if res_by_id.data and len(res_by_id.data) > 0:
-                    sector = res_by_id.data[0]
-                    logger.info(f"[get_public_by_qr] Sector encontrado por ID: id={sector.get('id')}, name={sector.get('name')}, qr_code={sector.get('qr_code')}")
-                    return sector
-            
-            # Búsqueda case-insensitive vía ilike (evita traer todos los sectores)
-            logger.info(f"[get_public_by_qr] Intentando búsqueda ilike...")
-            ilike_res = sb.table("sectores").select(",".join(PUBLIC_SECTOR_FIELDS)).ilike("qr_code", qr_code_normalized).limit(1).execute()
-            if ilike_res.data:
-                sector = ilike_res.data[0]
-                logger.info(f"[get_public_by_qr] Sector encontrado (ilike): id={sector.get('id')}, qr_code={sector.get('qr_code')}")
-                return sector
-            logger.warning(f"[get_public_by_qr] No se encontró sector con qr_code (ni por ID, ni ilike): '{qr_code_normalized}'")
-            return None
+        _ensure_qr_index()
     except Exception as e:
-        logger.error(f"[get_public_by_qr] Error al buscar sector: {str(e)}", exc_info=True)
+        logger.error(f"[_resolve_sector] Error cargando índice QR: {str(e)}", exc_info=True)
         return None
 
+    sector = _lookup_sector(key)
+    if sector is None and _index_older_than(_QR_INDEX_MISS_RELOAD_SECONDS):
+        _reload_on_miss()
+        sector = _lookup_sector(key)
+    logger.debug(f"[_resolve_sector] qr_code='{key}' -> {sector.get('id') if sector else None}")
+    return dict(sector) if sector else None
+
+
+def get_public_by_qr(qr_code: str) -> Optional[Dict[str, Any]]:
+    qr_code = _normalize_qr(qr_code)
+    return public_cache.get_or_load(("sectors.get_public_by_qr", qr_code), lambda: _resolve_sector(qr_code))
+
 def _get_sector_id_by_qr(qr_code: str) -> Optional[int]:
-    import logging
-    logger = logging.getLogger(__name__)
-    
-    # Usar cliente limpio sin sesión para consultas públicas
-    sb = get_public_clean()
-    qr_code_normalized = str(qr_code).strip() if qr_code else None
-    
-    if not qr_code_normalized:
-        return None
-    
-    try:
-        r = sb.table("sectores").select("id").eq("qr_code", qr_code_normalized).limit(1).execute()
-        if r.data and len(r.data) > 0:
-            logger.info(f"[_get_sector_id_by_qr] Sector encontrado con id: {r.data[0]['id']} para qr_code: {qr_code_normalized}")
-            return r.data[0]["id"]
-        else:
-            # Intentar búsqueda por ID si el qr_code tiene formato SECTOR{id}
-            import re
-            match = re.match(r'^SECTOR(\d+)$', qr_code_normalized, re.IGNORECASE)
-            if match:
-                sector_id = int(match.group(1))
-                logger.info(f"[_get_sector_id_by_qr] qr_code tiene formato SECTOR{{id}}, retornando ID: {sector_id}")
-                return sector_id
-            
-            logger.warning(f"[_get_sector_id_by_qr] No se encontró sector con qr_code: {qr_code_normalized}")
-            return None
-    except Exception as e:
-        logger.error(f"[_get_sector_id_by_qr] Error al buscar sector: {str(e)}", exc_info=True)
-        return None
+    sector = _resolve_sector(qr_code)
+    return sector["id"] if sector else None
 
 def list_species_public_by_sector_qr(qr_code: str) -> List[Dict[str, Any]]:
+    qr_code = _normalize_qr(qr_code)
+    return public_cache.get_or_load(
+        ("sectors.list_species_public_by_sector_qr", qr_code),
+        lambda: _list_species_public_by_sector_qr(qr_code),
+    )
+
+def _list_species_public_by_sector_qr(qr_code: str) -> List[Dict[str, Any]]:
     """
     Devuelve especies (campos públicos) presentes en el sector identificado por 'qr_code'.
     Las especies se obtienen desde la tabla sectores_especies.
@@ -121,10 +177,10 @@ def list_species_public_by_sector_qr(qr_code: str) -> List[Dict[str, Any]]:
     sector_id = _get_sector_id_by_qr(qr_code)
     
     if not sector_id:
-        logger.warning(f"[list_species_public_by_sector_qr] No se encontró sector_id para qr_code: {qr_code}")
+        logger.debug(f"[list_species_public_by_sector_qr] No se encontró sector_id para qr_code: {qr_code}")
         return []
 
-    logger.info(f"[list_species_public_by_sector_qr] Buscando especies para sector_id: {sector_id}")
+    logger.debug(f"[list_species_public_by_sector_qr] Buscando especies para sector_id: {sector_id}")
 
     # 1) Obtener los IDs de especies desde sectores_especies (tabla de relación)
     relations = fetch_all_pages(
@@ -134,19 +190,19 @@ def list_species_public_by_sector_qr(qr_code: str) -> List[Dict[str, Any]]:
         .order("id")
     )
     
-    logger.info(f"[list_species_public_by_sector_qr] Relaciones encontradas: {len(relations)}")
+    logger.debug(f"[list_species_public_by_sector_qr] Relaciones encontradas: {len(relations)}")
     
     if not relations:
-        logger.info(f"[list_species_public_by_sector_qr] No hay relaciones en sectores_especies para sector_id: {sector_id}")
+        logger.debug(f"[list_species_public_by_sector_qr] No hay relaciones en sectores_especies para sector_id: {sector_id}")
         return []
     
     especie_ids = [r["especie_id"] for r in relations if r.get("especie_id")]
     
     if not especie_ids:
-        logger.warning(f"[list_species_public_by_sector_qr] No hay especie_ids válidos en las relaciones")
+        logger.debug(f"[list_species_public_by_sector_qr] No hay especie_ids válidos en las relaciones")
         return []
 
-    logger.info(f"[list_species_public_by_sector_qr] Obteniendo información de {len(especie_ids)} especies")
+    logger.debug(f"[list_species_public_by_sector_qr] Obteniendo información de {len(especie_ids)} especies")
 
     # 2) Obtener información de las especies (campos públicos)
     #    NOTA: nombres en tu schema: scientific_name, nombre_común, slug
@@ -159,14 +215,14 @@ def list_species_public_by_sector_qr(qr_code: str) -> List[Dict[str, Any]]:
         order_by="scientific_name",
     )
 
-    logger.info(f"[list_species_public_by_sector_qr] Especies obtenidas: {len(species)}")
+    logger.debug(f"[list_species_public_by_sector_qr] Especies obtenidas: {len(species)}")
 
     # 3) Traer foto de portada por especie usando el servicio genérico
     cover_map: Dict[int, Optional[str]] = {}
     if species:
         ids = [s["id"] for s in species]
         cover_map = photos_service.get_cover_photos_map("especie", ids)
-        logger.info(f"[list_species_public_by_sector_qr] Fotos de portada obtenidas: {len([k for k, v in cover_map.items() if v])}")
+        logger.debug(f"[list_species_public_by_sector_qr] Fotos de portada obtenidas: {len([k for k, v in cover_map.items() if v])}")
 
     # 4) Construir respuesta con cover_photo
     out = []
@@ -182,9 +238,61 @@ def list_species_public_by_sector_qr(qr_code: str) -> List[Dict[str, Any]]:
     # Ordenar por nombre común o científico
     out.sort(key=lambda x: (x["nombre_común"] or x["scientific_name"]).lower())
     
-    logger.info(f"[list_species_public_by_sector_qr] Retornando {len(out)} especies ordenadas")
+    logger.debug(f"[list_species_public_by_sector_qr] Retornando {len(out)} especies ordenadas")
     return out
 
+def get_public_bundle(qr_code: str) -> Optional[Dict[str, Any]]:
+    """
+    Sector + especies + portadas (con variantes) para la pantalla de la app QR
+    en una sola respuesta. None si el QR no corresponde a ningún sector.
+    """
+    qr_code = _normalize_qr(qr_code)
+    return public_cache.get_or_load(("sectors.get_public_bundle", qr_code), lambda: _get_public_bundle(qr_code))
+
+def _get_public_bundle(qr_code: str) -> Optional[Dict[str, Any]]:
+    sector = _resolve_sector(qr_code)
+    if not sector:
+        return None
+
+    sb = get_public_clean()
+    relations = fetch_all_pages(
+        lambda: sb.table("sectores_especies")
+        .select("id, especie_id")
+        .eq("sector_id", sector["id"])
+        .order("id")
+    )
+    especie_ids = unique_values(r.get("especie_id") for r in relations)
+    if not especie_ids:
+        return {"sector": sector, "species": []}
+
+    # Especies y portadas solo dependen de los ids: se piden en paralelo
+    species_future = _bundle_executor.submit(
+        fetch_all_by_ids,
+        get_public_clean(),
+        "especies",
+        "id, slug, scientific_name, nombre_común",
+        "id",
+        especie_ids,
+    )
+    covers_future = _bundle_executor.submit(photos_service.get_cover_photos_with_variants, "especie", especie_ids)
+    species = species_future.result()
+    covers = covers_future.result()
+
+    out = []
+    for s in species:
+        cover = covers.get(s["id"]) or {}
+        out.append({
+            "id": s["id"],
+            "slug": s["slug"],
+            "scientific_name": s["scientific_name"],
+            "nombre_común": s.get("nombre_común"),
+            "cover_photo": cover.get("public_url"),
+            "cover_variant_urls": cover.get("variant_urls") or {},
+        })
+    out.sort(key=lambda x: (x["nombre_común"] or x["scientific_name"]).lower())
+    logger.debug(f"[get_public_bundle] sector={sector['id']} especies={len(out)}")
+    return {"sector": sector, "species": out}
+
 # ----------------- STAFF (privado) -----------------
 
 def list_staff(q: Optional[str] = None) -> List[Dict[str, Any]]:
@@ -283,6 +391,8 @@ def create_staff(payload: Dict[str, Any], user_id: Optional[int] = None, user_em
             except Exception as audit_error:
                 logger.warning(f"[create_staff] Error al registrar auditoría: {str(audit_error)}")
         
+        refresh_qr_index()
+        public_cache.invalidate()
         return created_sector
     except Exception as e:
         # Capturar errores de Supabase y proporcionar mensaje más claro
@@ -407,6 +517,8 @@ def update_staff(sector_id: int, payload: Dict[str, Any], user_id: Optional[int]
         except Exception as audit_error:
             logger.warning(f"[update_staff] Error al registrar auditoría: {str(audit_error)}")
     
+    refresh_qr_index()
+    public_cache.invalidate()
     return updated_sector
 
 def delete_admin(sector_id: int, user_id: Optional[int] = None, user_email: Optional[str] = None, user_name: Optional[str] = None, ip_address: Optional[str] = None, user_agent: Optional[str] = None) -> None:
@@ -422,6 +534,8 @@ def delete_admin(sector_id: int, user_id: Optional[int] = None, user_email: Opti
     
     # (Opcional: validar que no tenga ejemplares asociados)
     sb.table("sectores").delete().eq("id", sector_id).execute()
+    refresh_qr_index()
+    public_cache.invalidate()
     
     # Registrar en auditoría
     if (user_id or user_email) and old_values:
@@ -546,5 +660,6 @@ def update_sector_species_staff(sector_id: int, especie_ids: List[int], user_id:
         except Exception as audit_error:
             logger.warning(f"[update_sector_species_staff] Error al registrar auditoría: {str(audit_error)}")
     
+    public_cache.invalidate()
     # Retornar las especies actualizadas para confirmar
     return get_sector_species_staff(sector_id)
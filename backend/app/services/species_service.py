@@ -1,7 +1,7 @@
 # app/services/species_service.py
 from typing import List, Optional, Dict, Any
 from app.core.supabase_auth import get_public, get_public_clean, get_service
-from app.services import photos_service
+from app.services import photos_service, public_cache
 
 PUBLIC_SPECIES_FIELDS = [
     "id", "slug", "nombre_común", "scientific_name",
@@ -26,6 +26,12 @@ def _cover_photo_map(species_ids: List[int]) -> Dict[int, Optional[str]]:
 # ----------------- PÚBLICO -----------------
 
 def list_public(q: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+    q = (q or "").strip() or None
+    # ilike no distingue mayúsculas: "Cactus" y "cactus" comparten entrada
+    key = ("species.list_public", q.lower() if q else None, limit, offset)
+    return public_cache.get_or_load(key, lambda: _list_public(q, limit, offset))
+
+def _list_public(q: Optional[str], limit: int, offset: int) -> List[Dict[str, Any]]:
     # Usar cliente limpio sin sesión para consultas públicas
     sb = get_public_clean()
     query = sb.table("especies").select(",".join(PUBLIC_SPECIES_FIELDS))
@@ -41,6 +47,10 @@ def list_public(q: Optional[str] = None, limit: int = 50, offset: int = 0) -> Li
     return out
 
 def get_public_by_slug(slug: str) -> Optional[Dict[str, Any]]:
+    slug = str(slug).strip()
+    return public_cache.get_or_load(("species.get_public_by_slug", slug), lambda: _get_public_by_slug(slug))
+
+def _get_public_by_slug(slug: str) -> Optional[Dict[str, Any]]:
     # Usar cliente limpio sin sesión para consultas públicas
     sb = get_public_clean()
     res = sb.table("especies").select(",".join(PUBLIC_SPECIES_FIELDS)).eq("slug", slug).limit(1).execute()
@@ -166,6 +176,7 @@ def create_staff(payload: Dict[str, Any], user_id: Optional[int] = None, user_em
         else:
             logger.warning(f"[create_staff] ⚠️ No se registra auditoría: user_id y user_email son None")
         
+        public_cache.invalidate()
         return created_species
     except Exception as e:
         logger.error(f"[create_staff] Error al crear especie: {str(e)}")
@@ -260,6 +271,7 @@ def update_staff(species_id: int, payload: Dict[str, Any], user_id: Optional[int
         else:
             logger.warning(f"[update_staff] ⚠️ No se registra auditoría: user_id y user_email son None")
         
+        public_cache.invalidate()
         return updated_species
     except Exception as e:
         logger.error(f"[update_staff] Error al actualizar especie: {str(e)}")
@@ -278,6 +290,7 @@ def delete_admin(species_id: int, user_id: Optional[int] = None, user_email: Opt
     
     # (Opcional: validar dependencias: ejemplar, fotos_especies, purchase_items, etc.)
     sb.table("especies").delete().eq("id", species_id).execute()
+    public_cache.invalidate()
     
     # Registrar en auditoría
     if (user_id or user_email) and old_values:
@@ -1,6 +1,8 @@
 from datetime import datetime, timezone
 import logging
 import os
+import threading
+import time
 from typing import Any, Dict, Optional
 
 from app.core.supabase_auth import get_service
@@ -31,6 +33,28 @@ ALLOWED_MODULES = {
     "Otro",
 }
 
+# Columnas expuestas por la API (sin search_vector, que es solo para búsqueda)
+TICKET_FIELDS = [
+    "id",
+    "type",
+    "status",
+    "module",
+    "title",
+    "description",
+    "steps_to_reproduce",
+    "expected_result",
+    "actual_result",
+    "resolution_note",
+    "created_by_uid",
+    "created_by_email",
+    "created_by_name",
+    "page_url",
+    "user_agent",
+    "closed_at",
+    "created_at",
+    "updated_at",
+]
+
 CREATE_TEXT_FIELDS = [
     "title",
     "description",
@@ -88,9 +112,14 @@ def _annotate_permissions(row: Dict[str, Any], user_id: Optional[str], user_emai
     return row
 
 
+def _ticket_fields(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Filtra la representación de insert/update (trae todas las columnas) a TICKET_FIELDS."""
+    return {field: row.get(field) for field in TICKET_FIELDS if field in row}
+
+
 def _get_ticket(ticket_id: int) -> Optional[Dict[str, Any]]:
     sb = get_service()
-    result = sb.table("support_tickets").select("*").eq("id", ticket_id).limit(1).execute()
+    result = sb.table("support_tickets").select(",".join(TICKET_FIELDS)).eq("id", ticket_id).limit(1).execute()
     if not result.data:
         return None
     return result.data[0]
@@ -124,6 +153,16 @@ def _audit(
         logger.warning("[support_tickets] Error registrando auditoria: %s", audit_error)
 
 
+def _apply_search(query, q: Optional[str]):
+    """Full-text (config spanish) sobre título y descripción; un número busca también por id."""
+    term = (q or "").replace('"', " ").strip()
+    if not term:
+        return query
+    if term.isdigit():
+        return query.or_(f'id.eq.{term},search_vector.wfts(spanish)."{term}"')
+    return query.filter("search_vector", "wfts(spanish)", term)
+
+
 def list_staff(
     status: Optional[str] = None,
     type: Optional[str] = None,
@@ -136,58 +175,87 @@ def list_staff(
 ) -> Dict[str, Any]:
     sb = get_service()
 
-    query = sb.table("support_tickets").select("*")
+    query = sb.table("support_tickets").select(",".join(TICKET_FIELDS), count="exact")
     if status:
         query = query.eq("status", status)
     if type:
         query = query.eq("type", type)
     if module:
         query = query.eq("module", module)
+    query = _apply_search(query, q)
 
-    result = query.order("created_at", desc=True).range(0, 999).execute()
+    result = query.order("created_at", desc=True).order("id", desc=True)\
+        .range(offset, offset + limit - 1).execute()
     rows = result.data or []
 
-    if q:
-        needle = q.strip().lower()
-        rows = [
-            row
-            for row in rows
-            if needle in " ".join(
-                [
-                    str(row.get("id") or ""),
-                    row.get("title") or "",
-                    row.get("description") or "",
-                    row.get("module") or "",
-                    row.get("created_by_email") or "",
-                ]
-            ).lower()
-        ]
-
-    total = len(rows)
-    page = rows[offset: offset + limit]
     return {
-        "data": [_annotate_permissions(row, user_id, user_email) for row in page],
-        "total": total,
+        "data": [_annotate_permissions(row, user_id, user_email) for row in rows],
+        "total": result.count if result.count is not None else len(rows),
         "limit": limit,
         "offset": offset,
     }
 
 
-def get_summary(user_email: Optional[str] = None) -> Dict[str, Any]:
+# Conteo por estado en memoria: create/update/delete lo ajustan en el acto y
+# cada SUPPORT_SUMMARY_RECOUNT_SECONDS se recuenta desde la base para corregir
+# deriva (otros workers, escrituras fuera de la API).
+_summary_lock = threading.Lock()
+_summary_counts: Optional[Dict[str, int]] = None
+_summary_loaded_at = 0.0
+
+
+def _recount_interval() -> float:
+    return float(os.getenv("SUPPORT_SUMMARY_RECOUNT_SECONDS", "300"))
+
+
+def _count_by_status() -> Dict[str, int]:
     sb = get_service()
-    result = sb.table("support_tickets").select("id, status").range(0, 1999).execute()
-    rows = result.data or []
+    result = sb.table("support_tickets_status_counts").select("status, total").execute()
+    counts = {status: 0 for status in ALLOWED_STATUSES}
+    for row in result.data or []:
+        counts[row.get("status")] = int(row.get("total") or 0)
+    return counts
+
+
+def _adjust_summary(old_status: Optional[str], new_status: Optional[str]) -> None:
+    """Mueve un ticket entre estados en el conteo cacheado (None = no existe)."""
+    if old_status == new_status:
+        return
+    with _summary_lock:
+        if _summary_counts is None:
+            return
+        if old_status is not None:
+            _summary_counts[old_status] = max(0, _summary_counts.get(old_status, 0) - 1)
+        if new_status is not None:
+            _summary_counts[new_status] = _summary_counts.get(new_status, 0) + 1
+
+
+def invalidate_summary() -> None:
+    global _summary_counts
+    with _summary_lock:
+        _summary_counts = None
+
+
+def _get_status_counts() -> Dict[str, int]:
+    global _summary_counts, _summary_loaded_at
+    with _summary_lock:
+        if _summary_counts is not None and time.monotonic() - _summary_loaded_at < _recount_interval():
+            return dict(_summary_counts)
+    counts = _count_by_status()
+    with _summary_lock:
+        _summary_counts = counts
+        _summary_loaded_at = time.monotonic()
+        return dict(counts)
 
-    by_status = {status: 0 for status in ALLOWED_STATUSES}
-    for row in rows:
-        status = row.get("status")
-        if status in by_status:
-            by_status[status] += 1
+
+def get_summary(user_email: Optional[str] = None) -> Dict[str, Any]:
+    counts = _get_status_counts()
+    by_status = {status: counts.get(status, 0) for status in ALLOWED_STATUSES}
 
     return {
         "by_status": by_status,
         "open_count": by_status["en_espera"] + by_status["en_revision"],
-        "total": len(rows),
+        "total": sum(counts.values()),
         "can_manage_all": _is_support_admin(user_email),
     }
 
@@ -245,7 +313,8 @@ def create_staff(
     if not result.data:
         raise ValueError("No se pudo crear el ticket")
 
-    created = result.data[0]
+    created = _ticket_fields(result.data[0])
+    _adjust_summary(None, created.get("status"))
     _audit(
         record_id=created["id"],
         action="CREATE",
@@ -312,7 +381,8 @@ def update_staff(
     if not result.data:
         raise LookupError("Ticket no encontrado")
 
-    updated = result.data[0]
+    updated = _ticket_fields(result.data[0])
+    _adjust_summary(current.get("status"), updated.get("status"))
     _audit(
         record_id=ticket_id,
         action="UPDATE",
@@ -344,6 +414,7 @@ def delete_staff(
         raise PermissionError("No tienes permiso para eliminar este ticket")
 
     sb.table("support_tickets").delete().eq("id", ticket_id).execute()
+    _adjust_summary(current.get("status"), None)
     _audit(
         record_id=ticket_id,
         action="DELETE",
@@ -1,15 +1,23 @@
 # app/services/transactions_service.py
-from typing import List, Dict, Any, Optional
+from typing import Iterable, List, Dict, Any, Optional, Tuple
 from pathlib import Path
 from fastapi import Request, UploadFile
-from datetime import datetime
+from starlette.concurrency import run_in_threadpool
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from io import BytesIO
+import asyncio
+import os
+import re
+import unicodedata
 import uuid
 import logging
 
+from PIL import Image
+
 from app.core.supabase_auth import get_service
 from app.core import storage_router
-from app.services.query_helpers import fetch_all_by_ids
-from app.services import ejemplar_service
+from app.services.query_helpers import chunked, fetch_all_by_ids, fetch_all_pages, unique_values
 from app.services import audit_service
 
 logger = logging.getLogger(__name__)
@@ -25,11 +33,19 @@ FACTURA_FIELDS = [
     "document_path",
     "document_name",
     "document_content_type",
+    "document_thumbnail_path",
 ]
 FACTURA_NUMERIC_FIELDS = ["net_amount", "tax_amount", "total_amount"]
 
 ALLOWED_DOCUMENT_TYPES = ("image/", "application/pdf")
 DOCUMENT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+THUMBNAIL_MAX_SIZE = 320
+
+# Pool dedicado para rasterizar PDFs y reescalar imágenes fuera del event loop.
+_thumbnail_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("INVOICE_THUMBNAIL_WORKERS", "2")),
+    thread_name_prefix="invoice-thumb",
+)
 
 
 # ============================================================
@@ -68,6 +84,10 @@ def _serialize_factura(row: Dict[str, Any]) -> Dict[str, Any]:
     row["document_url"] = (
         storage_router.get_public_url(document_path) if document_path else None
     )
+    thumbnail_path = row.get("document_thumbnail_path")
+    row["document_thumbnail_url"] = (
+        storage_router.get_public_url(thumbnail_path) if thumbnail_path else None
+    )
     return row
 
 
@@ -136,6 +156,8 @@ def create_purchase(
 
         created = result.data[0]
         factura_id = created.get("id")
+        refresh_daily_rollup([created.get("issue_date")])
+        _link_factura_ejemplares_safe(created)
 
         try:
             audit_service.log_change(
@@ -187,6 +209,9 @@ def update_purchase(
         if not result.data:
             raise LookupError("Factura no encontrada")
         updated = result.data[0]
+        refresh_daily_rollup([old_values.get("issue_date"), updated.get("issue_date")])
+        if any(old_values.get(field) != updated.get(field) for field in ("nursery", "invoice_number")):
+            _link_factura_ejemplares_safe(updated)
 
         try:
             audit_service.log_change(
@@ -226,15 +251,17 @@ def delete_purchase(
         raise LookupError("Factura no encontrada")
     old_values = current.data[0]
 
-    # Borrar el documento del storage si existe
-    document_path = old_values.get("document_path")
-    if document_path:
+    # Borrar el documento (y su miniatura) del storage si existe
+    for path in (old_values.get("document_path"), old_values.get("document_thumbnail_path")):
+        if not path:
+            continue
         try:
-            storage_router.delete_object(document_path)
+            storage_router.delete_object(path)
         except Exception as storage_error:
-            logger.warning(f"[delete_purchase] No se pudo borrar documento: {str(storage_error)}")
+            logger.warning(f"[delete_purchase] No se pudo borrar {path}: {str(storage_error)}")
 
     sb.table("facturas_compra").delete().eq("id", factura_id).execute()
+    refresh_daily_rollup([old_values.get("issue_date")])
 
     try:
         audit_service.log_change(
@@ -253,17 +280,198 @@ def delete_purchase(
         logger.warning(f"[delete_purchase] Error auditoría: {str(audit_error)}")
 
 
+def _normalize_text(value: Any) -> str:
+    text = unicodedata.normalize("NFKD", str(value or ""))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r"[^0-9a-z]+", " ", text.lower()).strip()
+
+
+def normalize_invoice_key(nursery: Any, invoice_number: Any) -> Optional[Tuple[str, str]]:
+    """
+    Clave para emparejar ejemplares con facturas escritas a mano: vivero sin
+    tildes/mayúsculas/puntuación y número de factura solo alfanumérico
+    ("F-001" == "f 001"; "0012" == "12"). None si falta alguno de los dos.
+    """
+    nursery_key = _normalize_text(nursery)
+    invoice_key = _normalize_text(invoice_number).replace(" ", "")
+    if invoice_key.isdigit():
+        invoice_key = invoice_key.lstrip("0") or "0"
+    if not nursery_key or not invoice_key:
+        return None
+    return nursery_key, invoice_key
+
+
+def _link_factura_ejemplares_safe(factura: Dict[str, Any]) -> None:
+    # El vínculo se puede reconstruir con reconcile_ejemplar_facturas: no
+    # fallar la escritura de la factura por esto.
+    try:
+        link_factura_ejemplares(factura)
+    except Exception as e:
+        logger.warning(f"[link_factura_ejemplares] Factura {factura.get('id')}: {str(e)}")
+
+
+def invoice_key_value(nursery: Any, invoice_number: Any) -> Optional[str]:
+    """
+    normalize_invoice_key como texto ("vivero|número"): el valor de la columna
+    generada invoice_key de facturas_compra y ejemplar (ver migración
+    20261019210000_add_invoice_key.sql).
+    """
+    key = normalize_invoice_key(nursery, invoice_number)
+    return "|".join(key) if key else None
+
+
+def resolve_factura_id(nursery: Any, invoice_number: Any) -> Optional[int]:
+    """
+    Factura que corresponde a vivero + número de factura, con la misma
+    normalización que reconcile_ejemplar_facturas. None si no hay una única.
+    """
+    invoice_key = invoice_key_value(nursery, invoice_number)
+    if invoice_key is None:
+        return None
+    matches = get_service().table("facturas_compra")\
+        .select("id")\
+        .eq("invoice_key", invoice_key)\
+        .order("id")\
+        .limit(2)\
+        .execute().data or []
+    return matches[0]["id"] if len(matches) == 1 else None
+
+
+def link_factura_ejemplares(factura: Dict[str, Any]) -> None:
+    """
+    Re-resuelve ejemplar.factura_id tras crear o editar una factura: vincula
+    los ejemplares con la misma invoice_key (si no es ambigua) y desvincula
+    los que apuntaban a ella y ya no coinciden.
+    """
+    sb = get_service()
+    factura_id = factura["id"]
+    invoice_key = invoice_key_value(factura.get("nursery"), factura.get("invoice_number"))
+
+    to_link: List[int] = []
+    if invoice_key is not None and resolve_factura_id(factura.get("nursery"), factura.get("invoice_number")) == factura_id:
+        candidates = fetch_all_pages(
+            lambda: sb.table("ejemplar")
+            .select("id, factura_id")
+            .eq("invoice_key", invoice_key)
+            .order("id")
+        )
+        to_link = [row["id"] for row in candidates if row.get("factura_id") != factura_id]
+
+    linked = fetch_all_pages(
+        lambda: sb.table("ejemplar")
+        .select("id, invoice_key")
+        .eq("factura_id", factura_id)
+        .order("id")
+    )
+    to_unlink = [row["id"] for row in linked if invoice_key is None or row.get("invoice_key") != invoice_key]
+
+    for ids_chunk in chunked(to_link):
+        sb.table("ejemplar").update({"factura_id": factura_id}).in_("id", ids_chunk).execute()
+    for ids_chunk in chunked(to_unlink):
+        sb.table("ejemplar").update({"factura_id": None}).in_("id", ids_chunk).execute()
+    if to_link or to_unlink:
+        logger.info(
+            f"[link_factura_ejemplares] Factura {factura_id}: {len(to_link)} vinculados, {len(to_unlink)} desvinculados"
+        )
+
+
+def list_purchase_ejemplares(
+    factura_id: int,
+    limit: int = 100,
+    offset: int = 0,
+) -> Dict[str, Any]:
+    """
+    Lista los ejemplares vinculados a una factura por ejemplar.factura_id
+    (índice), con el nombre de la especie. Retorna {"data": [...], "total": N}.
+    """
+    sb = get_service()
+
+    factura = sb.table("facturas_compra").select("id").eq("id", factura_id).limit(1).execute()
+    if not factura.data:
+        raise LookupError("Factura no encontrada")
+
+    result = sb.table("ejemplar").select("*", count="exact")\
+        .eq("factura_id", factura_id)\
+        .order("id")\
+        .range(offset, offset + limit - 1)\
+        .execute()
+    ejemplares = result.data or []
+
+    species_ids = [row.get("species_id") for row in ejemplares]
+    especies_map = {
+        row["id"]: row
+        for row in fetch_all_by_ids(sb, "especies", "id, scientific_name, nombre_común", "id", species_ids)
+    } if any(species_ids) else {}
+    for row in ejemplares:
+        row["especies"] = especies_map.get(row.get("species_id"))
+
+    return {"data": ejemplares, "total": getattr(result, "count", None) or 0}
+
+
+def _stream_size(stream) -> int:
+    """Tamaño restante del stream sin leerlo a memoria."""
+    position = stream.tell()
+    size = stream.seek(0, 2) - position
+    stream.seek(position)
+    return size
+
+
+def _render_thumbnail(fileobj, content_type: str) -> bytes:
+    """Miniatura JPEG: primera página si es PDF, la imagen reescalada si no."""
+    fileobj.seek(0)
+    if content_type == "application/pdf":
+        import pypdfium2 as pdfium
+
+        pdf = pdfium.PdfDocument(fileobj)
+        try:
+            page = pdf[0]
+            width, _ = page.get_size()
+            image = page.render(scale=min(1.0, THUMBNAIL_MAX_SIZE / width)).to_pil()
+            page.close()
+        finally:
+            pdf.close()
+    else:
+        image = Image.open(fileobj)
+        image.draft("RGB", (THUMBNAIL_MAX_SIZE, THUMBNAIL_MAX_SIZE))
+
+    image.thumbnail((THUMBNAIL_MAX_SIZE, THUMBNAIL_MAX_SIZE), Image.Resampling.LANCZOS)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    output = BytesIO()
+    image.save(output, format="JPEG", quality=80)
+    return output.getvalue()
+
+
+def _upload_thumbnail(fileobj, content_type: str, key: str) -> Optional[str]:
+    """Genera y sube la miniatura; retorna su key o None si no se pudo generar."""
+    try:
+        data = _render_thumbnail(fileobj, content_type)
+        storage_router.upload_object(
+            key=key,
+            data=data,
+            content_type="image/jpeg",
+            cache_control=DOCUMENT_CACHE_CONTROL,
+        )
+        return key
+    except Exception as e:
+        logger.warning(f"[upload_invoice_document] No se pudo generar miniatura {key}: {str(e)}")
+        return None
+
+
 async def upload_invoice_document(file: UploadFile) -> Dict[str, Any]:
     """
     Sube el documento de una factura (imagen o PDF) a R2 y retorna su key,
-    URL pública y metadata. No procesa la imagen (a diferencia de fotos).
+    URL pública y metadata. El archivo se transmite desde UploadFile.file
+    (multipart en R2), sin leerlo completo a memoria. Luego genera en el
+    pool de miniaturas un JPEG pequeño junto al documento
+    (``<document_path>.thumb.jpg``); si falla, el documento igual queda subido.
     """
     content_type = file.content_type or "application/octet-stream"
     if not content_type.startswith("image/") and content_type != "application/pdf":
         raise ValueError("El documento debe ser una imagen o un PDF")
 
-    data = await file.read()
-    if not data:
+    await file.seek(0)
+    if _stream_size(file.file) <= 0:
         raise ValueError("El archivo está vacío")
 
     extension = (Path(file.filename).suffix if file.filename else "").lower()
@@ -272,18 +480,111 @@ async def upload_invoice_document(file: UploadFile) -> Dict[str, Any]:
 
     key = f"facturas/{uuid.uuid4()}{extension}"
 
-    storage_router.upload_object(
+    await run_in_threadpool(
+        storage_router.upload_fileobj,
         key=key,
-        data=data,
+        fileobj=file.file,
         content_type=content_type,
         cache_control=DOCUMENT_CACHE_CONTROL,
     )
 
+    thumbnail_path = await asyncio.wrap_future(
+        _thumbnail_executor.submit(_upload_thumbnail, file.file, content_type, f"{key}.thumb.jpg")
+    )
+
     return {
         "document_path": key,
         "document_url": storage_router.get_public_url(key),
         "document_name": file.filename,
         "document_content_type": content_type,
+        "document_thumbnail_path": thumbnail_path,
+        "document_thumbnail_url": storage_router.get_public_url(thumbnail_path) if thumbnail_path else None,
+    }
+
+
+# ============================================================
+# ROLLUP DIARIO (transacciones_diarias)
+# ============================================================
+REPORT_GROUPS = ("day", "species", "nursery")
+_REPORT_SUMS = (
+    "purchase_count",
+    "purchase_cost",
+    "sale_count",
+    "sale_revenue",
+    "invoice_count",
+    "invoice_total",
+)
+
+
+def refresh_daily_rollup(days: Iterable[Any]) -> None:
+    """
+    Recalcula transacciones_diarias para los días tocados por una escritura.
+    Un fallo se registra y no interrumpe la operación principal; el día se
+    corrige en la próxima escritura que lo toque.
+    """
+    clean_days = sorted({str(day)[:10] for day in days if day})
+    if not clean_days:
+        return
+    try:
+        get_service().rpc("refresh_transacciones_diarias", {"p_days": clean_days}).execute()
+    except Exception as e:
+        logger.warning(f"[refresh_daily_rollup] No se pudo recalcular {clean_days}: {str(e)}")
+
+
+def _parse_report_date(value: Optional[str], label: str) -> date:
+    if not value:
+        raise ValueError(f"{label} es obligatoria")
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{label} inválida (usar YYYY-MM-DD)")
+
+
+def get_report(
+    date_from: Optional[str],
+    date_to: Optional[str],
+    group_by: str = "day",
+) -> Dict[str, Any]:
+    """
+    Reporte de compras, ventas y margen en un rango de fechas, leído desde el
+    rollup diario y agrupado por día, especie o vivero.
+    """
+    start = _parse_report_date(date_from, "La fecha de inicio")
+    end = _parse_report_date(date_to, "La fecha de fin")
+    if start > end:
+        raise ValueError("La fecha de inicio debe ser anterior a la fecha de fin")
+    if group_by not in REPORT_GROUPS:
+        raise ValueError(f"group_by debe ser uno de {', '.join(REPORT_GROUPS)}")
+
+    result = get_service().rpc("get_transactions_report", {
+        "p_date_from": start.isoformat(),
+        "p_date_to": end.isoformat(),
+        "p_group_by": group_by,
+    }).execute()
+
+    totals: Dict[str, float] = {field: 0 for field in _REPORT_SUMS}
+    rows: List[Dict[str, Any]] = []
+    for raw in result.data or []:
+        row = {field: _to_number(raw.get(field)) or 0 for field in _REPORT_SUMS}
+        row["margin"] = row["sale_revenue"] - row["purchase_cost"]
+        if group_by == "day":
+            row["day"] = raw.get("day")
+        elif group_by == "species":
+            row["species_id"] = raw.get("species_id")
+            row["scientific_name"] = raw.get("scientific_name")
+        else:
+            row["nursery"] = raw.get("nursery") or None
+        rows.append(row)
+        for field in _REPORT_SUMS:
+            totals[field] += row[field]
+    totals["margin"] = totals["sale_revenue"] - totals["purchase_cost"]
+
+    return {
+        "date_from": start.isoformat(),
+        "date_to": end.isoformat(),
+        "group_by": group_by,
+        "totals": totals,
+        "rows": rows,
     }
 
 
@@ -302,8 +603,10 @@ def register_sale(
 ) -> Dict[str, Any]:
     """
     Registra la venta de uno o más ejemplares: setea sale_date y sale_price
-    en cada uno reutilizando ejemplar_service.update_staff (que ya audita la
-    acción SALE). Omite los que ya tengan sale_date.
+    en bloque. Un select trae todos los ejemplares y un update por chunk de
+    ids solo toca los que siguen sin sale_date, por lo que una venta
+    concurrente del mismo ejemplar queda en ``skipped``. Audita UPDATE y
+    SALE por ejemplar igual que ejemplar_service.update_staff.
     """
     if not ejemplar_ids:
         raise ValueError("Debes seleccionar al menos un ejemplar")
@@ -317,29 +620,49 @@ def register_sale(
     skipped: List[int] = []
     errors: List[Dict[str, Any]] = []
 
-    for ejemplar_id in ejemplar_ids:
+    requested_ids = unique_values(ejemplar_ids)
+    current_rows = {
+        row["id"]: row
+        for row in fetch_all_by_ids(sb, "ejemplar", "*", "id", requested_ids)
+    }
+
+    sellable: List[int] = []
+    for ejemplar_id in requested_ids:
+        row = current_rows.get(ejemplar_id)
+        if row is None:
+            errors.append({"id": ejemplar_id, "error": "no encontrado"})
+        elif row.get("sale_date"):
+            skipped.append(ejemplar_id)
+        else:
+            sellable.append(ejemplar_id)
+
+    updated_rows: Dict[int, Dict[str, Any]] = {}
+    for ids_chunk in chunked(sellable):
         try:
-            current = sb.table("ejemplar").select("id, sale_date").eq("id", ejemplar_id).limit(1).execute()
-            if not current.data:
-                errors.append({"id": ejemplar_id, "error": "no encontrado"})
-                continue
-            if current.data[0].get("sale_date"):
-                skipped.append(ejemplar_id)
-                continue
-
-            ejemplar_service.update_staff(
-                ejemplar_id,
-                {"sale_date": sale_date, "sale_price": price},
-                user_id=user_id,
-                user_email=user_email,
-                user_name=user_name,
-                ip_address=ip,
-                user_agent=user_agent,
-            )
-            sold.append(ejemplar_id)
+            result = sb.table("ejemplar")\
+                .update({"sale_date": sale_date, "sale_price": price})\
+                .in_("id", ids_chunk)\
+                .is_("sale_date", "null")\
+                .execute()
+            for row in result.data or []:
+                updated_rows[row["id"]] = row
         except Exception as e:
-            logger.warning(f"[register_sale] Error en ejemplar {ejemplar_id}: {str(e)}")
-            errors.append({"id": ejemplar_id, "error": str(e)})
+            logger.warning(f"[register_sale] Error al vender ejemplares {ids_chunk}: {str(e)}")
+            errors.extend({"id": ejemplar_id, "error": str(e)} for ejemplar_id in ids_chunk)
+            continue
+        # Los que no volvieron se vendieron entre el select y el update.
+        skipped.extend(ejemplar_id for ejemplar_id in ids_chunk if ejemplar_id not in updated_rows)
+
+    if updated_rows:
+        refresh_daily_rollup([sale_date])
+
+    for ejemplar_id in sellable:
+        updated = updated_rows.get(ejemplar_id)
+        if updated is None:
+            continue
+        sold.append(ejemplar_id)
+        if user_id or user_email:
+            _log_sale(current_rows[ejemplar_id], updated, user_id, user_email, user_name, ip, user_agent)
 
     return {
         "sold": sold,
@@ -349,116 +672,108 @@ def register_sale(
     }
 
 
+def _log_sale(
+    old_values: Dict[str, Any],
+    updated: Dict[str, Any],
+    user_id: Optional[int],
+    user_email: Optional[str],
+    user_name: Optional[str],
+    ip: Optional[str],
+    user_agent: Optional[str],
+) -> None:
+    """Encola los eventos UPDATE y SALE de un ejemplar vendido (el writer los inserta en lote)."""
+    context = {
+        "table_name": "ejemplar",
+        "record_id": updated["id"],
+        "user_id": user_id,
+        "user_email": user_email,
+        "user_name": user_name,
+        "ip_address": ip,
+        "user_agent": user_agent,
+    }
+    audit_service.log_change(action="UPDATE", old_values=old_values, new_values=updated, **context)
+    audit_service.log_change(
+        action="SALE",
+        old_values={
+            "sale_date": old_values.get("sale_date"),
+            "sale_price": old_values.get("sale_price"),
+        },
+        new_values={
+            "sale_date": updated.get("sale_date"),
+            "sale_price": updated.get("sale_price"),
+        },
+        **context,
+    )
+
+
 # ============================================================
-# VENTAS (vista agrupada — sin cambios)
+# VENTAS (vista agrupada)
 # ============================================================
+_SALE_ITEM_FIELDS = (
+    "species_id",
+    "sector_id",
+    "price",
+    "quantity",
+    "purchase_date",
+    "purchase_price",
+    "nursery",
+    "invoice_number",
+    "age_months",
+    "health_status",
+    "location",
+)
+
+
 def get_sales_grouped(
     request: Optional[Request] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
-    limit: int = 500,
+    limit: int = 50,
     offset: int = 0,
 ) -> List[Dict[str, Any]]:
     """
     Obtiene ventas agrupadas por fecha.
-    Soporta filtros de rango de fecha y paginación.
+
+    La agregación por (sale_date, species_id, sale_price) y el join con
+    especies los hace la función SQL get_sales_grouped; ``limit``/``offset``
+    paginan días de venta, así los totales de un día siempre están completos.
     """
     sb = get_service()
 
     try:
-        query = sb.table("ejemplar").select(
-            "id, species_id, sector_id, sale_date, sale_price, "
-            "purchase_date, purchase_price, nursery, invoice_number, "
-            "age_months, health_status, location"
-        ).filter("sale_date", "not.is", "null")
-
-        if date_from:
-            query = query.gte("sale_date", date_from)
-        if date_to:
-            query = query.lte("sale_date", date_to)
-
-        query = query.order("sale_date", desc=True).range(offset, offset + limit - 1)
-        result = query.execute()
-
-        if not result.data:
-            return []
-
-        # Agrupar por sale_date
-        grouped = {}
-
-        for ejemplar in result.data:
-            sale_date = ejemplar.get("sale_date")
-
-            if sale_date not in grouped:
-                grouped[sale_date] = {
+        result = sb.rpc("get_sales_grouped", {
+            "p_date_from": date_from or None,
+            "p_date_to": date_to or None,
+            "p_limit": limit,
+            "p_offset": offset,
+        }).execute()
+
+        sales: List[Dict[str, Any]] = []
+        by_date: Dict[str, Dict[str, Any]] = {}
+        for row in result.data or []:
+            sale_date = row.get("sale_date")
+            day = by_date.get(sale_date)
+            if day is None:
+                day = {
                     "sale_date": sale_date,
                     "total_amount": 0,
                     "total_quantity": 0,
-                    "items": []
+                    "items": [],
                 }
-
-            # Agregar ejemplar al grupo
-            price = float(ejemplar.get("sale_price") or 0)
-            grouped[sale_date]["total_amount"] += price
-            grouped[sale_date]["total_quantity"] += 1
-
-            # Agrupar items por especie y precio para mostrar mejor
-            species_id = ejemplar.get("species_id")
-
-            # Buscar si ya existe un item con esta especie y precio
-            existing_item = None
-            for item in grouped[sale_date]["items"]:
-                if item.get("species_id") == species_id and item.get("price") == price:
-                    existing_item = item
-                    break
-
-            if existing_item:
-                # Incrementar cantidad si ya existe
-                existing_item["quantity"] = (existing_item.get("quantity") or 1) + 1
-            else:
-                # Crear nuevo item
-                grouped[sale_date]["items"].append({
-                    "species_id": species_id,
-                    "sector_id": ejemplar.get("sector_id"),
-                    "price": price,
-                    "quantity": 1,
-                    "purchase_date": ejemplar.get("purchase_date"),
-                    "purchase_price": ejemplar.get("purchase_price"),
-                    "nursery": ejemplar.get("nursery"),
-                    "invoice_number": ejemplar.get("invoice_number"),
-                    "age_months": ejemplar.get("age_months"),
-                    "health_status": ejemplar.get("health_status"),
-                    "location": ejemplar.get("location"),
-                })
-
-        # Convertir a lista y ordenar por fecha (más reciente primero)
-        sales = list(grouped.values())
-        sales.sort(key=lambda x: x["sale_date"], reverse=True)
-
-        # Obtener información de especies para cada item
-        species_ids = set()
-        for sale in sales:
-            for item in sale["items"]:
-                if item.get("species_id"):
-                    species_ids.add(item["species_id"])
-
-        if species_ids:
-            species_rows = fetch_all_by_ids(
-                sb,
-                "especies",
-                "id, scientific_name, nombre_común",
-                "id",
-                list(species_ids),
-                order_by="id",
-            )
-            species_map = {s["id"]: s for s in species_rows}
-
-            # Agregar información de especie a cada item
-            for sale in sales:
-                for item in sale["items"]:
-                    species_id = item.get("species_id")
-                    if species_id and species_id in species_map:
-                        item["species"] = species_map[species_id]
+                by_date[sale_date] = day
+                sales.append(day)
+
+            item = {field: row.get(field) for field in _SALE_ITEM_FIELDS}
+            item["price"] = float(item["price"] or 0)
+            if row.get("scientific_name") is not None or row.get("nombre_comun") is not None:
+                item["species"] = {
+                    "id": row.get("species_id"),
+                    "scientific_name": row.get("scientific_name"),
+                    "nombre_común": row.get("nombre_comun"),
+                }
+            day["items"].append(item)
+            day["total_amount"] += float(row.get("total_amount") or 0)
+            day["total_quantity"] += int(row.get("quantity") or 0)
 
         return sales
 
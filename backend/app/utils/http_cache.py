@@ -0,0 +1,56 @@
+"""
+Helpers de caché HTTP: ETag y respuestas condicionales (304)
+"""
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse, Response
+
+
+def compute_etag(payload: Any, weak: bool = True) -> str:
+    """ETag estable para un payload JSON (mismas claves/valores => mismo ETag)."""
+    body = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"), default=str)
+    digest = hashlib.sha1(body.encode("utf-8")).hexdigest()
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+
+def compute_body_etag(body: bytes, weak: bool = True) -> str:
+    """ETag a partir del cuerpo ya serializado de la respuesta."""
+    digest = hashlib.sha1(body).hexdigest()
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparación débil de If-None-Match (RFC 9110 §13.1.2), incluye ``*``."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or _opaque(etag) in {_opaque(candidate) for candidate in candidates}
+
+
+def conditional_json(
+    request: Request,
+    payload: Any,
+    etag: Optional[str] = None,
+    cache_control: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Responde ``payload`` como JSON con ETag, o ``304 Not Modified`` sin cuerpo
+    si el cliente ya tiene esa versión (If-None-Match).
+    """
+    etag = etag or compute_etag(payload)
+    response_headers = {"ETag": etag, **(headers or {})}
+    if cache_control:
+        response_headers["Cache-Control"] = cache_control
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=response_headers)
+    return JSONResponse(content=jsonable_encoder(payload), headers=response_headers)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark del rate limiter en memoria (GCRA con lock striping).
+
+Funcionalidades:
+- Genera --ips direcciones distintas y reparte --requests chequeos entre
+  --threads hilos, eligiendo IPs al azar (semilla fija).
+- Reporta chequeos por segundo, claves rastreadas y proporción rechazada.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.middleware.rate_limiter import GCRALimiter
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Medir throughput del rate limiter en memoria")
+    parser.add_argument("--ips", type=int, default=10_000, help="IPs distintas")
+    parser.add_argument("--requests", type=int, default=500_000, help="Chequeos totales")
+    parser.add_argument("--threads", type=int, default=4, help="Hilos concurrentes")
+    parser.add_argument("--limit", type=int, default=5, help="Peticiones permitidas por ventana")
+    parser.add_argument("--window", type=float, default=60, help="Ventana en segundos")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = _parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    limiter = GCRALimiter(max_keys=args.ips)
+    ips = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(args.ips)]
+    per_thread = args.requests // args.threads
+    rejected = [0] * args.threads
+
+    def worker(index: int) -> None:
+        rng = random.Random(index)
+        keys = [("bench", rng.choice(ips)) for _ in range(per_thread)]
+        barrier.wait()
+        count = 0
+        for key in keys:
+            if not limiter.hit(key, args.limit, args.window)[0]:
+                count += 1
+        rejected[index] = count
+
+    barrier = threading.Barrier(args.threads + 1)
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    total = per_thread * args.threads
+    logger.info("Chequeos: %s en %.3fs (%s hilos)", total, elapsed, args.threads)
+    logger.info("Throughput: %.0f chequeos/s", total / elapsed)
+    logger.info("Claves rastreadas: %s", len(limiter))
+    logger.info("Rechazadas: %.1f%%", 100 * sum(rejected) / total)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Script para compactar los UPDATE existentes en auditoria_cambios.
+
+Funcionalidades:
+- Recorre los eventos UPDATE por id ascendente (keyset, sin offset).
+- Marca como snapshot (es_snapshot) el primer UPDATE de cada registro y uno
+  cada --snapshot-every, pero solo si campos_nuevos trae todas las columnas
+  de la tabla; si el evento auditó solo parte de la fila se compacta como
+  diff y el snapshot pasa al siguiente UPDATE completo.
+- En el resto borra campos_anteriores/campos_nuevos y deja solo
+  cambios_detectados (calculándolo si faltaba).
+- Con --dry-run solo reporta cuántas filas se compactarían.
+
+El resultado es el mismo formato que escribe audit_service con
+AUDIT_STORAGE_MODE=compact, por lo que reconstruct_record funciona igual
+sobre filas antiguas y nuevas.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.supabase_auth import get_service
+from app.services.audit_service import _compute_changes
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Compactar UPDATEs de auditoria_cambios a solo diffs")
+    parser.add_argument("--table", default=None, help="Limitar a una tabla_afectada")
+    parser.add_argument("--snapshot-every", type=int, default=20, help="Cada cuántos UPDATE por registro conservar la fila completa")
+    parser.add_argument("--batch-size", type=int, default=500, help="Filas leídas por página")
+    parser.add_argument("--dry-run", action="store_true", help="Solo contar sin modificar filas")
+    return parser.parse_args()
+
+
+def _table_columns(sb, table_name: str, cache: Dict[str, FrozenSet[str]]) -> FrozenSet[str]:
+    """Columnas de la tabla según una fila cualquiera (vacío si no se puede leer)."""
+    if table_name not in cache:
+        try:
+            rows = sb.table(table_name).select("*").limit(1).execute().data or []
+        except Exception as error:
+            logger.warning("No se pudieron leer columnas de %s: %s", table_name, error)
+            rows = []
+        cache[table_name] = frozenset(rows[0]) if rows else frozenset()
+    return cache[table_name]
+
+
+def _is_full_row(values: Optional[Dict[str, Any]], columns: FrozenSet[str]) -> bool:
+    return bool(values) and bool(columns) and columns <= set(values)
+
+
+def _compact_row(row: Dict[str, Any], keep_snapshot: bool) -> Optional[Dict[str, Any]]:
+    """Retorna el payload de update para la fila, o None si no hay que tocarla."""
+    old_values = row.get("campos_anteriores")
+    new_values = row.get("campos_nuevos")
+    if keep_snapshot:
+        return {"campos_anteriores": None, "es_snapshot": True}
+    if old_values is None or not new_values:
+        # Ya compactada, o sin ambas versiones no hay diff confiable.
+        return None
+    changes = row.get("cambios_detectados") or _compute_changes(old_values, new_values)
+    return {"campos_anteriores": None, "campos_nuevos": None, "cambios_detectados": changes}
+
+
+def main() -> None:
+    args = _parse_args()
+    logging.basicConfig(level=logging.INFO)
+    snapshot_every = max(1, args.snapshot_every)
+
+    sb = get_service()
+    columns_cache: Dict[str, FrozenSet[str]] = {}
+    # UPDATEs desde el último snapshot por registro; sin entrada = snapshot pendiente
+    counters: Dict[Tuple[str, int], int] = {}
+    last_id = 0
+    scanned = 0
+    compacted = 0
+    snapshots = 0
+
+    while True:
+        query = sb.table("auditoria_cambios")\
+            .select("id, tabla_afectada, registro_id, campos_anteriores, campos_nuevos, cambios_detectados, es_snapshot")\
+            .eq("accion", "UPDATE")\
+            .gt("id", last_id)
+        if args.table:
+            query = query.eq("tabla_afectada", args.table)
+        rows = query.order("id").limit(args.batch_size).execute().data or []
+        if not rows:
+            break
+
+        for row in rows:
+            scanned += 1
+            key = (row["tabla_afectada"], row["registro_id"])
+            since = counters.get(key, snapshot_every)
+            keep_snapshot = bool(row.get("es_snapshot")) or (
+                since + 1 >= snapshot_every
+                and _is_full_row(row.get("campos_nuevos"), _table_columns(sb, key[0], columns_cache))
+            )
+            if keep_snapshot:
+                snapshots += 1
+                counters[key] = 0
+            else:
+                counters[key] = since + 1
+
+            if keep_snapshot and row.get("es_snapshot") and row.get("campos_anteriores") is None:
+                continue
+            update_data = _compact_row(row, keep_snapshot)
+            if not update_data:
+                continue
+            if not keep_snapshot:
+                compacted += 1
+            if args.dry_run:
+                continue
+            sb.table("auditoria_cambios").update(update_data).eq("id", row["id"]).execute()
+
+        last_id = rows[-1]["id"]
+        logger.info("Procesadas %s filas (hasta id %s)", scanned, last_id)
+
+    prefix = "[dry-run] " if args.dry_run else ""
+    logger.info("%sUPDATE revisados: %s", prefix, scanned)
+    logger.info("%sSnapshots conservados: %s", prefix, snapshots)
+    logger.info("%sFilas compactadas: %s", prefix, compacted)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,8 @@ Script para migrar objetos desde Supabase Storage a Cloudflare R2.
 
 Funcionalidades:
 - Lista objetos en el bucket de Supabase.
-- Copia cada objeto a R2 manteniendo la estructura.
+- Copia cada objeto a R2 manteniendo la estructura, transmitiendo el contenido
+  (upload multipart) sin cargar el archivo completo en memoria.
 - Verifica integridad (size/etag) tras la copia.
 - Opcional: normaliza storage_path/public_url si se guardaron URLs completas.
 """
@@ -17,7 +18,9 @@ import os
 import sys
 from pathlib import Path
 from typing import Dict, Iterable, List, Optional, Tuple
-from urllib.parse import urlparse
+from urllib.parse import quote, urlparse
+
+import requests
 
 # Agregar el directorio raíz al path
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -79,6 +82,34 @@ def _normalize_etag(value: Optional[str]) -> Optional[str]:
     return value.strip("\"")
 
 
+def _open_supabase_stream(bucket: str, key: str) -> requests.Response:
+    """Abre la descarga del objeto como stream HTTP con la service role key."""
+    supabase_url = os.environ["SUPABASE_URL"].rstrip("/")
+    service_key = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
+    response = requests.get(
+        f"{supabase_url}/storage/v1/object/{bucket}/{quote(key)}",
+        headers={"Authorization": f"Bearer {service_key}", "apikey": service_key},
+        stream=True,
+        timeout=(10, 300),
+    )
+    response.raise_for_status()
+    response.raw.decode_content = True
+    return response
+
+
+class _CountingReader:
+    """Envuelve el stream para contar los bytes (ya decodificados) que se suben."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._raw.read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
 def _migrate_object(
     sb,
     bucket: str,
@@ -92,25 +123,30 @@ def _migrate_object(
         logger.info("[dry-run] Migrar %s", key)
         return True, True
 
-    data = sb.storage.from_(bucket).download(key)
     content_type = metadata.get("mimetype") or metadata.get("contentType") or metadata.get("content-type")
     cache_control = metadata.get("cacheControl")
 
-    r2_storage.upload_object(
-        key=key,
-        data=data,
-        content_type=content_type,
-        cache_control=cache_control,
-    )
+    with _open_supabase_stream(bucket, key) as response:
+        # raw.tell() cuenta bytes comprimidos del socket; con decode_content lo
+        # que se sube son los bytes decodificados, así que se cuentan aquí.
+        reader = _CountingReader(response.raw)
+        r2_storage.upload_fileobj(
+            key=key,
+            fileobj=reader,
+            content_type=content_type,
+            cache_control=cache_control,
+        )
+        expected_size = metadata.get("size") or reader.bytes_read
 
     head = r2_client.head_object(Bucket=r2_bucket, Key=key)
-    expected_size = metadata.get("size") or len(data)
     expected_etag = _normalize_etag(metadata.get("eTag") or metadata.get("etag"))
     actual_size = head.get("ContentLength")
     actual_etag = _normalize_etag(head.get("ETag"))
 
     size_ok = actual_size == expected_size
-    etag_ok = True if expected_etag is None else expected_etag == actual_etag
+    # Los uploads multipart tienen ETag "<md5>-<partes>", no comparable con el MD5 de Supabase.
+    multipart = bool(actual_etag and "-" in actual_etag)
+    etag_ok = True if expected_etag is None or multipart else expected_etag == actual_etag
 
     if not size_ok:
         logger.warning("[integridad] Size mismatch %s (supabase=%s, r2=%s)", key, expected_size, actual_size)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Script para vincular ejemplares existentes con su factura de compra.
+
+Funcionalidades:
+- Carga todas las facturas y arma un índice por vivero + número de factura
+  normalizados (transactions_service.normalize_invoice_key).
+- Recorre los ejemplares con invoice_number y sin factura_id por id
+  ascendente (keyset) y setea factura_id en lote, un update por factura.
+- Claves que apuntan a más de una factura se reportan y no se vinculan.
+- Idempotente: se puede volver a correr para vincular ejemplares nuevos.
+"""
+
+from __future__ import annotations
+
+import argparse
+import logging
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.supabase_auth import get_service
+from app.services.query_helpers import chunked, fetch_all_pages
+from app.services.transactions_service import normalize_invoice_key
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Vincular ejemplar.factura_id por vivero y número de factura")
+    parser.add_argument("--batch-size", type=int, default=500, help="Ejemplares leídos por página")
+    parser.add_argument("--dry-run", action="store_true", help="Solo reportar coincidencias sin modificar filas")
+    return parser.parse_args()
+
+
+def _build_factura_index(sb) -> Tuple[Dict[Tuple[str, str], int], Set[Tuple[str, str]]]:
+    facturas = fetch_all_pages(
+        lambda: sb.table("facturas_compra").select("id, nursery, invoice_number").order("id")
+    )
+    index: Dict[Tuple[str, str], int] = {}
+    ambiguous: Set[Tuple[str, str]] = set()
+    for factura in facturas:
+        key = normalize_invoice_key(factura.get("nursery"), factura.get("invoice_number"))
+        if key is None:
+            continue
+        if key in index:
+            ambiguous.add(key)
+        index[key] = factura["id"]
+    for key in ambiguous:
+        index.pop(key, None)
+    logger.info("Facturas indexadas: %s (ambiguas: %s)", len(index), len(ambiguous))
+    return index, ambiguous
+
+
+def main() -> None:
+    args = _parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    sb = get_service()
+    index, ambiguous = _build_factura_index(sb)
+
+    last_id = 0
+    scanned = 0
+    linked = 0
+    unmatched = 0
+    skipped_ambiguous = 0
+
+    while True:
+        rows = sb.table("ejemplar")\
+            .select("id, nursery, invoice_number")\
+            .is_("factura_id", "null")\
+            .filter("invoice_number", "not.is", "null")\
+            .gt("id", last_id)\
+            .order("id")\
+            .limit(args.batch_size)\
+            .execute().data or []
+        if not rows:
+            break
+
+        by_factura: Dict[int, List[int]] = defaultdict(list)
+        for row in rows:
+            scanned += 1
+            key = normalize_invoice_key(row.get("nursery"), row.get("invoice_number"))
+            if key in ambiguous:
+                skipped_ambiguous += 1
+            elif key in index:
+                by_factura[index[key]].append(row["id"])
+            else:
+                unmatched += 1
+
+        for factura_id, ejemplar_ids in by_factura.items():
+            linked += len(ejemplar_ids)
+            if args.dry_run:
+                logger.info("[dry-run] Factura %s <- ejemplares %s", factura_id, ejemplar_ids)
+                continue
+            for ids_chunk in chunked(ejemplar_ids):
+                sb.table("ejemplar").update({"factura_id": factura_id}).in_("id", ids_chunk).execute()
+
+        last_id = rows[-1]["id"]
+        logger.info("Procesados %s ejemplares (hasta id %s)", scanned, last_id)
+
+    prefix = "[dry-run] " if args.dry_run else ""
+    logger.info("%sEjemplares revisados: %s", prefix, scanned)
+    logger.info("%sVinculados: %s", prefix, linked)
+    logger.info("%sSin factura coincidente: %s", prefix, unmatched)
+    logger.info("%sOmitidos por factura ambigua: %s", prefix, skipped_ambiguous)
+
+
+if __name__ == "__main__":
+    main()
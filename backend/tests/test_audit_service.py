@@ -1,6 +1,10 @@
+import json
 from types import SimpleNamespace
 
+import pytest
+
 from app.services import audit_service
+from app.services.audit_writer import AuditWriter
 
 
 class FakeQuery:
@@ -9,15 +13,24 @@ class FakeQuery:
         self.operation = None
         self.payload = None
         self.is_count = False
+        self.columns = None
 
-    def select(self, *_args, **kwargs):
+    def select(self, *args, **kwargs):
         self.operation = "select"
+        self.columns = args[0] if args else None
         self.is_count = kwargs.get("count") == "exact"
         return self
 
+    def in_(self, *_args):
+        return self
+
+    def or_(self, condition):
+        self.database.or_filters.append(condition)
+        return self
+
     def insert(self, payload):
         self.operation = "insert"
-        self.payload = dict(payload)
+        self.payload = [dict(row) for row in payload]
         return self
 
     def eq(self, *_args):
@@ -33,37 +46,90 @@ class FakeQuery:
         return self
 
     def execute(self):
+        self.database.executed += 1
         if self.operation == "insert":
-            self.database.inserted = dict(self.payload)
-            return SimpleNamespace(data=[{"id": 100, **self.payload}])
+            if self.database.fail_inserts:
+                raise RuntimeError("database unavailable")
+            if any(row.get("registro_id") in self.database.rejected_ids for row in self.payload):
+                raise RuntimeError("violates foreign key constraint")
+            self.database.insert_calls.append(self.payload)
+            self.database.inserted = self.payload[-1]
+            return SimpleNamespace(data=[{"id": 100 + index, **row} for index, row in enumerate(self.payload)])
         if self.is_count:
-            return SimpleNamespace(data=[{"id": 1}], count=37)
+            return SimpleNamespace(data=[{"id": 1, "created_at": "2026-07-21T10:00:00+00:00"}], count=37)
+        if self.columns == "registro_id, accion, es_snapshot":
+            self.database.history_queries += 1
+            return SimpleNamespace(data=list(self.database.history))
         return SimpleNamespace(data=[{"id": 37, "accion": "PURCHASE"}])
 
 
+class FakeRowsQuery:
+    def __init__(self, database, table_name):
+        self.database = database
+        self.table_name = table_name
+
+    def select(self, *_args):
+        return self
+
+    def in_(self, _column, ids):
+        self.ids = list(ids)
+        return self
+
+    def range(self, *_args):
+        return self
+
+    def execute(self):
+        self.database.row_queries.append((self.table_name, self.ids))
+        return SimpleNamespace(data=[row for row in self.database.current_rows[self.table_name] if row["id"] in self.ids])
+
+
 class FakeSupabase:
     def __init__(self):
         self.inserted = None
+        self.insert_calls = []
+        self.fail_inserts = False
+        self.rejected_ids = set()
+        self.or_filters = []
+        self.executed = 0
+        self.history = []
+        self.history_queries = 0
+        self.current_rows = {}
+        self.row_queries = []
 
     def table(self, table_name):
+        if table_name in self.current_rows:
+            return FakeRowsQuery(self, table_name)
         assert table_name == "auditoria_cambios"
         return FakeQuery(self)
 
 
-def test_log_change_preserves_purchase_action(monkeypatch):
+@pytest.fixture
+def writer(monkeypatch, tmp_path):
     database = FakeSupabase()
     monkeypatch.setattr(audit_service, "get_service", lambda: database)
+    audit_writer = AuditWriter(
+        audit_service._insert_events,
+        batch_size=10,
+        spill_path=tmp_path / "audit_spill.jsonl",
+    )
+    monkeypatch.setattr(audit_service, "_writer", audit_writer)
+    return audit_writer, database
+
+
+def test_log_change_preserves_purchase_action(writer):
+    _, database = writer
 
     audit_service.log_change("ejemplar", 12, "PURCHASE", user_id=2)
+    audit_service.flush_pending()
 
     assert database.inserted["accion"] == "PURCHASE"
 
 
-def test_log_change_rejects_unknown_action_without_fallback(monkeypatch):
-    database = FakeSupabase()
-    monkeypatch.setattr(audit_service, "get_service", lambda: database)
+def test_log_change_rejects_unknown_action_without_fallback(writer):
+    _, database = writer
 
     audit_service.log_change("ejemplar", 12, "UNKNOWN", user_id=2)
+    audit_service.flush_pending()
 
     assert database.inserted is None
 
@@ -76,3 +142,283 @@ def test_get_audit_log_returns_page_and_filtered_total(monkeypatch):
 
     assert len(logs) == 1
     assert total == 37
+    assert database.executed == 1
+
+
+def test_get_audit_page_keyset_cursor_round_trip(monkeypatch):
+    database = FakeSupabase()
+    monkeypatch.setattr(audit_service, "get_service", lambda: database)
+
+    first = audit_service.get_audit_page(limit=1)
+    audit_service.get_audit_page(limit=1, cursor=first["next_cursor"])
+
+    assert audit_service.decode_audit_cursor(first["next_cursor"]) == ("2026-07-21T10:00:00+00:00", 1)
+    assert database.or_filters == [
+        'created_at.lt."2026-07-21T10:00:00+00:00",'
+        'and(created_at.eq."2026-07-21T10:00:00+00:00",id.lt.1)'
+    ]
+
+
+def test_get_audit_page_rejects_tampered_cursor(monkeypatch):
+    monkeypatch.setattr(audit_service, "get_service", lambda: FakeSupabase())
+
+    with pytest.raises(ValueError):
+        audit_service.get_audit_page(cursor="not-a-cursor")
+
+
+def test_log_change_enqueues_and_flushes_as_one_multi_row_insert(writer):
+    audit_writer, database = writer
+
+    for record_id in range(3):
+        audit_service.log_change("ejemplar", record_id, "SALE", user_id=2)
+
+    assert database.insert_calls == []
+    assert audit_writer.pending() == 3
+
+    audit_service.flush_pending()
+
+    assert len(database.insert_calls) == 1
+    assert [row["registro_id"] for row in database.insert_calls[0]] == [0, 1, 2]
+    assert all(row["usuario_id"] == 2 and row["created_at"] for row in database.insert_calls[0])
+
+
+def test_failed_flush_spills_to_disk_and_replays_later(writer):
+    audit_writer, database = writer
+    database.fail_inserts = True
+
+    audit_service.log_change("especies", 5, "UPDATE", user_id=2, old_values={"a": 1}, new_values={"a": 2})
+    audit_service.flush_pending()
+
+    assert audit_writer.spill_path.exists()
+    assert database.insert_calls == []
+
+    database.fail_inserts = False
+    audit_service.log_change("especies", 6, "DELETE", user_id=2)
+    audit_service.flush_pending()
+
+    assert not audit_writer.spill_path.exists()
+    assert [[row["registro_id"] for row in call] for call in database.insert_calls] == [[5], [6]]
+
+
+def test_poison_spill_does_not_block_new_events_and_is_quarantined(writer):
+    audit_writer, database = writer
+    database.fail_inserts = True
+    audit_service.log_change("especies", 5, "DELETE", user_id=2)
+    audit_service.flush_pending()
+
+    database.fail_inserts = False
+    database.rejected_ids = {5}
+    for record_id in (6, 7, 8):
+        audit_service.log_change("especies", record_id, "DELETE", user_id=2)
+        audit_service.flush_pending()
+
+    assert [[row["registro_id"] for row in call] for call in database.insert_calls] == [[6], [7], [8]]
+    assert not audit_writer.spill_path.exists()
+    quarantine = audit_writer.spill_path.with_name("audit_spill.quarantine.jsonl")
+    assert '"registro_id": 5' in quarantine.read_text(encoding="utf-8")
+
+
+def test_resolve_internal_user_id_uses_identity_cache_filled_at_auth(monkeypatch):
+    monkeypatch.setattr(
+        audit_service,
+        "get_service",
+        lambda: pytest.fail("No debe consultar usuarios para una identidad en cache"),
+    )
+
+    audit_service.remember_internal_user_id(
+        77,
+        supabase_uid="0b8f5c3e-auth-uid",
+        user_email="Staff@Example.com",
+    )
+
+    assert audit_service.resolve_internal_user_id("0b8f5c3e-auth-uid", None) == 77
+    assert audit_service.resolve_internal_user_id(None, "staff@example.com") == 77
+
+
+def test_compact_updates_store_diffs_and_periodic_snapshots(writer, monkeypatch):
+    _, database = writer
+    monkeypatch.setenv("AUDIT_STORAGE_MODE", "compact")
+    monkeypatch.setenv("AUDIT_SNAPSHOT_EVERY", "3")
+    database.current_rows["ejemplar"] = [{"id": 9, "sale_price": 3, "nursery": "Vivero"}]
+
+    for price in range(1, 4):
+        audit_service.log_change(
+            "ejemplar", 9, "UPDATE", user_id=2,
+            old_values={"id": 9, "sale_price": price - 1, "nursery": "Vivero"},
+            new_values={"id": 9, "sale_price": price, "nursery": "Vivero"},
+        )
+    audit_service.flush_pending()
+
+    rows = database.insert_calls[0]
+    assert [row["campos_nuevos"] for row in rows[:2]] == [None, None]
+    assert rows[0]["cambios_detectados"] == {"sale_price": {"anterior": 0, "nuevo": 1}}
+    assert rows[2]["campos_nuevos"] == {"id": 9, "sale_price": 3, "nursery": "Vivero"}
+    assert [row["es_snapshot"] for row in rows] == [False, False, True]
+    assert all(row["campos_anteriores"] is None for row in rows)
+
+
+def test_snapshot_accounting_batches_queries_per_table(writer, monkeypatch):
+    _, database = writer
+    monkeypatch.setenv("AUDIT_STORAGE_MODE", "compact")
+    monkeypatch.setenv("AUDIT_SNAPSHOT_EVERY", "2")
+    database.history = [{"registro_id": 2, "accion": "UPDATE", "es_snapshot": False}]
+    database.current_rows["ejemplar"] = [{"id": record_id, "sale_price": 5} for record_id in range(1, 10)]
+
+    for record_id in range(1, 10):
+        audit_service.log_change(
+            "ejemplar", record_id, "UPDATE", user_id=2,
+            old_values={"sale_price": 4}, new_values={"sale_price": 5},
+        )
+    audit_service.log_change(
+        "usuarios", 2, "UPDATE", user_id=2, old_values={"evento": None}, new_values={"evento": "LOGIN"},
+    )
+    audit_service.flush_pending()
+
+    rows = database.insert_calls[0]
+    assert database.history_queries == 1
+    assert database.row_queries == [("ejemplar", [2])]
+    assert [row["registro_id"] for row in rows if row["es_snapshot"]] == [2]
+    # El login no entra al conteo y guarda su payload tal cual
+    assert rows[-1]["campos_nuevos"] == {"evento": "LOGIN"}
+
+
+def test_snapshot_count_comes_from_log_and_partial_payloads_fetch_the_full_row(writer, monkeypatch):
+    _, database = writer
+    monkeypatch.setenv("AUDIT_STORAGE_MODE", "compact")
+    monkeypatch.setenv("AUDIT_SNAPSHOT_EVERY", "3")
+    # Dos UPDATE previos sin snapshot en el log (p. ej. escritos por otro worker)
+    database.history = [{"registro_id": 4, "accion": "UPDATE", "es_snapshot": False}] * 2
+    database.current_rows["sectores"] = [{"id": 4, "name": "Norte", "qr_code": "SEC-NORTE"}]
+
+    audit_service.log_change(
+        "sectores", 4, "UPDATE", user_id=2,
+        old_values={"especie_ids": [1]},
+        new_values={"especie_ids": [1, 2]},
+    )
+    audit_service.flush_pending()
+
+    row = database.insert_calls[0][0]
+    assert row["es_snapshot"] is True
+    assert row["campos_nuevos"] == {"id": 4, "name": "Norte", "qr_code": "SEC-NORTE"}
+    assert row["cambios_detectados"] == {"especie_ids": {"anterior": [1], "nuevo": [1, 2]}}
+
+
+class VersionQuery:
+    def __init__(self, events):
+        self.events = events
+        self.is_snapshot = False
+
+    def select(self, *_args, **_kwargs):
+        return self
+
+    def eq(self, *_args):
+        return self
+
+    def lte(self, *_args):
+        return self
+
+    def or_(self, condition):
+        self.is_snapshot = "DELETE" in condition
+        return self
+
+    def order(self, *_args, **_kwargs):
+        return self
+
+    def limit(self, *_args):
+        return self
+
+    def range(self, *_args):
+        return self
+
+    def execute(self):
+        if self.is_snapshot:
+            return SimpleNamespace(data=self.events[:1])
+        return SimpleNamespace(data=self.events[1:])
+
+
+def test_reconstruct_record_replays_diffs_over_latest_snapshot(monkeypatch):
+    events = [
+        {"id": 1, "accion": "CREATE", "created_at": "2026-10-01T10:00:00+00:00",
+         "campos_nuevos": {"id": 9, "sale_price": None, "nursery": "Vivero"}},
+        {"id": 2, "accion": "UPDATE", "campos_nuevos": None,
+         "cambios_detectados": {"sale_price": {"anterior": None, "nuevo": 1500}}},
+        {"id": 3, "accion": "UPDATE", "campos_nuevos": None,
+         "cambios_detectados": {"nursery": {"anterior": "Vivero", "nuevo": "Vivero Sur"}}},
+    ]
+    monkeypatch.setattr(
+        audit_service,
+        "get_service",
+        lambda: SimpleNamespace(table=lambda _name: VersionQuery(events)),
+    )
+
+    version = audit_service.reconstruct_record("ejemplar", 9)
+
+    assert version == {
+        "record": {"id": 9, "sale_price": 1500, "nursery": "Vivero Sur"},
+        "complete": True,
+        "snapshot_id": 1,
+        "applied_updates": 2,
+    }
+
+
+def test_reconstruct_record_merges_partial_update_payloads(monkeypatch):
+    events = [
+        {"id": 1, "accion": "CREATE", "created_at": "2026-10-01T10:00:00+00:00",
+         "campos_nuevos": {"id": 3, "email": "a@b.cl", "activo": True}},
+        {"id": 2, "accion": "UPDATE", "es_snapshot": False,
+         "campos_nuevos": {"evento": "LOGIN"}, "cambios_detectados": None},
+    ]
+    monkeypatch.setattr(
+        audit_service,
+        "get_service",
+        lambda: SimpleNamespace(table=lambda _name: VersionQuery(events)),
+    )
+
+    version = audit_service.reconstruct_record("usuarios", 3)
+
+    assert version["record"] == {"id": 3, "email": "a@b.cl", "activo": True, "evento": "LOGIN"}
+
+
+def test_export_walks_keyset_pages_and_streams_csv_and_ndjson(monkeypatch):
+    pages = {
+        None: {"logs": [{"id": 3, "accion": "UPDATE", "cambios_detectados": {"a": {"anterior": 1, "nuevo": 2}}}],
+               "next_cursor": "c1"},
+        "c1": {"logs": [{"id": 2, "accion": "DELETE"}], "next_cursor": None},
+    }
+    calls = []
+
+    def fake_page(**kwargs):
+        calls.append((kwargs["cursor"], kwargs["count_mode"]))
+        return pages[kwargs["cursor"]]
+
+    monkeypatch.setattr(audit_service, "get_audit_page", fake_page)
+
+    ndjson = "".join(audit_service.iter_audit_export("ndjson", page_size=1))
+    csv_text = "".join(audit_service.iter_audit_export("csv", page_size=1))
+
+    assert calls[:2] == [(None, "none"), ("c1", "none")]
+    assert [line for line in ndjson.splitlines()] == [
+        '{"id": 3, "accion": "UPDATE", "cambios_detectados": {"a": {"anterior": 1, "nuevo": 2}}}',
+        '{"id": 2, "accion": "DELETE"}',
+    ]
+    lines = csv_text.splitlines()
+    assert lines[0].startswith("id,created_at,tabla_afectada")
+    assert lines[1].startswith('3,,,,UPDATE') and '"{""a"": {""anterior"": 1, ""nuevo"": 2}}"' in lines[1]
+    assert lines[2].startswith("2,,,,DELETE")
+
+
+def test_export_ends_with_error_marker_when_a_page_fails(monkeypatch):
+    def fake_page(**kwargs):
+        if kwargs["cursor"]:
+            raise RuntimeError("statement timeout")
+        return {"logs": [{"id": 3, "accion": "UPDATE"}], "next_cursor": "c1"}
+
+    monkeypatch.setattr(audit_service, "get_audit_page", fake_page)
+
+    ndjson = "".join(audit_service.iter_audit_export("ndjson")).splitlines()
+    csv_lines = "".join(audit_service.iter_audit_export("csv")).splitlines()
+
+    assert ndjson[0] == '{"id": 3, "accion": "UPDATE"}'
+    assert json.loads(ndjson[-1]) == {"error": "Export incompleto: falló la lectura del historial", "rows_exported": 1}
+    assert csv_lines[1].startswith("3,,,,UPDATE")
+    assert csv_lines[-1].startswith("# ERROR: export incompleto tras 1 filas")
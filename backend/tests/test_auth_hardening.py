@@ -114,3 +114,15 @@ def test_logout_clears_cookies_even_when_revocation_fails(monkeypatch):
     cookies = response.headers.getlist("set-cookie")
     assert len(cookies) == 2
     assert all("Max-Age=0" in cookie for cookie in cookies)
+
+
+def test_audit_user_id_uses_internal_id_resolved_at_auth():
+    from app.api import routes_transactions
+
+    user = {"id": "6c1d9268-41b9-4f41-84f1-86d0d86e9f95", "email": "qa@example.com", "internal_id": 42}
+    request = SimpleNamespace(client=None, headers={})
+
+    assert auth_middleware.get_audit_user_id(user) == 42
+    assert routes_transactions._request_context(request, user)["user_id"] == 42
+    assert auth_middleware.get_audit_user_id({"id": "dev-user-123"}) == "dev-user-123"
+    assert auth_middleware.get_audit_user_id(None) is None
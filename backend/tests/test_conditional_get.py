@@ -0,0 +1,62 @@
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app.middleware.conditional_get import CacheRule, ConditionalGetMiddleware
+
+
+def make_client():
+    app = FastAPI()
+    state = {"name": "Echinopsis"}
+
+    @app.get("/species/public")
+    def list_species():
+        return [state]
+
+    @app.get("/species/public/missing")
+    def missing():
+        return JSONResponse(status_code=404, content={"detail": "no"})
+
+    @app.get("/species/staff")
+    def list_staff():
+        return [state]
+
+    @app.get("/home-content/public")
+    def home():
+        return JSONResponse(content={}, headers={"ETag": '"strong"'})
+
+    app.add_middleware(ConditionalGetMiddleware, rules=[
+        CacheRule("/species/public", "public, max-age=60"),
+        CacheRule("/home-content/public", "public, max-age=60"),
+    ])
+    return TestClient(app), state
+
+
+def test_public_get_gets_weak_etag_and_304_on_match():
+    client, state = make_client()
+
+    first = client.get("/species/public")
+    etag = first.headers["etag"]
+    second = client.get("/species/public", headers={"If-None-Match": etag})
+
+    assert first.status_code == 200
+    assert etag.startswith('W/"')
+    assert first.headers["cache-control"] == "public, max-age=60"
+    assert second.status_code == 304
+    assert second.content == b""
+    assert "content-length" not in second.headers or second.headers["content-length"] == "0"
+
+    state["name"] = "Copiapoa"
+    changed = client.get("/species/public", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_errors_staff_routes_and_existing_etags_pass_through():
+    client, _ = make_client()
+
+    assert "etag" not in client.get("/species/public/missing").headers
+    assert "etag" not in client.get("/species/staff").headers
+    home = client.get("/home-content/public")
+    assert home.headers["etag"] == '"strong"'
+    assert "cache-control" not in home.headers
@@ -47,3 +47,44 @@ def test_nursery_and_invoice_filters_use_postgrest_safe_wildcards(monkeypatch):
         ("nursery", "*Vivero QA*"),
         ("invoice_number", "*FAC-100*"),
     ]
+
+
+class FakeRelationQuery:
+    def __init__(self, database):
+        self.database = database
+        self.payload = None
+
+    def select(self, *_args):
+        return self
+
+    def eq(self, *_args):
+        return self
+
+    def limit(self, *_args):
+        return self
+
+    def insert(self, payload):
+        self.payload = payload
+        return self
+
+    def execute(self):
+        if self.payload is not None:
+            self.database.relations.append(self.payload)
+            return SimpleNamespace(data=[self.payload])
+        return SimpleNamespace(data=list(self.database.relations))
+
+
+def test_new_sector_species_relation_invalidates_public_cache(monkeypatch):
+    from app.services import public_cache
+
+    database = SimpleNamespace(relations=[])
+    database.table = lambda _name: FakeRelationQuery(database)
+    monkeypatch.setattr(ejemplar_service, "get_public", lambda: database)
+    invalidations = []
+    monkeypatch.setattr(public_cache, "invalidate", lambda: invalidations.append(True))
+
+    ejemplar_service._ensure_sector_species_relation(4, 9)
+    ejemplar_service._ensure_sector_species_relation(4, 9)  # ya existe
+
+    assert database.relations == [{"sector_id": 4, "especie_id": 9}]
+    assert invalidations == [True]
@@ -0,0 +1,222 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import home_content_service
+
+
+@pytest.fixture(autouse=True)
+def reset_public_cache():
+    home_content_service.invalidate_public_cache()
+    yield
+    home_content_service.invalidate_public_cache()
+
+
+class FakeHomeQuery:
+    def __init__(self, database):
+        self.database = database
+
+    def select(self, *_args, **_kwargs):
+        return self
+
+    def eq(self, *_args):
+        return self
+
+    def order(self, *_args, **_kwargs):
+        return self
+
+    def limit(self, *_args):
+        return self
+
+    def execute(self):
+        self.database.reads += 1
+        return SimpleNamespace(data=[self.database.row])
+
+
+class FakeHomeSupabase:
+    def __init__(self, row):
+        self.row = row
+        self.reads = 0
+
+    def table(self, table_name):
+        assert table_name == "home_content"
+        return FakeHomeQuery(self)
+
+
+HOME_ROW = {
+    "welcome_text_es": "Hola",
+    "welcome_text_en": "Hello",
+    "sections_es": '[{"title": "Uno"}]',
+    "sections_en": None,
+    "sections": [{"title": "One"}],
+    "carousel_images": [{"url": "https://cdn/a.jpg", "alt_es": "Cactus", "alt_en": "Cactus EN"}],
+}
+
+
+def test_public_payloads_are_built_once_for_both_languages(monkeypatch):
+    fake = FakeHomeSupabase(HOME_ROW)
+    monkeypatch.setattr(home_content_service, "get_public_clean", lambda: fake)
+
+    es, es_etag = home_content_service.get_public_cached("es")
+    en, en_etag = home_content_service.get_public_cached("en")
+    again, again_etag = home_content_service.get_public_cached("es")
+
+    assert fake.reads == 1
+    assert es["welcome_text"] == "Hola"
+    assert es["sections"] == [{"title": "Uno"}]
+    assert es["carousel_images"][0]["url"] == "https://cdn/a.jpg"
+    assert es["carousel_images"][0]["alt"] == "Cactus"
+    assert en["welcome_text"] == "Hello"
+    assert en["sections"] == [{"title": "One"}]
+    assert en["carousel_images"][0]["alt"] == "Cactus EN"
+    assert again is es and again_etag == es_etag
+    assert es_etag != en_etag
+    assert not es_etag.startswith("W/")
+
+
+def test_public_carousel_images_include_srcset(monkeypatch):
+    row = {
+        **HOME_ROW,
+        "carousel_images": [{
+            "url": "https://cdn/original/home/carousel/x.jpg",
+            "variants": {"w=400": "w=400/home/carousel/x.jpg", "w=800": "w=800/home/carousel/x.jpg"},
+            "width": 2048,
+            "height": 1024,
+        }],
+    }
+    fake = FakeHomeSupabase(row)
+    monkeypatch.setattr(home_content_service, "get_public_clean", lambda: fake)
+    monkeypatch.setattr(
+        home_content_service.photos_service.storage_router,
+        "get_public_url",
+        lambda key: f"https://cdn/{key}",
+    )
+
+    payload, _ = home_content_service.get_public_cached("es")
+    image = payload["carousel_images"][0]
+
+    assert image["variant_urls"]["w=400"] == "https://cdn/w=400/home/carousel/x.jpg"
+    assert image["srcset"] == (
+        "https://cdn/w=400/home/carousel/x.jpg 400w, "
+        "https://cdn/w=800/home/carousel/x.jpg 800w, "
+        "https://cdn/original/home/carousel/x.jpg 2048w"
+    )
+    assert (image["width"], image["height"]) == (2048, 1024)
+
+
+def test_invalidate_public_cache_forces_reload(monkeypatch):
+    fake = FakeHomeSupabase(HOME_ROW)
+    monkeypatch.setattr(home_content_service, "get_public_clean", lambda: fake)
+
+    _, first_etag = home_content_service.get_public_cached("es")
+    fake.row = {**HOME_ROW, "welcome_text_es": "Bienvenidos"}
+    home_content_service.invalidate_public_cache()
+    payload, second_etag = home_content_service.get_public_cached("es")
+
+    assert fake.reads == 2
+    assert payload["welcome_text"] == "Bienvenidos"
+    assert first_etag != second_etag
+
+
+def test_load_racing_an_invalidation_is_not_cached(monkeypatch):
+    fake = FakeHomeSupabase(HOME_ROW)
+    monkeypatch.setattr(home_content_service, "get_public_clean", lambda: fake)
+    original_fetch = home_content_service._fetch_active_content
+
+    def fetch_then_staff_write():
+        content = original_fetch()  # lee el contenido previo
+        fake.row = {**HOME_ROW, "welcome_text_es": "Bienvenidos"}
+        home_content_service.invalidate_public_cache()
+        return content
+
+    monkeypatch.setattr(home_content_service, "_fetch_active_content", fetch_then_staff_write)
+    stale, _ = home_content_service.get_public_cached("es")
+    monkeypatch.setattr(home_content_service, "_fetch_active_content", original_fetch)
+    fresh, _ = home_content_service.get_public_cached("es")
+
+    assert stale["welcome_text"] == "Hola"
+    assert fresh["welcome_text"] == "Bienvenidos"
+
+
+def test_public_route_sends_cache_headers_and_304(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api import routes_home_content
+
+    fake = FakeHomeSupabase(HOME_ROW)
+    monkeypatch.setattr(home_content_service, "get_public_clean", lambda: fake)
+    app = FastAPI()
+    app.include_router(routes_home_content.router, prefix="/home-content")
+    client = TestClient(app)
+
+    first = client.get("/home-content/public?lang=en")
+    second = client.get("/home-content/public?lang=en", headers={"If-None-Match": first.headers["etag"]})
+
+    assert first.status_code == 200
+    assert first.json()["welcome_text"] == "Hello"
+    assert "stale-while-revalidate" in first.headers["cache-control"]
+    assert second.status_code == 304
+    assert second.content == b""
+    assert fake.reads == 1
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+        self.text = str(payload)
+
+    def json(self):
+        return self._payload
+
+
+class FakeRestSession:
+    def __init__(self, existing):
+        self.existing = existing
+        self.calls = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls.append(("GET", url, timeout))
+        return FakeResponse(200, [self.existing] if self.existing else [])
+
+    def patch(self, url, json=None, headers=None, timeout=None):
+        self.calls.append(("PATCH", url, timeout))
+        assert headers["Prefer"] == "return=representation"
+        return FakeResponse(200, [{**self.existing, **json}])
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        self.calls.append(("POST", url, timeout))
+        return FakeResponse(201, [{"id": 1, **json}])
+
+
+def test_update_uses_patch_representation_without_reread(monkeypatch):
+    existing = {"id": 5, "welcome_text_es": "Antes", "is_active": True}
+    session = FakeRestSession(existing)
+    logged = []
+    monkeypatch.setattr(home_content_service, "get_rest_session", lambda: session)
+    monkeypatch.setattr("app.services.audit_service.log_change", lambda **kwargs: logged.append(kwargs))
+    home_content_service._public_cache.set("es", ({"welcome_text": "Antes"}, '"old"'))
+
+    updated = home_content_service.create_or_update_staff(
+        {"welcome_text_es": "Después"}, user_id=1, access_token="token"
+    )
+
+    assert [call[0] for call in session.calls] == ["GET", "PATCH"]
+    assert all(call[2] == home_content_service.REST_TIMEOUT for call in session.calls)
+    assert updated["id"] == 5
+    assert updated["welcome_text_es"] == "Después"
+    assert logged[0]["action"] == "UPDATE"
+    assert logged[0]["old_values"] == existing
+    assert home_content_service._public_cache.get("es") is None
+
+
+def test_create_posts_when_no_active_row(monkeypatch):
+    session = FakeRestSession(None)
+    monkeypatch.setattr(home_content_service, "get_rest_session", lambda: session)
+    monkeypatch.setattr("app.services.audit_service.log_change", lambda **kwargs: None)
+
+    created = home_content_service.create_or_update_staff({}, access_token="token")
+
+    assert [call[0] for call in session.calls] == ["GET", "POST"]
+    assert created["id"] == 1
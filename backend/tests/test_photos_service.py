@@ -73,3 +73,111 @@ def test_delete_photo_removes_derived_variants_when_metadata_is_missing(monkeypa
         "w=400/ejemplares/88/photo-id.jpg",
         "w=800/ejemplares/88/photo-id.jpg",
     ]
+
+
+def test_store_image_variants_uploads_immutable_variants(monkeypatch):
+    import asyncio
+    from io import BytesIO
+
+    from fastapi import UploadFile
+    from PIL import Image
+    from starlette.datastructures import Headers
+
+    buffer = BytesIO()
+    Image.new("RGB", (1200, 600), (200, 50, 50)).save(buffer, format="PNG")
+    buffer.seek(0)
+    upload = UploadFile(file=buffer, filename="portada.png", headers=Headers({"content-type": "image/png"}))
+    uploaded = {}
+    monkeypatch.setattr(
+        photos_service.storage_router,
+        "upload_fileobj",
+        lambda key, fileobj, content_type, cache_control: uploaded.setdefault(key, cache_control),
+    )
+    monkeypatch.setattr(
+        photos_service.storage_router,
+        "upload_object",
+        lambda key, data, content_type, cache_control: uploaded.setdefault(key, cache_control),
+    )
+
+    stored = asyncio.run(photos_service.store_image_variants(upload, "home/carousel"))
+
+    assert stored["storage_path"].startswith("original/home/carousel/")
+    assert stored["storage_path"].endswith(".png")
+    assert (stored["width"], stored["height"]) == (1200, 600)
+    assert set(stored["variants"]) == {"w=400", "w=800"}
+    assert set(uploaded) == {stored["storage_path"], *stored["variants"].values()}
+    assert set(uploaded.values()) == {photos_service.CACHE_CONTROL_IMMUTABLE}
+
+
+def test_build_srcset_skips_variants_wider_than_original():
+    variant_urls = {"w=800": "https://cdn/w800.jpg", "w=400": "https://cdn/w400.jpg"}
+
+    assert photos_service.build_srcset("https://cdn/o.jpg", variant_urls, 600) == (
+        "https://cdn/w400.jpg 400w, https://cdn/o.jpg 600w"
+    )
+    assert photos_service.build_srcset("https://cdn/o.jpg", variant_urls) == (
+        "https://cdn/w400.jpg 400w, https://cdn/w800.jpg 800w"
+    )
+
+
+class FakeCoverQuery:
+    def __init__(self, photos, queries):
+        self.photos = photos
+        self.queries = queries
+        self.filters = {}
+
+    def select(self, fields):
+        self.filters["select"] = fields
+        return self
+
+    def in_(self, column, values):
+        self.filters["in"] = (column, list(values))
+        return self
+
+    def eq(self, column, value):
+        self.filters["eq"] = (column, value)
+        return self
+
+    def order(self, *_args, **_kwargs):
+        return self
+
+    def range(self, start, _end):
+        self.start = start
+        return self
+
+    def execute(self):
+        self.queries.append(self.filters)
+        column, ids = self.filters["in"]
+        rows = [photo for photo in self.photos if photo[column] in ids]
+        if "eq" in self.filters:
+            rows = [photo for photo in rows if photo.get("is_cover")]
+        rows.sort(key=lambda photo: photo["id"])
+        return SimpleNamespace(data=rows if self.start == 0 else [])
+
+
+def test_cover_variants_query_fallback_only_for_entities_without_cover(monkeypatch):
+    photos = [
+        {"id": 5, "especie_id": 1, "storage_path": "original/especies/1/b.png", "is_cover": True, "order_index": 0},
+        {"id": 3, "especie_id": 1, "storage_path": "original/especies/1/a.png", "is_cover": True, "order_index": 2},
+        {"id": 8, "especie_id": 2, "storage_path": "original/especies/2/b.png", "is_cover": False, "order_index": 1},
+        {"id": 6, "especie_id": 2, "storage_path": "original/especies/2/a.png", "is_cover": False, "order_index": 4},
+    ]
+    queries = []
+    database = SimpleNamespace(table=lambda _name: FakeCoverQuery(photos, queries))
+    monkeypatch.setattr(photos_service, "get_public", lambda: database)
+    monkeypatch.setattr(photos_service.storage_router, "get_public_url", lambda path: f"https://cdn/{path}")
+
+    covers = photos_service.get_cover_photos_with_variants("especie", [1, 2, 1])
+
+    # Igual que /species: entre varias is_cover gana la de menor id
+    assert covers[1]["public_url"] == "https://cdn/original/especies/1/a.png"
+    assert covers[2]["public_url"] == "https://cdn/original/especies/2/b.png"
+    assert covers[2]["variant_urls"]["w=400"] == "https://cdn/w=400/especies/2/b.jpg"
+    assert [query["in"] for query in queries] == [("especie_id", [1, 2]), ("especie_id", [2])]
+    assert queries[0]["eq"] == ("is_cover", True)
+    assert "eq" not in queries[1]
+
+    # get_cover_photos_map sale de la misma implementación
+    assert photos_service.get_cover_photos_map("especie", [1, 2]) == {
+        eid: cover["public_url"] for eid, cover in covers.items()
+    }
@@ -0,0 +1,63 @@
+import pytest
+
+from app.services import public_cache, species_service
+
+
+@pytest.fixture(autouse=True)
+def reset_public_cache():
+    public_cache.invalidate()
+    yield
+    public_cache.invalidate()
+
+
+def test_get_or_load_serves_repeated_keys_from_memory():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return [{"id": 1}]
+
+    first = public_cache.get_or_load(("k", 1), loader)
+    second = public_cache.get_or_load(("k", 1), loader)
+
+    assert first is second
+    assert len(calls) == 1
+
+
+def test_invalidate_during_load_does_not_store_stale_value():
+    def loader():
+        public_cache.invalidate()  # una escritura de staff termina mientras se carga
+        return ["antes"]
+
+    assert public_cache.get_or_load("k", loader) == ["antes"]
+    assert public_cache.get_or_load("k", lambda: ["después"]) == ["después"]
+
+
+def test_empty_results_use_short_ttl(monkeypatch):
+    stored = []
+    monkeypatch.setattr(
+        public_cache._responses,
+        "set",
+        lambda key, value, ttl_seconds=None: stored.append((key, ttl_seconds)),
+    )
+
+    public_cache.get_or_load("vacío", lambda: [])
+    public_cache.get_or_load("lleno", lambda: [1])
+
+    assert stored == [("vacío", public_cache._EMPTY_TTL_SECONDS), ("lleno", None)]
+
+
+def test_species_list_public_normalizes_query_and_is_invalidated(monkeypatch):
+    loads = []
+    monkeypatch.setattr(
+        species_service,
+        "_list_public",
+        lambda q, limit, offset: loads.append((q, limit, offset)) or [{"id": len(loads)}],
+    )
+
+    species_service.list_public("  Cactus ", 50, 0)
+    species_service.list_public("cactus", 50, 0)
+    assert loads == [("Cactus", 50, 0)]
+
+    public_cache.invalidate()
+    assert species_service.list_public("cactus", 50, 0) == [{"id": 2}]
@@ -0,0 +1,117 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.middleware import rate_limiter
+from app.middleware.public_traffic import PublicRouteLimit, PublicTrafficMiddleware, parse_public_limits
+
+
+def make_app(**middleware_kwargs):
+    app = FastAPI()
+
+    @app.get("/species/public")
+    def list_species():
+        return []
+
+    @app.get("/species/staff")
+    def list_staff():
+        return []
+
+    app.add_middleware(PublicTrafficMiddleware, **middleware_kwargs)
+    return app
+
+
+def test_public_route_limit_returns_429_with_retry_after():
+    client = TestClient(make_app(rules=[PublicRouteLimit("/species/public", 2, 60)], max_in_flight=10))
+
+    assert client.get("/species/public").status_code == 200
+    assert client.get("/species/public").status_code == 200
+    blocked = client.get("/species/public")
+
+    assert blocked.status_code == 429
+    assert blocked.headers["retry-after"] == "30"
+    assert client.get("/species/staff").status_code == 200
+
+
+class RecordingBackend:
+    def __init__(self):
+        self.keys = []
+
+    def hit(self, key, limit, window_seconds):
+        self.keys.append(key)
+        return False, 9
+
+
+def test_public_limits_stay_in_process_with_a_remote_backend():
+    backend = RecordingBackend()
+    rate_limiter.set_rate_limit_backend(backend)
+    try:
+        client = TestClient(make_app(rules=[PublicRouteLimit("/species/public", 2, 60)]))
+        response = client.get("/species/public")
+    finally:
+        rate_limiter.set_rate_limit_backend(None)
+
+    assert response.status_code == 200
+    assert backend.keys == []
+
+
+class RecordingLimiter(rate_limiter.GCRALimiter):
+    def __init__(self):
+        super().__init__()
+        self.hits = 0
+
+    def hit(self, key, limit, window_seconds):
+        self.hits += 1
+        return super().hit(key, limit, window_seconds)
+
+
+def test_public_requests_are_shed_above_in_flight_threshold():
+    started = asyncio.Event()
+    release = asyncio.Event()
+    sent = []
+
+    async def slow_app(scope, receive, send):
+        started.set()
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    limiter = RecordingLimiter()
+    middleware = PublicTrafficMiddleware(
+        slow_app, rules=[PublicRouteLimit("/species/public", 100, 60)], max_in_flight=1, shed_retry_after=3,
+        limiter=limiter,
+    )
+
+    def scope(path):
+        return {"type": "http", "method": "GET", "path": path, "client": ("1.2.3.4", 1000), "headers": []}
+
+    async def collect(message):
+        sent.append(message)
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def scenario():
+        first = asyncio.create_task(middleware(scope("/species/public"), receive, collect))
+        await started.wait()
+        await middleware(scope("/species/public"), receive, collect)
+        shed = sent[0]
+        release.set()
+        await first
+        return shed
+
+    shed = asyncio.run(scenario())
+
+    assert shed["status"] == 503
+    assert (b"retry-after", b"3") in shed["headers"]
+    assert middleware.in_flight == 0
+    assert limiter.hits == 1  # la petición descartada no llega al limitador
+
+
+def test_parse_public_limits_overrides_and_disables_defaults():
+    rules = {rule.prefix: rule for rule in parse_public_limits("/photos=0/60, /species/public=10/30, basura")}
+
+    assert "/photos" not in rules
+    assert (rules["/species/public"].limit, rules["/species/public"].window_seconds) == (10, 30)
+    assert "/sectors/public" in rules
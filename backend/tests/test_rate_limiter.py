@@ -0,0 +1,117 @@
+from types import SimpleNamespace
+
+from app.middleware import rate_limiter
+from app.middleware.rate_limiter import GCRALimiter, SupabaseRateLimitBackend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_gcra_allows_burst_then_refills_one_slot_per_interval():
+    clock = FakeClock()
+    limiter = GCRALimiter(clock=clock)
+
+    assert [limiter.hit("ip", 3, 60)[0] for _ in range(3)] == [True, True, True]
+    allowed, retry_after = limiter.hit("ip", 3, 60)
+    assert allowed is False
+    assert retry_after == 20
+
+    clock.now += 20
+    assert limiter.hit("ip", 3, 60)[0] is True
+    assert limiter.hit("ip", 3, 60)[0] is False
+
+    clock.now += 60
+    assert [limiter.hit("ip", 3, 60)[0] for _ in range(3)] == [True, True, True]
+
+
+def test_gcra_rejections_do_not_consume_capacity():
+    clock = FakeClock()
+    limiter = GCRALimiter(clock=clock)
+
+    limiter.hit("ip", 1, 10)
+    for _ in range(50):
+        assert limiter.hit("ip", 1, 10)[0] is False
+
+    clock.now += 10
+    assert limiter.hit("ip", 1, 10)[0] is True
+
+
+def test_gcra_first_hit_is_allowed_regardless_of_float_rounding():
+    clock = FakeClock()
+    clock.now = 8161.962517661547  # now + 60 - 60 > now en punto flotante
+    limiter = GCRALimiter(clock=clock)
+
+    assert limiter.hit("ip", 1, 60)[0] is True
+    assert limiter.hit("ip", 1, 60)[0] is False
+
+
+def test_gcra_evicts_least_recently_used_keys():
+    clock = FakeClock()
+    limiter = GCRALimiter(max_keys=2, stripes=1, clock=clock)
+
+    limiter.hit("a", 1, 60)
+    limiter.hit("b", 1, 60)
+    assert limiter.hit("a", 1, 60)[0] is False  # "a" pasa a ser la más reciente
+    limiter.hit("c", 1, 60)
+
+    assert len(limiter) == 2
+    assert limiter.hit("b", 1, 60)[0] is True  # "b" fue descartada por LRU
+    assert limiter.hit("a", 1, 60)[0] is True  # ...y luego "a" al entrar "b"
+
+
+class FakeRpc:
+    def __init__(self, database, params):
+        self.database = database
+        self.params = params
+
+    def execute(self):
+        self.database.calls.append(self.params)
+        if self.database.error:
+            raise RuntimeError(self.database.error)
+        return SimpleNamespace(data=[{"allowed": False, "retry_after": 7}])
+
+
+class FakeRpcSupabase:
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+
+    def rpc(self, name, params):
+        assert name == "rate_limit_hit"
+        return FakeRpc(self, params)
+
+
+def test_supabase_backend_uses_shared_rpc():
+    database = FakeRpcSupabase()
+    backend = SupabaseRateLimitBackend(client_factory=lambda: database)
+
+    assert backend.hit(("request-otp", "1.2.3.4"), 5, 60) == (False, 7)
+    assert database.calls == [{"p_key": "request-otp:1.2.3.4", "p_limit": 5, "p_window_seconds": 60}]
+
+
+def test_supabase_backend_falls_back_to_memory_when_rpc_fails():
+    clock = FakeClock()
+    backend = SupabaseRateLimitBackend(
+        client_factory=lambda: FakeRpcSupabase(error="connection refused"),
+        fallback=GCRALimiter(clock=clock),
+    )
+
+    assert backend.hit(("verify-otp", "ip"), 1, 60)[0] is True
+    assert backend.hit(("verify-otp", "ip"), 1, 60)[0] is False
+
+
+def test_backend_is_selected_from_env(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_BACKEND", "supabase")
+    rate_limiter.set_rate_limit_backend(None)
+    try:
+        assert isinstance(rate_limiter.get_rate_limit_backend(), SupabaseRateLimitBackend)
+        monkeypatch.setenv("RATE_LIMIT_BACKEND", "memory")
+        rate_limiter.set_rate_limit_backend(None)
+        assert rate_limiter.get_rate_limit_backend() is rate_limiter._rate_limit_store
+    finally:
+        rate_limiter.set_rate_limit_backend(None)
@@ -0,0 +1,124 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import public_cache, sectors_service
+
+
+class FakeSectorsQuery:
+    def __init__(self, database):
+        self.database = database
+
+    def select(self, *_args, **_kwargs):
+        return self
+
+    def order(self, *_args, **_kwargs):
+        return self
+
+    def range(self, start, end):
+        self.start = start
+        return self
+
+    def execute(self):
+        self.database.loads += 1
+        return SimpleNamespace(data=list(self.database.sectors) if self.start == 0 else [])
+
+
+class FakeSectorsSupabase:
+    def __init__(self, sectors):
+        self.sectors = sectors
+        self.loads = 0
+
+    def table(self, table_name):
+        assert table_name == "sectores"
+        return FakeSectorsQuery(self)
+
+
+@pytest.fixture
+def fake_sectors(monkeypatch):
+    database = FakeSectorsSupabase([
+        {"id": 1, "name": "Norte", "description": None, "qr_code": "SEC-NORTE"},
+        {"id": 7, "name": "Sur", "description": None, "qr_code": "sec-sur"},
+    ])
+    monkeypatch.setattr(sectors_service, "get_public_clean", lambda: database)
+    monkeypatch.setattr(sectors_service, "_qr_index_loaded_at", None)
+    public_cache.invalidate()
+    yield database
+    public_cache.invalidate()
+
+
+def test_qr_lookup_is_case_insensitive_and_supports_sector_id(fake_sectors):
+    assert sectors_service.load_qr_index() == 2
+
+    assert sectors_service._resolve_sector("  sec-norte ")["id"] == 1
+    assert sectors_service._resolve_sector("SEC-SUR")["id"] == 7
+    assert sectors_service._get_sector_id_by_qr("sector7") == 7
+    assert fake_sectors.loads == 1
+
+
+def test_unknown_qr_reloads_at_most_once_per_interval(fake_sectors, monkeypatch):
+    sectors_service.load_qr_index()
+    fake_sectors.sectors.append({"id": 9, "name": "Nuevo", "description": None, "qr_code": "NUEVO"})
+
+    assert sectors_service._resolve_sector("nuevo") is None  # índice recién cargado
+    monkeypatch.setattr(sectors_service, "_QR_INDEX_MISS_RELOAD_SECONDS", 0.0)
+    assert sectors_service._resolve_sector("nuevo")["id"] == 9
+
+
+def test_concurrent_misses_reload_the_index_once(fake_sectors, monkeypatch):
+    sectors_service.load_qr_index()
+    fake_sectors.sectors.append({"id": 9, "name": "Nuevo", "description": None, "qr_code": "NUEVO"})
+    monkeypatch.setattr(sectors_service, "_qr_index_loaded_at", time.monotonic() - 60)
+    original_execute = FakeSectorsQuery.execute
+
+    def slow_execute(self):
+        time.sleep(0.05)
+        return original_execute(self)
+
+    monkeypatch.setattr(FakeSectorsQuery, "execute", slow_execute)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(sectors_service._resolve_sector("nuevo")))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [sector["id"] for sector in results] == [9] * 8
+    assert fake_sectors.loads == 2  # precarga + una sola recarga
+
+
+def test_index_is_loaded_lazily_when_startup_preload_failed(fake_sectors):
+    assert sectors_service.get_public_by_qr("SEC-NORTE")["name"] == "Norte"
+    assert sectors_service.get_public_by_qr("sec-norte")["name"] == "Norte"
+    assert fake_sectors.loads == 1
+
+
+def test_public_bundle_joins_species_with_cover_variants(fake_sectors, monkeypatch):
+    sectors_service.load_qr_index()
+    monkeypatch.setattr(sectors_service, "fetch_all_pages", lambda _query: [{"id": 1, "especie_id": 3}, {"id": 2, "especie_id": 4}])
+    monkeypatch.setattr(sectors_service, "fetch_all_by_ids", lambda *_args, **_kwargs: [
+        {"id": 3, "slug": "quillay", "scientific_name": "Quillaja saponaria", "nombre_común": "Quillay"},
+        {"id": 4, "slug": "boldo", "scientific_name": "Peumus boldus", "nombre_común": "Boldo"},
+    ])
+    cover_calls = []
+
+    def fake_covers(entity_type, ids):
+        cover_calls.append((entity_type, ids))
+        return {3: {"public_url": "https://cdn/q.webp", "variant_urls": {"w=400": "https://cdn/q_w400.webp"}}}
+
+    monkeypatch.setattr(sectors_service.photos_service, "get_cover_photos_with_variants", fake_covers)
+
+    bundle = sectors_service.get_public_bundle("sec-norte")
+    assert sectors_service.get_public_bundle("SEC-NORTE") is bundle
+
+    assert bundle["sector"]["id"] == 1
+    assert [s["slug"] for s in bundle["species"]] == ["boldo", "quillay"]
+    assert bundle["species"][0]["cover_photo"] is None
+    assert bundle["species"][1]["cover_variant_urls"] == {"w=400": "https://cdn/q_w400.webp"}
+    assert cover_calls == [("especie", [3, 4])]
+    assert sectors_service.get_public_bundle("no-existe") is None
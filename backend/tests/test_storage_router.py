@@ -0,0 +1,222 @@
+from io import BytesIO
+
+import pytest
+
+from app.core import storage_router
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeBackend:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.uploads = []
+        self.deletes = []
+
+    def upload_object(self, key, data, content_type=None, cache_control=None):
+        if self.fail:
+            raise RuntimeError("backend caído")
+        self.uploads.append(key)
+
+    def upload_fileobj(self, key, fileobj, content_type=None, cache_control=None):
+        chunk = fileobj.read(2)
+        if self.fail:
+            raise RuntimeError("backend caído")
+        self.uploads.append((key, chunk + fileobj.read()))
+
+    def delete_object(self, key):
+        if self.fail:
+            raise RuntimeError("backend caído")
+        self.deletes.append(key)
+
+
+@pytest.fixture
+def backends(monkeypatch, tmp_path):
+    storage_router.reset_breakers()
+    monkeypatch.setattr(storage_router, "_pending_deletes_path", tmp_path / "r2_pending_deletes.txt")
+    monkeypatch.setenv("STORAGE_R2_WRITE_RETRIES", "1")
+    monkeypatch.setenv("STORAGE_FALLBACK_SUPABASE", "true")
+    monkeypatch.setenv("STORAGE_BREAKER_MIN_CALLS", "2")
+    r2 = FakeBackend(fail=True)
+    supabase = FakeBackend()
+    monkeypatch.setattr(storage_router.r2_storage, "upload_object", r2.upload_object)
+    monkeypatch.setattr(storage_router.r2_storage, "delete_object", r2.delete_object)
+    monkeypatch.setattr(storage_router.r2_storage, "upload_fileobj", r2.upload_fileobj)
+    monkeypatch.setattr(storage_router.supabase_storage, "upload_object", supabase.upload_object)
+    monkeypatch.setattr(storage_router.supabase_storage, "upload_fileobj", supabase.upload_fileobj)
+    monkeypatch.setattr(storage_router.supabase_storage, "delete_object", supabase.delete_object)
+    yield r2, supabase
+    storage_router.reset_breakers()
+
+
+def make_breaker(clock, **overrides):
+    config = {
+        "failure_rate_threshold": 0.5,
+        "min_calls": 2,
+        "window_seconds": 60,
+        "cooldown_seconds": 30,
+        "slow_call_seconds": 5,
+        **overrides,
+    }
+    return storage_router.CircuitBreaker("r2", storage_router.BreakerConfig(**config), clock=clock)
+
+
+def test_breaker_opens_on_errors_and_recovers_through_half_open_probe():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+
+    breaker.record(False, 0.1)
+    breaker.record(False, 0.1)
+    assert breaker.state == "open"
+    assert breaker.allow_request() is False
+
+    clock.now += 31
+    assert breaker.allow_request() is True
+    assert breaker.allow_request() is False
+
+    breaker.record(True, 0.1)
+    assert breaker.state == "closed"
+    assert breaker.snapshot()["trips"] == 1
+
+
+def test_slow_calls_count_as_failures():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+
+    breaker.record(True, 6)
+    breaker.record(True, 7)
+
+    assert breaker.state == "open"
+
+
+def test_slow_streaming_uploads_do_not_open_the_breaker(backends, monkeypatch):
+    r2, supabase = backends
+    r2.fail = False
+    monkeypatch.setenv("STORAGE_BREAKER_SLOW_CALL_SECONDS", "0")
+    storage_router.reset_breakers()
+
+    for index in range(3):
+        storage_router.upload_fileobj(f"facturas/{index}.pdf", BytesIO(b"%PDF-1.7"))
+
+    assert [key for key, _ in r2.uploads] == ["facturas/0.pdf", "facturas/1.pdf", "facturas/2.pdf"]
+    assert supabase.uploads == []
+    assert storage_router.get_metrics()["backends"]["r2"]["state"] == "closed"
+
+
+def test_open_r2_breaker_routes_uploads_straight_to_fallback(backends):
+    r2, supabase = backends
+
+    storage_router.upload_object("a.jpg", b"1")
+    assert storage_router.get_breaker("r2").state == "open"
+
+    storage_router.upload_object("b.jpg", b"2")
+
+    metrics = storage_router.get_metrics()
+    assert supabase.uploads == ["a.jpg", "b.jpg"]
+    assert metrics["counters"]["r2_upload_error"] == 2
+    assert metrics["counters"]["r2_upload_skipped"] == 1
+    assert metrics["backends"]["r2"]["state"] == "open"
+
+
+def test_open_r2_breaker_skips_delete_without_hitting_backend(backends, monkeypatch):
+    storage_router.upload_object("a.jpg", b"1")
+    monkeypatch.setattr(
+        storage_router.r2_storage,
+        "delete_object",
+        lambda key: pytest.fail("R2 no debe recibir llamadas con el breaker abierto"),
+    )
+
+    storage_router.delete_object("a.jpg")
+
+    assert storage_router.get_metrics()["counters"]["r2_delete_skipped"] == 1
+    assert storage_router.get_metrics()["pending_r2_deletes"] == 1
+
+
+def test_deferred_r2_deletes_are_replayed_when_breaker_closes(backends, monkeypatch):
+    r2, _ = backends
+    monkeypatch.setenv("STORAGE_BREAKER_COOLDOWN_SECONDS", "0")
+    storage_router.reset_breakers()
+
+    storage_router.upload_object("a.jpg", b"1")  # abre el breaker de R2
+    storage_router.delete_object("a.jpg")  # la prueba half-open falla: queda pendiente
+    assert r2.deletes == []
+
+    r2.fail = False
+    storage_router.upload_object("b.jpg", b"2")  # la prueba pasa y cierra el breaker
+    storage_router._drain_thread.join(timeout=5)  # el reintento corre fuera del request
+
+    assert r2.deletes == ["a.jpg"]
+    assert storage_router.get_metrics()["pending_r2_deletes"] == 0
+    assert not storage_router._pending_deletes_path.exists()
+
+
+def test_deferred_r2_deletes_survive_a_restart(backends, monkeypatch):
+    r2, _ = backends
+    storage_router.delete_object("a.jpg")
+    storage_router.delete_object("b.jpg")
+    assert storage_router._pending_deletes_path.read_text() == "a.jpg\nb.jpg\n"
+
+    storage_router.reset_breakers()  # proceso nuevo: memoria vacía
+    r2.fail = False
+    assert storage_router.load_pending_deletes() == 2
+    storage_router._drain_thread.join(timeout=5)
+
+    assert r2.deletes == ["a.jpg", "b.jpg"]
+    assert not storage_router._pending_deletes_path.exists()
+
+
+def test_full_pending_list_logs_and_forgets_the_dropped_key(backends, monkeypatch, caplog):
+    monkeypatch.setattr(storage_router, "_MAX_PENDING_DELETES", 1)
+
+    storage_router.delete_object("a.jpg")
+    storage_router.delete_object("b.jpg")
+
+    assert "se descarta a.jpg" in caplog.text
+    assert storage_router._pending_deletes_path.read_text() == "b.jpg\n"
+
+
+def test_upload_fileobj_rewinds_stream_for_retries_and_fallback(backends):
+    _, supabase = backends
+    stream = BytesIO(b"%PDF-1.7 contenido")
+
+    storage_router.upload_fileobj("facturas/a.pdf", stream, content_type="application/pdf")
+
+    assert supabase.uploads == [("facturas/a.pdf", b"%PDF-1.7 contenido")]
+
+
+def test_local_backend_round_trip_serves_files_with_cache_control(tmp_path, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.core import local_storage
+
+    monkeypatch.setenv("STORAGE_READ_SOURCE", "local")
+    monkeypatch.setenv("STORAGE_LOCAL_DIR", str(tmp_path))
+    monkeypatch.setenv("STORAGE_LOCAL_PUBLIC_BASE_URL", "http://testserver/storage")
+    app = FastAPI()
+    app.mount(local_storage.LOCAL_STORAGE_ROUTE, local_storage.create_static_app())
+    client = TestClient(app)
+
+    storage_router.upload_object(
+        "w=400/especies/1/a.jpg",
+        b"jpeg",
+        content_type="image/jpeg",
+        cache_control="public, max-age=31536000, immutable",
+    )
+    url = storage_router.get_public_url("w=400/especies/1/a.jpg")
+    response = client.get(url)
+
+    assert url == "http://testserver/storage/w=400/especies/1/a.jpg"
+    assert response.content == b"jpeg"
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert client.get("/storage/.meta/w=400/especies/1/a.jpg.json").status_code == 404
+
+    storage_router.delete_object("w=400/especies/1/a.jpg")
+    assert client.get(url).status_code == 404
@@ -0,0 +1,143 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import support_tickets_service
+
+
+@pytest.fixture(autouse=True)
+def reset_summary_cache():
+    support_tickets_service.invalidate_summary()
+    yield
+    support_tickets_service.invalidate_summary()
+
+
+class FakeTicketsQuery:
+    def __init__(self, database, table_name):
+        self.database = database
+        self.table_name = table_name
+
+    def select(self, columns, count=None):
+        self.database.calls.append((self.table_name, "select", columns, count))
+        return self
+
+    def eq(self, field, value):
+        self.database.calls.append(("eq", field, value))
+        return self
+
+    def filter(self, column, operator, criteria):
+        self.database.calls.append(("filter", column, operator, criteria))
+        return self
+
+    def or_(self, condition):
+        self.database.calls.append(("or", condition))
+        return self
+
+    def order(self, *_args, **_kwargs):
+        return self
+
+    def range(self, start, end):
+        self.database.calls.append(("range", start, end))
+        return self
+
+    def execute(self):
+        if self.table_name == "support_tickets_status_counts":
+            return SimpleNamespace(data=[
+                {"status": "en_espera", "total": 3},
+                {"status": "en_revision", "total": 2},
+                {"status": "resuelto", "total": 10},
+            ])
+        return SimpleNamespace(data=[{"id": 9, "status": "en_espera"}], count=41)
+
+
+class FakeTicketsSupabase:
+    def __init__(self):
+        self.calls = []
+
+    def table(self, table_name):
+        return FakeTicketsQuery(self, table_name)
+
+
+def test_list_staff_searches_and_paginates_in_database(monkeypatch):
+    database = FakeTicketsSupabase()
+    monkeypatch.setattr(support_tickets_service, "get_service", lambda: database)
+
+    result = support_tickets_service.list_staff(status="en_espera", q="foto rota", limit=20, offset=40)
+
+    columns = ",".join(support_tickets_service.TICKET_FIELDS)
+    assert ("support_tickets", "select", columns, "exact") in database.calls
+    assert "search_vector" not in columns
+    assert ("filter", "search_vector", "wfts(spanish)", "foto rota") in database.calls
+    assert ("range", 40, 59) in database.calls
+    assert result["total"] == 41
+    assert result["data"][0]["permissions"]["can_delete"] is False
+
+
+def test_list_staff_numeric_query_also_matches_ticket_id(monkeypatch):
+    database = FakeTicketsSupabase()
+    monkeypatch.setattr(support_tickets_service, "get_service", lambda: database)
+
+    support_tickets_service.list_staff(q="42")
+
+    assert ("or", 'id.eq.42,search_vector.wfts(spanish)."42"') in database.calls
+
+
+def test_get_summary_reads_grouped_counts(monkeypatch):
+    database = FakeTicketsSupabase()
+    monkeypatch.setattr(support_tickets_service, "get_service", lambda: database)
+
+    summary = support_tickets_service.get_summary()
+
+    assert summary["by_status"] == {"en_espera": 3, "en_revision": 2, "resuelto": 10, "cancelado": 0}
+    assert summary["open_count"] == 5
+    assert summary["total"] == 15
+
+
+def test_summary_cache_is_adjusted_by_writes_without_recounting(monkeypatch):
+    database = FakeTicketsSupabase()
+    monkeypatch.setattr(support_tickets_service, "get_service", lambda: database)
+    support_tickets_service.get_summary()
+    recounts = len([call for call in database.calls if call[0] == "support_tickets_status_counts"])
+
+    support_tickets_service._adjust_summary(None, "en_espera")
+    support_tickets_service._adjust_summary("en_espera", "resuelto")
+    support_tickets_service._adjust_summary("en_revision", None)
+    summary = support_tickets_service.get_summary()
+
+    assert len([call for call in database.calls if call[0] == "support_tickets_status_counts"]) == recounts
+    assert summary["by_status"] == {"en_espera": 3, "en_revision": 1, "resuelto": 11, "cancelado": 0}
+    assert summary["total"] == 15
+
+
+def test_summary_cache_recounts_after_interval(monkeypatch):
+    database = FakeTicketsSupabase()
+    monkeypatch.setattr(support_tickets_service, "get_service", lambda: database)
+    monkeypatch.setenv("SUPPORT_SUMMARY_RECOUNT_SECONDS", "0")
+
+    support_tickets_service.get_summary()
+    support_tickets_service._adjust_summary(None, "en_espera")
+    summary = support_tickets_service.get_summary()
+
+    assert summary["by_status"]["en_espera"] == 3
+
+
+def test_summary_route_returns_304_for_matching_etag(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api import routes_support_tickets
+    from app.middleware.auth_middleware import get_current_user
+
+    monkeypatch.setattr(support_tickets_service, "get_service", lambda: FakeTicketsSupabase())
+    app = FastAPI()
+    app.include_router(routes_support_tickets.router, prefix="/support-tickets")
+    app.dependency_overrides[get_current_user] = lambda: {"id": "uid", "email": "staff@example.com"}
+    client = TestClient(app)
+
+    first = client.get("/support-tickets/staff/summary")
+    second = client.get("/support-tickets/staff/summary", headers={"If-None-Match": first.headers["etag"]})
+
+    assert first.status_code == 200
+    assert first.json()["open_count"] == 5
+    assert second.status_code == 304
+    assert second.content == b""
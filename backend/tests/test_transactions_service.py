@@ -1,5 +1,7 @@
 from types import SimpleNamespace
 
+import pytest
+
 from app.services import transactions_service
 
 
@@ -67,48 +69,362 @@ def test_create_purchase_resolves_auth_uuid_to_internal_user_id(monkeypatch):
     assert fake_supabase.inserted_purchase["created_by"] == 42
 
 
-class FakeSalesQuery:
+class FakeSalesSupabase:
     def __init__(self):
-        self.selected_columns = ""
+        self.rpc_calls = []
+
+    def rpc(self, name, params):
+        self.rpc_calls.append((name, params))
+        rows = [
+            {"sale_date": "2026-07-21", "species_id": 3, "price": 1500, "quantity": 2,
+             "total_amount": 3000, "invoice_number": "FAC-VENTA-8",
+             "scientific_name": "Copiapoa cinerea", "nombre_comun": "Copiapoa"},
+            {"sale_date": "2026-07-21", "species_id": None, "price": None, "quantity": 1,
+             "total_amount": 0, "invoice_number": None,
+             "scientific_name": None, "nombre_comun": None},
+            {"sale_date": "2026-07-20", "species_id": 3, "price": 900, "quantity": 1,
+             "total_amount": 900, "invoice_number": None,
+             "scientific_name": "Copiapoa cinerea", "nombre_comun": "Copiapoa"},
+        ]
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=rows))
+
+    def table(self, table_name):
+        raise AssertionError(f"Consulta inesperada: {table_name}")
+
+
+def test_get_sales_grouped_builds_days_from_sql_aggregates(monkeypatch):
+    database = FakeSalesSupabase()
+    monkeypatch.setattr(transactions_service, "get_service", lambda: database)
+
+    sales = transactions_service.get_sales_grouped(date_from="2026-07-01", limit=2)
+
+    assert database.rpc_calls == [("get_sales_grouped", {
+        "p_date_from": "2026-07-01", "p_date_to": None, "p_limit": 2, "p_offset": 0,
+    })]
+    assert [(day["sale_date"], day["total_quantity"], day["total_amount"]) for day in sales] == [
+        ("2026-07-21", 3, 3000.0),
+        ("2026-07-20", 1, 900.0),
+    ]
+    first_item = sales[0]["items"][0]
+    assert first_item["invoice_number"] == "FAC-VENTA-8"
+    assert first_item["quantity"] == 2
+    assert first_item["species"] == {"id": 3, "scientific_name": "Copiapoa cinerea", "nombre_común": "Copiapoa"}
+    assert "species" not in sales[0]["items"][1]
+
+
+def _pdf_bytes():
+    from io import BytesIO
+
+    from PIL import Image
+
+    output = BytesIO()
+    Image.new("RGB", (600, 800), "white").save(output, format="PDF")
+    return output.getvalue()
+
+
+def test_upload_invoice_document_streams_from_upload_file_and_adds_thumbnail(monkeypatch):
+    import asyncio
+    from io import BytesIO
+
+    from PIL import Image
+    from starlette.datastructures import Headers, UploadFile
+
+    pdf = _pdf_bytes()
+    uploads = []
+    thumbnails = {}
+    monkeypatch.setattr(
+        transactions_service.storage_router,
+        "upload_fileobj",
+        lambda **kwargs: uploads.append((kwargs["key"], kwargs["fileobj"].read())),
+    )
+    monkeypatch.setattr(
+        transactions_service.storage_router,
+        "upload_object",
+        lambda **kwargs: thumbnails.update({kwargs["key"]: kwargs["data"]}),
+    )
+    monkeypatch.setattr(
+        transactions_service.storage_router,
+        "get_public_url",
+        lambda key: f"https://cdn.example.com/{key}",
+    )
+    upload = UploadFile(
+        BytesIO(pdf),
+        filename="factura.pdf",
+        headers=Headers({"content-type": "application/pdf"}),
+    )
+
+    result = asyncio.run(transactions_service.upload_invoice_document(upload))
+
+    assert result["document_path"].startswith("facturas/")
+    assert result["document_path"].endswith(".pdf")
+    assert uploads == [(result["document_path"], pdf)]
+    assert result["document_thumbnail_path"] == f"{result['document_path']}.thumb.jpg"
+    assert result["document_thumbnail_url"] == f"https://cdn.example.com/{result['document_thumbnail_path']}"
+    thumbnail = Image.open(BytesIO(thumbnails[result["document_thumbnail_path"]]))
+    assert thumbnail.format == "JPEG"
+    assert max(thumbnail.size) <= transactions_service.THUMBNAIL_MAX_SIZE
+
+
+def test_upload_invoice_document_keeps_document_when_thumbnail_fails(monkeypatch):
+    import asyncio
+    from io import BytesIO
+
+    from starlette.datastructures import Headers, UploadFile
+
+    monkeypatch.setattr(transactions_service.storage_router, "upload_fileobj", lambda **_kwargs: None)
+    monkeypatch.setattr(
+        transactions_service.storage_router,
+        "upload_object",
+        lambda **_kwargs: pytest.fail("No debe subir miniatura de una imagen ilegible"),
+    )
+    monkeypatch.setattr(transactions_service.storage_router, "get_public_url", lambda key: key)
+    upload = UploadFile(
+        BytesIO(b"no es una imagen"),
+        filename="factura.jpg",
+        headers=Headers({"content-type": "image/jpeg"}),
+    )
+
+    result = asyncio.run(transactions_service.upload_invoice_document(upload))
+
+    assert result["document_path"].endswith(".jpg")
+    assert result["document_thumbnail_path"] is None
+    assert result["document_thumbnail_url"] is None
 
-    def select(self, columns, **_kwargs):
-        self.selected_columns = columns
+
+class FakeBulkSaleQuery:
+    def __init__(self, database):
+        self.database = database
+        self.operation = None
+        self.payload = None
+        self.ids = []
+
+    def select(self, *_args, **_kwargs):
+        self.operation = "select"
         return self
 
-    def filter(self, *_args):
+    def update(self, payload):
+        self.operation = "update"
+        self.payload = dict(payload)
         return self
 
-    def order(self, *_args, **_kwargs):
+    def in_(self, _field, values):
+        self.ids = list(values)
+        return self
+
+    def is_(self, field, value):
+        assert (field, value) == ("sale_date", "null")
         return self
 
     def range(self, *_args):
         return self
 
     def execute(self):
-        assert "invoice_number" in self.selected_columns
-        return SimpleNamespace(data=[{
-            "id": 8,
-            "species_id": None,
-            "sector_id": None,
-            "sale_date": "2026-07-21",
-            "sale_price": 1500,
-            "invoice_number": "FAC-VENTA-8",
-        }])
+        self.database.calls.append(self.operation)
+        rows = [self.database.rows[i] for i in self.ids if i in self.database.rows]
+        if self.operation == "select":
+            return SimpleNamespace(data=[dict(row) for row in rows])
+        updated = []
+        for row in rows:
+            if row["sale_date"] is None and row["id"] not in self.database.sold_concurrently:
+                updated.append({**row, **self.payload})
+        return SimpleNamespace(data=updated)
 
 
-class FakeSalesSupabase:
+class FakeBulkSaleSupabase:
     def __init__(self):
-        self.query = FakeSalesQuery()
+        self.calls = []
+        self.rpc_calls = []
+        self.sold_concurrently = {4}
+        self.rows = {
+            1: {"id": 1, "sale_date": None, "sale_price": None},
+            2: {"id": 2, "sale_date": None, "sale_price": None},
+            3: {"id": 3, "sale_date": "2026-07-01", "sale_price": 900},
+            4: {"id": 4, "sale_date": None, "sale_price": None},
+        }
 
     def table(self, table_name):
         assert table_name == "ejemplar"
-        return self.query
+        return FakeBulkSaleQuery(self)
 
+    def rpc(self, name, params):
+        self.rpc_calls.append((name, params))
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=None))
 
-def test_get_sales_grouped_includes_invoice_number(monkeypatch):
-    database = FakeSalesSupabase()
+
+def test_register_sale_uses_one_select_and_one_filtered_update(monkeypatch):
+    database = FakeBulkSaleSupabase()
+    events = []
     monkeypatch.setattr(transactions_service, "get_service", lambda: database)
+    monkeypatch.setattr(
+        transactions_service.audit_service,
+        "log_change",
+        lambda **kwargs: events.append((kwargs["record_id"], kwargs["action"])),
+    )
+
+    result = transactions_service.register_sale(
+        [1, 2, 3, 4, 99], "2026-07-21", "1500", user_id=5, user_email="staff@example.com"
+    )
+
+    assert database.calls == ["select", "update"]
+    assert result == {
+        "sold": [1, 2],
+        "skipped": [3, 4],
+        "errors": [{"id": 99, "error": "no encontrado"}],
+        "sold_count": 2,
+    }
+    assert events == [(1, "UPDATE"), (1, "SALE"), (2, "UPDATE"), (2, "SALE")]
+    assert database.rpc_calls == [("refresh_transacciones_diarias", {"p_days": ["2026-07-21"]})]
+
+
+def test_get_report_sums_rollup_rows_and_computes_margin(monkeypatch):
+    calls = []
+
+    def rpc(name, params):
+        calls.append((name, params))
+        rows = [
+            {"nursery": "Vivero Sur", "purchase_count": 4, "purchase_cost": "4000",
+             "sale_count": 2, "sale_revenue": "7000", "invoice_count": 1, "invoice_total": "4760"},
+            {"nursery": "", "purchase_count": 0, "purchase_cost": 0,
+             "sale_count": 1, "sale_revenue": "1500", "invoice_count": 0, "invoice_total": 0},
+        ]
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=rows))
+
+    monkeypatch.setattr(transactions_service, "get_service", lambda: SimpleNamespace(rpc=rpc))
+
+    report = transactions_service.get_report("2026-07-01", "2026-07-31", group_by="nursery")
+
+    assert calls == [("get_transactions_report", {
+        "p_date_from": "2026-07-01", "p_date_to": "2026-07-31", "p_group_by": "nursery",
+    })]
+    assert report["rows"][0]["margin"] == 3000
+    assert report["rows"][1]["nursery"] is None
+    assert report["totals"]["sale_revenue"] == 8500
+    assert report["totals"]["margin"] == 4500
+
+
+def test_get_report_rejects_inverted_range():
+    with pytest.raises(ValueError):
+        transactions_service.get_report("2026-08-01", "2026-07-01")
+
+
+def test_normalize_invoice_key_ignores_case_accents_and_punctuation():
+    assert transactions_service.normalize_invoice_key("Vivero  Peñalolén", "F-001") == \
+        transactions_service.normalize_invoice_key("vivero penalolen.", "f 001")
+    assert transactions_service.normalize_invoice_key("Vivero", "0012") == ("vivero", "12")
+    assert transactions_service.normalize_invoice_key("Vivero", "  ") is None
+    assert transactions_service.invoice_key_value("Vivero  Peñalolén", "F-001") == "vivero penalolen|f001"
+
+
+class FakeFacturaEjemplaresQuery:
+    def __init__(self, table_name, filters):
+        self.table_name = table_name
+        self.filters = filters
+        self.count = None
+
+    def select(self, _columns, count=None):
+        self.count = count
+        return self
+
+    def eq(self, field, value):
+        self.filters.append((self.table_name, field, value))
+        return self
+
+    def in_(self, field, values):
+        self.filters.append((self.table_name, field, tuple(values)))
+        return self
+
+    def limit(self, *_args):
+        return self
+
+    def order(self, *_args, **_kwargs):
+        return self
+
+    def range(self, *_args):
+        return self
+
+    def execute(self):
+        if self.table_name == "facturas_compra":
+            return SimpleNamespace(data=[{"id": 7}])
+        if self.table_name == "especies":
+            return SimpleNamespace(data=[{"id": 3, "scientific_name": "Copiapoa cinerea"}])
+        assert self.count == "exact"
+        return SimpleNamespace(data=[{"id": 11, "species_id": 3}, {"id": 12, "species_id": None}], count=2)
+
+
+def test_list_purchase_ejemplares_filters_by_factura_id(monkeypatch):
+    filters = []
+    database = SimpleNamespace(table=lambda name: FakeFacturaEjemplaresQuery(name, filters))
+    monkeypatch.setattr(transactions_service, "get_service", lambda: database)
+
+    result = transactions_service.list_purchase_ejemplares(7)
+
+    assert ("ejemplar", "factura_id", 7) in filters
+    assert result["total"] == 2
+    assert result["data"][0]["especies"]["scientific_name"] == "Copiapoa cinerea"
+    assert result["data"][1]["especies"] is None
+
+
+class FakeInvoiceLinkQuery:
+    def __init__(self, database, table_name):
+        self.database = database
+        self.table_name = table_name
+        self.predicates = []
+        self.update_payload = None
+
+    def select(self, *_args, **_kwargs):
+        return self
+
+    def eq(self, field, value):
+        self.predicates.append(lambda row: row.get(field) == value)
+        return self
+
+    def in_(self, field, values):
+        self.predicates.append(lambda row: row.get(field) in values)
+        return self
+
+    def order(self, *_args, **_kwargs):
+        return self
+
+    def range(self, *_args):
+        return self
+
+    def limit(self, *_args):
+        return self
+
+    def update(self, payload):
+        self.update_payload = payload
+        return self
+
+    def execute(self):
+        for row in self.database[self.table_name]:
+            # Columna generada en la base
+            row["invoice_key"] = transactions_service.invoice_key_value(row.get("nursery"), row.get("invoice_number"))
+        rows = [row for row in self.database[self.table_name] if all(match(row) for match in self.predicates)]
+        if self.update_payload is not None:
+            for row in rows:
+                row.update(self.update_payload)
+        return SimpleNamespace(data=[dict(row) for row in rows])
+
+
+def test_link_factura_ejemplares_links_matching_rows_and_unlinks_stale_ones(monkeypatch):
+    database = {
+        "facturas_compra": [{"id": 7, "nursery": "Vivero Peñalolén", "invoice_number": "F-001"}],
+        "ejemplar": [
+            {"id": 1, "nursery": "vivero penalolen", "invoice_number": "f 001", "factura_id": None},
+            {"id": 2, "nursery": "Otro vivero", "invoice_number": "F-001", "factura_id": None},
+            {"id": 3, "nursery": "Vivero Peñalolén", "invoice_number": "F-009", "factura_id": 7},
+        ],
+    }
+    monkeypatch.setattr(
+        transactions_service,
+        "get_service",
+        lambda: SimpleNamespace(table=lambda name: FakeInvoiceLinkQuery(database, name)),
+    )
+
+    assert transactions_service.resolve_factura_id("VIVERO PENALOLEN", "F001") == 7
+    transactions_service.link_factura_ejemplares(database["facturas_compra"][0])
 
-    sales = transactions_service.get_sales_grouped()
+    assert [row["factura_id"] for row in database["ejemplar"]] == [7, None, None]
 
-    assert sales[0]["items"][0]["invoice_number"] == "FAC-VENTA-8"
+    database["facturas_compra"].append({"id": 8, "nursery": "vivero peñalolén", "invoice_number": "F 001"})
+    assert transactions_service.resolve_factura_id("Vivero Peñalolén", "F-001") is None  # ambigua
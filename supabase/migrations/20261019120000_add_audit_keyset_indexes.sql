@@ -0,0 +1,12 @@
+-- Índices para /audit: paginación keyset sobre (created_at, id) descendente
+-- combinada con los filtros tabla_afectada / registro_id / usuario_id.
+
+create index if not exists idx_auditoria_created_id
+  on public.auditoria_cambios (created_at desc, id desc);
+
+create index if not exists idx_auditoria_tabla_registro_created
+  on public.auditoria_cambios (tabla_afectada, registro_id, created_at desc, id desc);
+
+create index if not exists idx_auditoria_usuario_created
+  on public.auditoria_cambios (usuario_id, created_at desc, id desc)
+  where usuario_id is not null;
@@ -0,0 +1,89 @@
+-- Ventas agrupadas para /transactions/sales.
+-- Agrega en SQL por (sale_date, species_id, sale_price) y pagina por fecha de
+-- venta, de modo que un día nunca queda partido entre páginas. Los campos
+-- descriptivos (sector, compra, vivero, factura...) son los del primer
+-- ejemplar del grupo por id, igual que la agrupación previa en Python.
+
+create index if not exists idx_ejemplar_sale_date
+  on public.ejemplar (sale_date desc)
+  where sale_date is not null;
+
+create or replace function public.get_sales_grouped(
+  p_date_from date default null,
+  p_date_to date default null,
+  p_limit integer default 50,
+  p_offset integer default 0
+)
+returns table (
+  sale_date date,
+  species_id bigint,
+  price numeric,
+  quantity bigint,
+  total_amount numeric,
+  sector_id bigint,
+  purchase_date date,
+  purchase_price numeric,
+  nursery text,
+  invoice_number text,
+  age_months integer,
+  health_status text,
+  location text,
+  scientific_name text,
+  nombre_comun text
+)
+language sql
+stable
+set search_path = public
+as $$
+  with days as (
+    select distinct e.sale_date
+    from public.ejemplar e
+    where e.sale_date is not null
+      and (p_date_from is null or e.sale_date >= p_date_from)
+      and (p_date_to is null or e.sale_date <= p_date_to)
+    order by e.sale_date desc
+    limit p_limit
+    offset p_offset
+  ),
+  groups as (
+    select
+      e.sale_date,
+      e.species_id,
+      coalesce(e.sale_price, 0) as price,
+      count(*) as quantity,
+      sum(coalesce(e.sale_price, 0)) as total_amount,
+      (array_agg(e.sector_id order by e.id))[1] as sector_id,
+      (array_agg(e.purchase_date order by e.id))[1] as purchase_date,
+      (array_agg(e.purchase_price order by e.id))[1] as purchase_price,
+      (array_agg(e.nursery order by e.id))[1] as nursery,
+      (array_agg(e.invoice_number order by e.id))[1] as invoice_number,
+      (array_agg(e.age_months order by e.id))[1] as age_months,
+      (array_agg(e.health_status::text order by e.id))[1] as health_status,
+      (array_agg(e.location order by e.id))[1] as location
+    from public.ejemplar e
+    join days d on d.sale_date = e.sale_date
+    group by e.sale_date, e.species_id, coalesce(e.sale_price, 0)
+  )
+  select
+    g.sale_date,
+    g.species_id,
+    g.price,
+    g.quantity,
+    g.total_amount,
+    g.sector_id,
+    g.purchase_date,
+    g.purchase_price,
+    g.nursery,
+    g.invoice_number,
+    g.age_months,
+    g.health_status,
+    g.location,
+    s.scientific_name,
+    s."nombre_común" as nombre_comun
+  from groups g
+  left join public.especies s on s.id = g.species_id
+  order by g.sale_date desc, g.species_id, g.price;
+$$;
+
+revoke execute on function public.get_sales_grouped(date, date, integer, integer) from public, anon, authenticated;
+grant execute on function public.get_sales_grouped(date, date, integer, integer) to service_role;
@@ -0,0 +1,117 @@
+-- Rollup diario de compras y ventas para /transactions/report.
+-- Una fila por (day, species_id, nursery). Las compras y ventas salen de
+-- ejemplar (purchase_date/purchase_price, sale_date/sale_price); las facturas
+-- de facturas_compra se suman aparte por vivero con species_id nulo.
+-- El backend llama refresh_transacciones_diarias con los días que tocó cada
+-- escritura; el recálculo por día es idempotente.
+
+create table if not exists public.transacciones_diarias (
+  day date not null,
+  species_id bigint references public.especies (id) on delete set null,
+  nursery text not null default '',
+  purchase_count integer not null default 0,
+  purchase_cost numeric not null default 0,
+  sale_count integer not null default 0,
+  sale_revenue numeric not null default 0,
+  invoice_count integer not null default 0,
+  invoice_total numeric not null default 0,
+  updated_at timestamptz not null default now()
+);
+
+create unique index if not exists idx_transacciones_diarias_key
+  on public.transacciones_diarias (day, species_id, nursery) nulls not distinct;
+
+alter table public.transacciones_diarias enable row level security;
+
+create index if not exists idx_ejemplar_purchase_date
+  on public.ejemplar (purchase_date)
+  where purchase_date is not null;
+
+create or replace function public.refresh_transacciones_diarias(p_days date[])
+returns void
+language sql
+volatile
+set search_path = public
+as $$
+  delete from public.transacciones_diarias where day = any(p_days);
+
+  insert into public.transacciones_diarias (
+    day, species_id, nursery,
+    purchase_count, purchase_cost, sale_count, sale_revenue, invoice_count, invoice_total
+  )
+  select
+    day, species_id, nursery,
+    sum(purchase_count), sum(purchase_cost), sum(sale_count), sum(sale_revenue),
+    sum(invoice_count), sum(invoice_total)
+  from (
+    select e.purchase_date as day, e.species_id, coalesce(e.nursery, '') as nursery,
+           1 as purchase_count, coalesce(e.purchase_price, 0) as purchase_cost,
+           0 as sale_count, 0::numeric as sale_revenue, 0 as invoice_count, 0::numeric as invoice_total
+    from public.ejemplar e
+    where e.purchase_date = any(p_days)
+    union all
+    select e.sale_date, e.species_id, coalesce(e.nursery, ''),
+           0, 0, 1, coalesce(e.sale_price, 0), 0, 0
+    from public.ejemplar e
+    where e.sale_date = any(p_days)
+    union all
+    select f.issue_date, null, coalesce(f.nursery, ''),
+           0, 0, 0, 0, 1, coalesce(f.total_amount, 0)
+    from public.facturas_compra f
+    where f.issue_date = any(p_days)
+  ) movements
+  group by day, species_id, nursery;
+$$;
+
+create or replace function public.get_transactions_report(
+  p_date_from date,
+  p_date_to date,
+  p_group_by text default 'day'
+)
+returns table (
+  day date,
+  species_id bigint,
+  nursery text,
+  scientific_name text,
+  purchase_count bigint,
+  purchase_cost numeric,
+  sale_count bigint,
+  sale_revenue numeric,
+  invoice_count bigint,
+  invoice_total numeric
+)
+language sql
+stable
+set search_path = public
+as $$
+  select
+    case when p_group_by = 'day' then t.day end,
+    case when p_group_by = 'species' then t.species_id end,
+    case when p_group_by = 'nursery' then t.nursery end,
+    case when p_group_by = 'species' then min(s.scientific_name) end,
+    sum(t.purchase_count)::bigint,
+    sum(t.purchase_cost),
+    sum(t.sale_count)::bigint,
+    sum(t.sale_revenue),
+    sum(t.invoice_count)::bigint,
+    sum(t.invoice_total)
+  from public.transacciones_diarias t
+  left join public.especies s on s.id = t.species_id
+  where t.day between p_date_from and p_date_to
+  group by 1, 2, 3
+  order by 1 desc nulls last, 2 nulls last, 3;
+$$;
+
+revoke execute on function public.refresh_transacciones_diarias(date[]) from public, anon, authenticated;
+grant execute on function public.refresh_transacciones_diarias(date[]) to service_role;
+revoke execute on function public.get_transactions_report(date, date, text) from public, anon, authenticated;
+grant execute on function public.get_transactions_report(date, date, text) to service_role;
+
+-- Backfill con todo el historial existente.
+select public.refresh_transacciones_diarias(array(
+  select purchase_date from public.ejemplar where purchase_date is not null
+  union
+  select sale_date from public.ejemplar where sale_date is not null
+  union
+  select issue_date from public.facturas_compra where issue_date is not null
+));
@@ -0,0 +1,8 @@
+-- Miniatura JPEG del documento de la factura (primera página si es PDF).
+-- Se guarda junto al documento como <document_path>.thumb.jpg.
+
+alter table public.facturas_compra
+  add column if not exists document_thumbnail_path text;
+
+comment on column public.facturas_compra.document_thumbnail_path is
+  'Key en storage de la miniatura JPEG del documento; null si no se pudo generar.';
@@ -0,0 +1,14 @@
+-- Relación explícita ejemplar -> facturas_compra.
+-- Antes se vinculaban solo por texto (nursery + invoice_number) con ilike.
+-- Las filas existentes se vinculan con backend/scripts/reconcile_ejemplar_facturas.py.
+
+alter table public.ejemplar
+  add column if not exists factura_id bigint
+  references public.facturas_compra (id) on delete set null;
+
+create index if not exists idx_ejemplar_factura_id
+  on public.ejemplar (factura_id, id)
+  where factura_id is not null;
+
+comment on column public.ejemplar.factura_id is
+  'Factura de compra del ejemplar (facturas_compra.id); null si no está vinculada.';
@@ -0,0 +1,23 @@
+-- Búsqueda full-text de tickets (título + descripción) y conteo por estado.
+
+alter table public.support_tickets
+  add column if not exists search_vector tsvector
+  generated always as (
+    setweight(to_tsvector('spanish', coalesce(title, '')), 'A')
+    || setweight(to_tsvector('spanish', coalesce(description, '')), 'B')
+  ) stored;
+
+create index if not exists idx_support_tickets_search
+  on public.support_tickets using gin (search_vector);
+
+create index if not exists idx_support_tickets_created
+  on public.support_tickets (created_at desc, id desc);
+
+create or replace view public.support_tickets_status_counts
+with (security_invoker = true) as
+  select status, count(*)::bigint as total
+  from public.support_tickets
+  group by status;
+
+revoke all on public.support_tickets_status_counts from anon, authenticated;
+grant select on public.support_tickets_status_counts to service_role;
@@ -0,0 +1,55 @@
+-- Rate limiting compartido (RATE_LIMIT_BACKEND=supabase).
+-- GCRA: por clave (scope:ip) se guarda solo el TAT (theoretical arrival time).
+-- rate_limit_hit decide y actualiza en un único upsert, así que workers y
+-- réplicas comparten el límite con un lock de fila por clave y nada más.
+-- La tabla es UNLOGGED: no escribe WAL y se vacía si Postgres cae, lo que
+-- para contadores de unos minutos es aceptable.
+
+create unlogged table if not exists public.rate_limits (
+  key text primary key,
+  tat timestamptz not null
+);
+
+create index if not exists idx_rate_limits_tat on public.rate_limits (tat);
+
+alter table public.rate_limits enable row level security;
+
+create or replace function public.rate_limit_hit(
+  p_key text,
+  p_limit integer,
+  p_window_seconds double precision
+)
+returns table (allowed boolean, retry_after integer)
+language plpgsql
+volatile
+set search_path = public
+as $$
+declare
+  v_now timestamptz := clock_timestamp();
+  v_window interval := make_interval(secs => p_window_seconds);
+  v_emission interval := make_interval(secs => p_window_seconds / greatest(p_limit, 1));
+  v_tat timestamptz;
+begin
+  insert into public.rate_limits as r (key, tat)
+  values (p_key, v_now + v_emission)
+  on conflict (key) do update
+    set tat = greatest(r.tat, v_now) + v_emission
+    where greatest(r.tat, v_now) + v_emission - v_window <= v_now
+  returning r.tat into v_tat;
+
+  if v_tat is not null then
+    return query select true, ceil(extract(epoch from v_tat - v_now))::integer;
+  else
+    select r.tat into v_tat from public.rate_limits r where r.key = p_key;
+    return query select false, greatest(1, ceil(extract(epoch from v_tat + v_emission - v_window - v_now))::integer);
+  end if;
+
+  -- Limpieza ocasional de claves cuyo TAT ya pasó (equivalen a no tener estado).
+  if random() < 0.001 then
+    delete from public.rate_limits where tat < v_now;
+  end if;
+end;
+$$;
+
+revoke execute on function public.rate_limit_hit(text, integer, double precision) from public, anon, authenticated;
+grant execute on function public.rate_limit_hit(text, integer, double precision) to service_role;
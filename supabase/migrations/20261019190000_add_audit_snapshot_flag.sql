@@ -0,0 +1,12 @@
+-- Marca explícita de snapshot en auditoria_cambios (modo compacto).
+-- Solo las filas con es_snapshot = true guardan la fila completa en
+-- campos_nuevos; el resto de los UPDATE son diffs que se aplican sobre el
+-- estado anterior al reconstruir.
+
+alter table public.auditoria_cambios
+  add column if not exists es_snapshot boolean not null default false;
+
+-- Último snapshot/CREATE/DELETE de un registro para reconstruct_record.
+create index if not exists idx_auditoria_snapshots
+  on public.auditoria_cambios (tabla_afectada, registro_id, created_at desc, id desc)
+  where es_snapshot or accion in ('CREATE', 'DELETE');
@@ -0,0 +1,65 @@
+-- refresh_transacciones_diarias: serializar el recálculo por día y no
+-- chocar con la fila de facturas al borrar una especie.
+--
+-- 1) Dos refresh concurrentes del mismo día podían insertar ambos y el
+--    segundo fallaba en idx_transacciones_diarias_key. Ahora cada día toma
+--    pg_advisory_xact_lock (en orden, para no generar deadlocks) antes del
+--    delete + insert.
+-- 2) species_id con "on delete set null" convertía las filas de la especie
+--    en (day, NULL, nursery), la misma clave que las filas de facturas
+--    (nulls not distinct), y el delete de la especie fallaba por unicidad.
+--    Las filas de una especie borrada ya no aportan al reporte: cascade.
+
+alter table public.transacciones_diarias
+  drop constraint if exists transacciones_diarias_species_id_fkey;
+
+alter table public.transacciones_diarias
+  add constraint transacciones_diarias_species_id_fkey
+  foreign key (species_id) references public.especies (id) on delete cascade;
+
+create or replace function public.refresh_transacciones_diarias(p_days date[])
+returns void
+language plpgsql
+volatile
+set search_path = public
+as $$
+declare
+  v_day date;
+begin
+  for v_day in select distinct d from unnest(p_days) as d where d is not null order by d loop
+    perform pg_advisory_xact_lock(hashtext('transacciones_diarias:' || v_day::text));
+  end loop;
+
+  delete from public.transacciones_diarias where day = any(p_days);
+
+  insert into public.transacciones_diarias (
+    day, species_id, nursery,
+    purchase_count, purchase_cost, sale_count, sale_revenue, invoice_count, invoice_total
+  )
+  select
+    day, species_id, nursery,
+    sum(purchase_count), sum(purchase_cost), sum(sale_count), sum(sale_revenue),
+    sum(invoice_count), sum(invoice_total)
+  from (
+    select e.purchase_date as day, e.species_id, coalesce(e.nursery, '') as nursery,
+           1 as purchase_count, coalesce(e.purchase_price, 0) as purchase_cost,
+           0 as sale_count, 0::numeric as sale_revenue, 0 as invoice_count, 0::numeric as invoice_total
+    from public.ejemplar e
+    where e.purchase_date = any(p_days)
+    union all
+    select e.sale_date, e.species_id, coalesce(e.nursery, ''),
+           0, 0, 1, coalesce(e.sale_price, 0), 0, 0
+    from public.ejemplar e
+    where e.sale_date = any(p_days)
+    union all
+    select f.issue_date, null, coalesce(f.nursery, ''),
+           0, 0, 0, 0, 1, coalesce(f.total_amount, 0)
+    from public.facturas_compra f
+    where f.issue_date = any(p_days)
+  ) movements
+  group by day, species_id, nursery;
+end;
+$$;
+
+revoke execute on function public.refresh_transacciones_diarias(date[]) from public, anon, authenticated;
+grant execute on function public.refresh_transacciones_diarias(date[]) to service_role;
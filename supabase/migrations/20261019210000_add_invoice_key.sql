@@ -0,0 +1,52 @@
+-- Clave normalizada "vivero|número" en facturas_compra y ejemplar para
+-- resolver ejemplar.factura_id por igualdad sobre un índice, en vez de ilike
+-- con comodín inicial. Mismas reglas que
+-- transactions_service.normalize_invoice_key: cualquier cambio va en ambos.
+
+create extension if not exists unaccent with schema extensions;
+
+create or replace function public.normalize_invoice_key(p_nursery text, p_invoice_number text)
+returns text
+language sql
+immutable
+parallel safe
+set search_path = ''
+as $$
+  select case
+    when k.nursery_key = '' or k.invoice_key = '' then null
+    when k.invoice_key ~ '^[0-9]+$' then k.nursery_key || '|' || coalesce(nullif(ltrim(k.invoice_key, '0'), ''), '0')
+    else k.nursery_key || '|' || k.invoice_key
+  end
+  from (
+    select
+      btrim(regexp_replace(
+        lower(extensions.unaccent('extensions.unaccent'::regdictionary, coalesce(p_nursery, ''))),
+        '[^0-9a-z]+', ' ', 'g'
+      )) as nursery_key,
+      regexp_replace(
+        lower(extensions.unaccent('extensions.unaccent'::regdictionary, coalesce(p_invoice_number, ''))),
+        '[^0-9a-z]+', '', 'g'
+      ) as invoice_key
+  ) k;
+$$;
+
+alter table public.facturas_compra
+  add column if not exists invoice_key text
+  generated always as (public.normalize_invoice_key(nursery, invoice_number)) stored;
+
+create index if not exists idx_facturas_compra_invoice_key
+  on public.facturas_compra (invoice_key)
+  where invoice_key is not null;
+
+alter table public.ejemplar
+  add column if not exists invoice_key text
+  generated always as (public.normalize_invoice_key(nursery, invoice_number)) stored;
+
+create index if not exists idx_ejemplar_invoice_key
+  on public.ejemplar (invoice_key, id)
+  where invoice_key is not null;
+
+comment on column public.facturas_compra.invoice_key is
+  'normalize_invoice_key(nursery, invoice_number); generada, no se escribe.';
+comment on column public.ejemplar.invoice_key is
+  'normalize_invoice_key(nursery, invoice_number); generada, no se escribe.';
@@ -162,6 +162,9 @@ export default function HomeContentPage() {
             updated[index] = {
                 ...updated[index],
                 url: uploadData.url,
+                variants: uploadData.variants,
+                width: uploadData.width,
+                height: uploadData.height,
                 alt_es: updated[index].alt_es || uploadData.alt || file.name,
                 alt_en: updated[index].alt_en || uploadData.alt || file.name
             };
@@ -8,6 +8,8 @@ import { getApiUrl } from "../../utils/api-config";
 
 const API = getApiUrl();
 const IVA_RATE = 0.19;
+// GET /transactions/sales pagina por días de venta (limit/offset cuentan días)
+const SALES_PAGE_DAYS = 50;
 
 function Modal({ isOpen, onClose, title, children }) {
     if (!isOpen) return null;
@@ -302,6 +304,7 @@ function FacturaModal({ isOpen, onClose, onSaved, apiRequest, accessToken, nurse
                 document_path: doc?.document_path || null,
                 document_name: doc?.document_name || null,
                 document_content_type: doc?.document_content_type || null,
+                document_thumbnail_path: doc?.document_thumbnail_path || null,
             };
 
             const res = await apiRequest(`${API}/transactions/purchases`, {
@@ -652,6 +655,8 @@ export default function TransactionsPage() {
     const [activeTab, setActiveTab] = useState("purchases"); // "purchases" o "sales"
     const [purchases, setPurchases] = useState([]); // facturas
     const [sales, setSales] = useState([]);
+    const [salesHasMore, setSalesHasMore] = useState(false);
+    const [loadingMoreSales, setLoadingMoreSales] = useState(false);
     const [nurseries, setNurseries] = useState([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState("");
@@ -667,7 +672,7 @@ export default function TransactionsPage() {
 
             const [purchasesRes, salesRes] = await Promise.all([
                 apiRequest(`${API}/transactions/purchases`, {}, accessToken),
-                apiRequest(`${API}/transactions/sales`, {}, accessToken),
+                apiRequest(`${API}/transactions/sales?limit=${SALES_PAGE_DAYS}&offset=0`, {}, accessToken),
             ]);
 
             if (!purchasesRes.ok) {
@@ -683,7 +688,9 @@ export default function TransactionsPage() {
             ]);
 
             setPurchases(Array.isArray(purchasesData) ? purchasesData : []);
-            setSales(Array.isArray(salesData) ? salesData : []);
+            const salesDays = Array.isArray(salesData) ? salesData : [];
+            setSales(salesDays);
+            setSalesHasMore(salesDays.length === SALES_PAGE_DAYS);
         } catch (err) {
             console.error('[TransactionsPage] Error:', err);
             setError(err.message || "Error al cargar datos");
@@ -692,6 +699,30 @@ export default function TransactionsPage() {
         }
     }, [apiRequest, accessToken]);
 
+    const loadMoreSales = useCallback(async () => {
+        try {
+            setLoadingMoreSales(true);
+            setError("");
+            const res = await apiRequest(
+                `${API}/transactions/sales?limit=${SALES_PAGE_DAYS}&offset=${sales.length}`,
+                {},
+                accessToken,
+            );
+            if (!res.ok) {
+                throw new Error(await getApiErrorMessage(res, "Error al cargar ventas"));
+            }
+            const data = await res.json();
+            const moreDays = Array.isArray(data) ? data : [];
+            setSales((prev) => [...prev, ...moreDays]);
+            setSalesHasMore(moreDays.length === SALES_PAGE_DAYS);
+        } catch (err) {
+            console.error('[TransactionsPage] Error:', err);
+            setError(err.message || "Error al cargar ventas");
+        } finally {
+            setLoadingMoreSales(false);
+        }
+    }, [apiRequest, accessToken, sales.length]);
+
     const fetchNurseries = useCallback(async () => {
         try {
             const res = await apiRequest(`${API}/ejemplar/staff/nurseries`, {}, accessToken);
@@ -861,7 +892,7 @@ export default function TransactionsPage() {
                         transition: "all 0.2s"
                     }}
                 >
-                    Ventas ({sales.length})
+                    Ventas ({sales.length}{salesHasMore ? "+" : ""})
                 </button>
             </div>
 
@@ -1031,9 +1062,16 @@ export default function TransactionsPage() {
                                                 target="_blank"
                                                 rel="noreferrer"
                                                 onClick={(e) => e.stopPropagation()}
-                                                style={{ color: "#2563eb", fontWeight: 600, textDecoration: "none" }}
+                                                style={{ color: "#2563eb", fontWeight: 600, textDecoration: "none", display: "inline-flex", alignItems: "center", gap: "6px" }}
                                             >
-                                                📄 Abrir documento
+                                                {factura.document_thumbnail_url ? (
+                                                    <img
+                                                        src={factura.document_thumbnail_url}
+                                                        alt=""
+                                                        loading="lazy"
+                                                        style={{ width: "32px", height: "32px", objectFit: "cover", borderRadius: "4px", border: "1px solid #e5e7eb" }}
+                                                    />
+                                                ) : "📄"} Abrir documento
                                             </a>
                                         )}
                                     </div>
@@ -1096,6 +1134,15 @@ export default function TransactionsPage() {
                                 </div>
                             </div>
                         ))}
+                        {salesHasMore && (
+                            <button
+                                onClick={loadMoreSales}
+                                disabled={loadingMoreSales}
+                                style={{ ...secondaryButton(), alignSelf: "center", opacity: loadingMoreSales ? 0.6 : 1 }}
+                            >
+                                {loadingMoreSales ? "Cargando..." : `Cargar ${SALES_PAGE_DAYS} días anteriores`}
+                            </button>
+                        )}
                     </div>
                 )}
             </div>